@@ -7,6 +7,7 @@ by NIST at http://www.cstl.nist.gov/acd/839.01/xrfdownload.html
 
 import io
 import json
+import hashlib
 import os
 import time
 import sqlite3
@@ -19,7 +20,8 @@ def add_Version(dest, append=True):
 
     conn = sqlite3.connect(dest)
     c = conn.cursor()
-    c.execute('''create table Version (id integer primary key, tag text, date text, notes text)''')
+    c.execute('''create table Version (id integer primary key, tag text, date text, notes text,
+                 content_hash text)''')
 
     source = 'Version.dat'
     version_lines = []
@@ -31,13 +33,31 @@ def add_Version(dest, append=True):
         if not line.startswith('#') and len(line)> 3:
             _tag, _date, _notes = [l.strip() for l in line.split('//', 2)]
             rowid += 1
-            c.execute('insert into Version values (?,?,?,?)',
-                      (rowid, _tag, _date, _notes))
+            c.execute('insert into Version values (?,?,?,?,?)',
+                      (rowid, _tag, _date, _notes, None))
 
     conn.commit()
     c.close()
 
 
+def add_content_hash(dest):
+    """add SHA-256 hash of the contents of all tables except Version
+    to the latest Version row.  This must match xraydb.xraydb.content_hash()"""
+    conn = sqlite3.connect(dest)
+    hasher = hashlib.sha256()
+    query = "select name from sqlite_master where type='table' order by name"
+    for (name,) in conn.execute(query).fetchall():
+        if name == 'Version' or name.startswith('sqlite_'):
+            continue
+        hasher.update(name.encode('utf-8'))
+        for row in conn.execute('select * from "%s" order by rowid' % name):
+            hasher.update(repr(row).encode('utf-8'))
+    conn.execute('update Version set content_hash=? where id=(select max(id) from Version)',
+                 (hasher.hexdigest(),))
+    conn.commit()
+    conn.close()
+
+
 def add_elementaldata(dest):
     source = 'elemental_data.txt'
     if not os.path.isfile(source):
@@ -946,3 +966,4 @@ if __name__ == '__main__':
     add_corehole_data(dest, append=True)
     add_Chantler(dest, table='Chantler',        subdir='fine',   append=True)
     add_Version(dest)
+    add_content_hash(dest)
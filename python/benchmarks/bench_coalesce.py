@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Throughput of many scalar requests: naive calls compared to coalesced calls
+
+Each of several threads (or coroutines) asks for mu_elam(element, energy)
+or material_mu(material, energy) for one energy at a time, cycling over a
+few elements and materials.  Reported are requests per second for
+
+   naive:      each thread calls xraydb directly
+   coalesced:  each thread calls a shared xraydb.Coalescer
+   aio-naive:  each coroutine awaits xraydb.aio.run(xraydb.mu_elam, ...)
+   aio:        each coroutine awaits xraydb.aio.mu_elam(...), which batches
+
+Usage:
+    python bench_coalesce.py
+    python bench_coalesce.py --threads 8 --threads 64 --requests 20000
+    python bench_coalesce.py --window 0.001 --save coalesce.json
+"""
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import xraydb
+from xraydb import aio
+
+ELEMENTS = ('Fe', 'Cu', 'Mo', 'Ag')
+MATERIALS = ('kapton', 'water', 'air', 'silicon')
+
+
+def make_requests(nrequests, seed=0):
+    "list of (function name, element or material, energy)"
+    rng = np.random.default_rng(seed)
+    energies = rng.uniform(5000, 25000, nrequests)
+    out = []
+    for i, en in enumerate(energies):
+        if i % 2 == 0:
+            out.append(('mu_elam', ELEMENTS[(i//2) % len(ELEMENTS)], float(en)))
+        else:
+            out.append(('material_mu', MATERIALS[(i//2) % len(MATERIALS)], float(en)))
+    return out
+
+
+def run_threads(requests, nthreads, func):
+    "time for nthreads threads to complete all requests with func"
+    chunks = [requests[i::nthreads] for i in range(nthreads)]
+
+    def worker(chunk):
+        for name, what, en in chunk:
+            func(name, what, en)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(nthreads) as pool:
+        list(pool.map(worker, chunks))
+    return time.perf_counter() - t0
+
+
+def naive(name, what, energy):
+    if name == 'mu_elam':
+        return xraydb.mu_elam(what, energy)
+    return xraydb.material_mu(what, energy)
+
+
+def run_aio(requests, ncoros, batched=True):
+    "time for ncoros coroutines to complete all requests"
+    chunks = [requests[i::ncoros] for i in range(ncoros)]
+
+    async def worker(chunk):
+        for name, what, en in chunk:
+            if batched:
+                await getattr(aio, name)(what, en)
+            else:
+                await aio.run(naive, name, what, en)
+
+    async def main():
+        await asyncio.gather(*(worker(chunk) for chunk in chunks))
+
+    t0 = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput of coalesced scalar requests')
+    parser.add_argument('--threads', type=int, action='append', default=[],
+                        help='number of threads or coroutines [8, 32, 128]')
+    parser.add_argument('--requests', type=int, default=10000,
+                        help='number of requests [10000]')
+    parser.add_argument('--window', type=float, default=0.002,
+                        help='coalescing window in sec [0.002]')
+    parser.add_argument('--save', default=None, help='save results to JSON file')
+    args = parser.parse_args()
+    nthreads = args.threads or [8, 32, 128]
+
+    requests = make_requests(args.requests)
+    for name, what, en in requests[:2*len(ELEMENTS)]:   # warm up caches
+        naive(name, what, en)
+
+    results = {}
+    print(f"{'threads':>8s} {'naive':>12s} {'coalesced':>12s} {'aio-naive':>12s} "
+          f"{'aio':>12s}   (requests/sec)")
+    for nthr in nthreads:
+        res = results[nthr] = {}
+        res['naive'] = run_threads(requests, nthr, naive)
+        with xraydb.Coalescer(window=args.window) as coalescer:
+            res['coalesced'] = run_threads(requests, nthr,
+                                           lambda name, what, en:
+                                           getattr(coalescer, name)(what, en))
+        res['aio-naive'] = run_aio(requests, nthr, batched=False)
+        res['aio'] = run_aio(requests, nthr, batched=True)
+        print(f'{nthr:8d} ' + ' '.join(f'{len(requests)/res[k]:12.0f}'
+                                       for k in ('naive', 'coalesced', 'aio-naive', 'aio')),
+              flush=True)
+    aio.shutdown()
+
+    if args.save is not None:
+        with open(args.save, 'w', encoding='utf-8') as fh:
+            json.dump({'xraydb': xraydb.__version__, 'requests': len(requests),
+                       'window': args.window, 'seconds': results}, fh, indent=2)
+        print(f'wrote {args.save}')
+
+
+if __name__ == '__main__':
+    main()
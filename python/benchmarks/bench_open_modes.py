@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmarks of query latency for the modes for opening the XrayDB file
+
+For each mode ('file', 'readonly', 'immutable', 'memory'), reports
+   open:     time to create XrayDB, in a new process
+   cold:     time for the first query for each of a few tables, in a new process
+   warm:     time per repeated (uncached) query, after the database is open
+
+Usage:
+    python bench_open_modes.py
+    python bench_open_modes.py --dbname /path/to/network/home/xraydb.sqlite
+    python bench_open_modes.py --save modes.json
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import sqlalchemy
+from xraydb.xraydb import XrayDB, OPEN_MODES
+from run_benchmarks import format_time
+
+ELEMENTS = ('H', 'C', 'O', 'Si', 'Fe', 'Cu', 'Mo', 'Ag', 'W', 'Au', 'Pb', 'U')
+
+QUERIES = (('photoabsorption', 'element'), ('scattering', 'element'),
+           ('Chantler', 'element'), ('xray_levels', 'element'))
+
+COLD = """
+import time, json, sqlalchemy
+t0 = time.perf_counter()
+from xraydb.xraydb import XrayDB
+xdb = XrayDB({dbname!r}, mode={mode!r})
+t1 = time.perf_counter()
+for tname, col in {queries!r}:
+    tab = xdb.tables[tname]
+    xdb.session.execute(tab.select().where(tab.c[col] == 'Fe')).fetchall()
+t2 = time.perf_counter()
+print(json.dumps({{'open': t1-t0, 'cold': (t2-t1)/len({queries!r})}}))
+"""
+
+def run_query(xdb, tname, col, value):
+    tab = xdb.tables[tname]
+    return xdb.session.execute(tab.select().where(tab.c[col] == value)).fetchall()
+
+
+def bench_mode(mode, dbname='xraydb.sqlite', repeat=5, nwarm=20):
+    "open, cold, and warm query times for a mode"
+    code = COLD.format(dbname=dbname, mode=mode, queries=QUERIES)
+    opens, colds = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], check=True,
+                             capture_output=True, text=True)
+        dat = json.loads(out.stdout.strip().split('\n')[-1])
+        opens.append(dat['open'])
+        colds.append(dat['cold'])
+
+    xdb = XrayDB(dbname, mode=mode)
+    for tname, col in QUERIES:
+        run_query(xdb, tname, col, 'Fe')
+    t0 = time.perf_counter()
+    for _ in range(nwarm):
+        for elem in ELEMENTS:
+            for tname, col in QUERIES:
+                run_query(xdb, tname, col, elem)
+    warm = (time.perf_counter() - t0)/(nwarm*len(ELEMENTS)*len(QUERIES))
+    xdb.close()
+    return {'open': min(opens), 'cold': min(colds), 'warm': warm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='query latency for XrayDB open modes')
+    parser.add_argument('--dbname', default='xraydb.sqlite', help='database file')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of new processes for open and cold times')
+    parser.add_argument('--save', default=None, help='save results to JSON file')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'mode':12s} {'open':>12s} {'cold query':>12s} {'warm query':>12s}")
+    for mode in OPEN_MODES:
+        res = results[mode] = bench_mode(mode, dbname=args.dbname, repeat=args.repeat)
+        print(f"{mode:12s} {format_time(res['open'])} {format_time(res['cold'])} "
+              f"{format_time(res['warm'])}", flush=True)
+
+    if args.save is not None:
+        with open(args.save, 'w', encoding='utf-8') as fh:
+            json.dump({'sqlalchemy': sqlalchemy.__version__, 'results': results},
+                      fh, indent=2)
+        print(f'wrote {args.save}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the public calculations of xraydb
+
+Each benchmark is timed for scalar inputs and for arrays of 1e3 and 1e6
+points (where the calculation supports arrays), and reports the best time
+per call.  Results can be saved as a JSON file with --save, and later
+runs compared to that file with --compare, reporting calculations that
+became slower.  No baseline is included, as timings depend on the machine:
+save one on the machine to be compared, before making changes.
+
+Usage:
+    python run_benchmarks.py                      # run all, print table
+    python run_benchmarks.py --quick              # skip 1e6 sizes, fewer repeats
+    python run_benchmarks.py -k mu_ -k f1         # only benchmarks matching names
+    python run_benchmarks.py -k import            # only import/startup times
+    python run_benchmarks.py --save baseline.json  # before changes
+    python run_benchmarks.py --compare baseline.json --threshold 1.25
+
+With --compare, the exit status is 1 if any benchmark is slower than the
+baseline by more than the threshold factor.
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import zipfile
+import tempfile
+import platform
+import argparse
+import subprocess
+import numpy as np
+
+import xraydb
+
+SIZES = {'scalar': 1, '1e3': 1000, '1e6': 1000000}
+
+BENCHMARKS = {}
+
+def benchmark(*sizes):
+    """register a benchmark: the decorated function takes the number of points
+    and returns a callable with no arguments to be timed"""
+    def decorator(func):
+        BENCHMARKS[func.__name__] = (func, sizes)
+        return func
+    return decorator
+
+
+def energies(npts, emin=5000.0, emax=25000.0):
+    "energy array, or scalar energy for npts=1"
+    if npts == 1:
+        return 0.5*(emin+emax)
+    return np.linspace(emin, emax, npts)
+
+
+@benchmark('scalar', '1e3', '1e6')
+def mu_elam(npts):
+    en = energies(npts)
+    return lambda: xraydb.mu_elam('Fe', en)
+
+
+@benchmark('scalar', '1e3', '1e6')
+def material_mu(npts):
+    en = energies(npts)
+    return lambda: xraydb.material_mu('kapton', en)
+
+
+@benchmark('scalar', '1e3', '1e6')
+def f0(npts):
+    q = 0.5 if npts == 1 else np.linspace(0, 2, npts)
+    return lambda: xraydb.f0('Fe', q)
+
+
+@benchmark('scalar', '1e3', '1e6')
+def f1_chantler(npts):
+    en = energies(npts)
+    return lambda: xraydb.f1_chantler('Fe', en)
+
+
+@benchmark('scalar', '1e3')
+def xray_lines(npts):
+    "scalar: one element;  1e3: lines for elements Z=20..92, cycled"
+    if npts == 1:
+        return lambda: xraydb.xray_lines('Fe')
+    zvals = [20 + i % 73 for i in range(npts)]
+    return lambda: [xraydb.xray_lines(z) for z in zvals]
+
+
+@benchmark('scalar', '1e3', '1e6')
+def guess_edge(npts):
+    "scalar: guess_edge;  arrays: guess_edges"
+    if npts == 1:
+        return lambda: xraydb.guess_edge(7115.0)
+    en = np.linspace(2000, 80000, npts)
+    return lambda: xraydb.guess_edges(en)
+
+
+@benchmark('scalar')
+def darwin_width(npts):
+    return lambda: xraydb.darwin_width(10000.0, 'Si', (1, 1, 1))
+
+
+@benchmark('scalar', '1e3', '1e6')
+def multilayer_reflectivity(npts):
+    theta = 0.005 if npts == 1 else np.linspace(0.001, 0.02, npts)
+    return lambda: xraydb.multilayer_reflectivity(['Mo', 'Si'], [30.0, 40.0],
+                                                  'Si', theta, 10000.0,
+                                                  n_periods=20)
+
+
+@benchmark('scalar', '1e3', '1e6')
+def ionchamber_fluxes(npts):
+    en = energies(npts)
+    volts = 1.0 if npts == 1 else np.linspace(0.5, 2.0, npts)
+    return lambda: xraydb.ionchamber_fluxes('nitrogen', volts=volts,
+                                            length=10.0, energy=en)
+
+
+@benchmark('scalar', '1e3')
+def transmission_sample(npts):
+    "scalar: transmission_sample;  1e3: transmission_samples of dilutions"
+    if npts == 1:
+        return lambda: xraydb.transmission_sample({'Fe2O3': 0.1, 'BN': -1}, 7162.0)
+    samples = [{'Fe2O3': x, 'BN': -1} for x in np.linspace(0.01, 0.5, npts)]
+    return lambda: xraydb.transmission_samples(samples, 7162.0)
+
+
+def time_import(repeat=5, pythonpath=None):
+    """best time (in seconds) to import xraydb and open the database in a
+    new process, with xraydb found on pythonpath if given"""
+    code = 'import xraydb; xraydb.get_xraydb()'
+    env = None
+    if pythonpath is not None:
+        env = dict(os.environ, PYTHONPATH=pythonpath)
+        env.pop('XRAYDB_MODE', None)
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def make_zipapp(zipname):
+    "write the xraydb package to a zip file, as it would be in a zipapp"
+    pkgdir = os.path.dirname(xraydb.__file__)
+    with zipfile.ZipFile(zipname, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        for fname in os.listdir(pkgdir):
+            if fname.endswith(('.py', '.sqlite', '.dat')):
+                zfile.write(os.path.join(pkgdir, fname), f'xraydb/{fname}')
+
+
+def time_call(func, repeat=5, min_time=0.2):
+    "best time (in seconds) per call"
+    func()    # warm up caches
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number*min_time/0.2))
+    return min(timer.repeat(repeat=repeat, number=number))/number
+
+
+def run(names=None, quick=False, verbose=True):
+    """run benchmarks, returning dict of {'name[size]': seconds}"""
+    repeat = 3 if quick else 5
+    results = {}
+    for name, (func, sizes) in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        for size in sizes:
+            if quick and size == '1e6':
+                continue
+            key = f'{name}[{size}]'
+            results[key] = time_call(func(SIZES[size]), repeat=repeat,
+                                     min_time=0.05 if quick else 0.2)
+            if verbose:
+                print(f'{key:36s} {format_time(results[key])}', flush=True)
+    if not names or 'import' in names:
+        results['import[startup]'] = time_import(repeat=repeat)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            zipname = os.path.join(tmpdir, 'tool.pyz')
+            make_zipapp(zipname)
+            results['import[zip]'] = time_import(repeat=repeat, pythonpath=zipname)
+        if verbose:
+            for key in ('import[startup]', 'import[zip]'):
+                print(f'{key:36s} {format_time(results[key])}')
+    return results
+
+
+def format_time(seconds):
+    "format time in s, ms, us, or ns"
+    for scale, unit in ((1, 's'), (1.e-3, 'ms'), (1.e-6, 'us')):
+        if seconds >= scale:
+            return f'{seconds/scale:9.3f} {unit}'
+    return f'{seconds/1.e-9:9.3f} ns'
+
+
+def metadata():
+    return {'xraydb': xraydb.__version__, 'numpy': np.__version__,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'machine': platform.machine(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def compare(results, baseline, threshold=1.25):
+    """compare results to baseline, printing a table of ratios, and
+    returning list of benchmarks slower by more than threshold"""
+    regressions = []
+    print(f"\n{'benchmark':36s} {'baseline':>12s} {'current':>12s}  ratio")
+    for key, current in results.items():
+        base = baseline.get(key, None)
+        if base is None:
+            print(f'{key:36s} {"--":>12s} {format_time(current)}    new')
+            continue
+        ratio = current/base
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            regressions.append(key)
+        elif ratio < 1/threshold:
+            flag = '  faster'
+        print(f'{key:36s} {format_time(base)} {format_time(current)} {ratio:6.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmarks for xraydb')
+    parser.add_argument('-k', dest='names', action='append', default=[],
+                        help="run only benchmarks whose name contains this string, "
+                        "or 'import' for import/startup times")
+    parser.add_argument('--quick', action='store_true',
+                        help='skip 1e6-point sizes and use fewer repeats')
+    parser.add_argument('--save', default=None, help='save results to JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='compare results to JSON baseline file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='ratio to baseline to report as regression [1.25]')
+    args = parser.parse_args()
+
+    results = run(names=args.names, quick=args.quick)
+    if args.save is not None:
+        with open(args.save, 'w', encoding='utf-8') as fh:
+            json.dump({'meta': metadata(), 'results': results}, fh, indent=2)
+        print(f'wrote {args.save}')
+
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline['results'], threshold=args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+""" Tests of asyncio interface  """
+import time
+import asyncio
+import threading
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+import xraydb
+from xraydb import aio
+
+
+def test_aio_concurrent():
+    energies = np.linspace(5000, 25000, 200)
+    elements = ['Fe', 'Cu', 'Mo']
+
+    async def main():
+        calls = []
+        for en in energies:
+            for elem in elements:
+                calls.append(aio.mu_elam(elem, en))
+            calls.append(aio.material_mu('kapton', en))
+        calls.append(aio.mu_elam('Fe', energies[:10]))
+        calls.append(aio.xray_delta_beta('SiO2', 2.2, energies[:5]))
+        calls.append(aio.xray_delta_beta('SiO2', 2.2, 8000.0))
+        calls.append(aio.darwin_width(10000.0, 'Si', (1, 1, 1)))
+        return await asyncio.gather(*calls)
+
+    out = asyncio.run(main())
+    i = 0
+    for en in energies:
+        for elem in elements:
+            assert np.ndim(out[i]) == 0
+            assert_array_equal(out[i], xraydb.mu_elam(elem, en))
+            i += 1
+        assert_array_equal(out[i], xraydb.material_mu('kapton', en))
+        i += 1
+    assert_array_equal(out[i], xraydb.mu_elam('Fe', energies[:10]))
+    for val, expected in zip(out[i+1], xraydb.xray_delta_beta('SiO2', 2.2, energies[:5])):
+        assert_array_equal(val, expected)
+    for val, expected in zip(out[i+2], xraydb.xray_delta_beta('SiO2', 2.2, 8000.0)):
+        assert np.ndim(val) == 0
+        assert_array_equal(val, expected)
+    assert_allclose(out[i+3].theta_fwhm, xraydb.darwin_width(10000.0).theta_fwhm)
+
+
+def test_aio_errors():
+    async def main():
+        return await asyncio.gather(aio.mu_elam('Fe', 8000.0),
+                                    aio.mu_elam('Xx', 8000.0),
+                                    return_exceptions=True)
+    good, bad = asyncio.run(main())
+    assert_allclose(good, xraydb.mu_elam('Fe', 8000.0))
+    assert isinstance(bad, Exception)
+
+
+def test_aio_limits_and_cancel():
+    running = {'now': 0, 'most': 0}
+    lock = threading.Lock()
+
+    def slow(x):
+        with lock:
+            running['now'] += 1
+            running['most'] = max(running['most'], running['now'])
+        time.sleep(0.02)
+        with lock:
+            running['now'] -= 1
+        return x
+
+    async def main():
+        aio.configure(max_concurrency=2)
+        try:
+            results = await asyncio.gather(*(aio.run(slow, i) for i in range(8)))
+            task = asyncio.ensure_future(aio.run(slow, 99))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            aio.configure(max_concurrency=8)
+        return results
+
+    assert asyncio.run(main()) == list(range(8))
+    assert running['most'] <= 2
+
+
+def test_coalescer():
+    from concurrent.futures import ThreadPoolExecutor
+    energies = np.linspace(5000, 25000, 500)
+    with xraydb.Coalescer(window=0.005) as coalescer:
+        with ThreadPoolExecutor(16) as pool:
+            fe = list(pool.map(lambda en: coalescer.mu_elam('Fe', en), energies))
+            kapton = list(pool.map(lambda en: coalescer.material_mu('kapton', en),
+                                   energies))
+        assert coalescer.nrequests == 2*len(energies)
+        assert coalescer.ncalls < len(energies)
+
+        assert_array_equal(fe, xraydb.mu_elam('Fe', energies))
+        assert_array_equal(kapton, xraydb.material_mu('kapton', energies))
+        assert np.ndim(fe[0]) == 0
+
+        # results do not depend on the other requests in a batch
+        with ThreadPoolExecutor(16) as pool:
+            f2 = list(pool.map(lambda en: coalescer.f2_chantler('Fe', en), energies))
+        assert_array_equal(f2, [xraydb.f2_chantler('Fe', en) for en in energies])
+        with pytest.raises(ValueError):
+            coalescer.submit('f1_chantler', 'Fe', 8000.0)
+
+        # errors are reported only for the request that caused them
+        good = coalescer.submit('mu_elam', 'Fe', 8000.0)
+        bad = coalescer.submit('mu_elam', 'Fe', 'not an energy')
+        assert_allclose(good.result(), xraydb.mu_elam('Fe', 8000.0))
+        assert bad.exception() is not None
+
+        with pytest.raises(ValueError):
+            coalescer.submit('darwin_width', 10000.0)
+
+    with pytest.raises(RuntimeError):
+        coalescer.submit('mu_elam', 'Fe', 8000.0)
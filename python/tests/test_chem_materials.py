@@ -9,7 +9,7 @@ from numpy.testing import assert_allclose
 
 from xraydb import (chemparse, validate_formula, material_mu,
                     material_mu_components, find_material, get_materials,
-                    get_material, add_material)
+                    get_material, add_material, add_materials)
 
 from xraydb.materials import get_user_materialsfile
 
@@ -230,3 +230,59 @@ def test_material_add():
     os.unlink(matfile)
     if os.path.exists(savefile):
         shutil.move(savefile, matfile)
+
+
+def test_materials_add_bulk(tmp_path, monkeypatch):
+    import xraydb.materials
+    matfile = str(tmp_path / 'materials.dat')
+    monkeypatch.setattr(xraydb.materials, 'get_user_materialsfile',
+                        lambda create_folder=False: matfile)
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+    get_materials(force_read=True)
+
+    add_materials([('sample_%d' % i, 'Fe%dO' % (i+1), 5.0) for i in range(500)])
+    add_materials([{'name': 'bnpowder', 'formula': 'BN', 'density': 2.1,
+                    'categories': ['dilutant']}])
+    assert get_material('sample_250') == ('Fe251O', 5.0)
+    assert 'bnpowder' in get_materials(categories='dilutant')
+
+    with open(matfile, 'r') as fh:
+        lines = fh.readlines()
+    assert len(lines) == 503
+
+    # appended by another process: picked up without force_read
+    with open(matfile, 'a') as fh:
+        fh.write(' extmaterial | 1.5 | polymer | C2H4\n')
+    assert get_material('extmaterial') == ('C2H4', 1.5)
+
+    # rewritten by another process: re-read fully
+    with open(matfile, 'w') as fh:
+        fh.write(' othermaterial | 2.5 | polymer | C3H6\n' * 600)
+    assert get_material('othermaterial') == ('C3H6', 2.5)
+    assert get_material('sample_10') is None
+
+    # partially written line, ending inside a multibyte character
+    with open(matfile, 'ab') as fh:
+        fh.write(' caf\u00e9ine | 1.23 | organic | C8H10N4O2\n'.encode('utf-8'))
+        fh.write(' pl\u00e4tin'.encode('utf-8')[:4])
+    assert get_material('caf\u00e9ine') == ('C8H10N4O2', 1.23)
+    assert get_material('pl\u00e4tin') is None
+    with open(matfile, 'ab') as fh:
+        fh.write(' pl\u00e4tin'.encode('utf-8')[4:] + b' | 21.4 | metal | Pt\n')
+    assert get_material('pl\u00e4tin') == ('Pt', 21.4)
+
+    # changes are not looked for until the check interval has passed
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 3600)
+    materials = get_materials()
+    with open(matfile, 'a') as fh:
+        fh.write(' latematerial | 1.1 | polymer | C2H4\n')
+    assert get_material('latematerial') is None
+    assert get_material('othermaterial') == ('C3H6', 2.5)
+    assert 'latematerial' in get_materials(force_read=True)
+    assert 'latematerial' not in materials
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+
+    os.unlink(matfile)
+    assert get_material('othermaterial') is None
+    monkeypatch.undo()
+    get_materials(force_read=True)
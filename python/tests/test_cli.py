@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+""" Tests of command-line batch calculator  """
+import io
+import sys
+import numpy as np
+from numpy.testing import assert_allclose
+
+import xraydb
+from xraydb.cli import main, calculate
+
+ROWS = """material,density,energy,thickness
+kapton,,8000,0.005
+Fe,7.8,7100,0.001
+SiO2,2.2,9000,0.1
+kapton,,9000,0.005
+"""
+
+def test_calculate():
+    out, errors = calculate(['kapton', 'Fe', 'kapton', 'nothing'],
+                            [np.nan, 7.8, np.nan, np.nan],
+                            [8000., 7100., 9000., 8000.],
+                            thickness=[0.005, 0.001, 0.005, 1.0],
+                            quantities=('mu', 'atlen', 'delta', 'beta', 'transmission'))
+    assert_allclose(out['mu'][[0, 2]], xraydb.material_mu('kapton', [8000., 9000.]))
+    assert_allclose(out['mu'][1], xraydb.material_mu('Fe', 7100., density=7.8))
+    assert_allclose(out['atlen'][:3], 1/out['mu'][:3])
+    assert_allclose(out['transmission'][0], np.exp(-0.005*out['mu'][0]))
+    delta, beta, _ = xraydb.xray_delta_beta('Fe', 7.8, 7100.)
+    assert_allclose(out['delta'][1], delta)
+    assert_allclose(out['beta'][1], beta)
+    assert_allclose(out['density'][:3], [1.42, 7.8, 1.42])
+    assert np.isnan(out['mu'][3])
+    assert list(errors.keys()) == ['nothing']
+
+
+def test_cli_csv(tmp_path, monkeypatch, capsys):
+    infile = tmp_path / 'rows.csv'
+    infile.write_text(ROWS)
+    outfile = tmp_path / 'out.csv'
+    assert main([str(infile), '-o', str(outfile), '-q', 'mu,transmission',
+                 '--chunk-size', '3']) == 0
+    lines = outfile.read_text().strip().split('\n')
+    assert lines[0] == 'material,density,energy,thickness,mu,transmission'
+    assert len(lines) == 5
+    words = lines[3].split(',')
+    assert words[0] == 'SiO2'
+    assert_allclose(float(words[4]), xraydb.material_mu('SiO2', 9000.0, density=2.2))
+
+    # energies from stdin, with material and thickness given
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('8000\n9000\n'))
+    assert main(['-', '-m', 'water', '-t', '0.1', '-q', 'mu,transmission']) == 0
+    lines = capsys.readouterr().out.strip().split('\n')
+    assert len(lines) == 3
+    assert_allclose(float(lines[2].split(',')[5]),
+                    np.exp(-0.1*xraydb.material_mu('water', 9000.0)))
+
+
+def test_cli_npy(tmp_path):
+    npts = 2500
+    data = np.zeros(npts, dtype=[('material', 'U16'), ('density', 'f8'), ('energy', 'f8')])
+    data['material'] = np.where(np.arange(npts) % 2 == 0, 'kapton', 'SiO2')
+    data['density'] = np.where(data['material'] == 'SiO2', 2.2, np.nan)
+    data['energy'] = np.linspace(5000, 20000, npts)
+    infile, outfile = str(tmp_path / 'rows.npy'), str(tmp_path / 'out.npy')
+    np.save(infile, data)
+
+    assert main([infile, '-o', outfile, '-q', 'mu,beta', '-c', '1000', '-j', '2']) == 0
+    out = np.load(outfile)
+    assert len(out) == npts
+    assert list(out['material'][:2]) == ['kapton', 'SiO2']
+    assert_allclose(out['mu'][::2], xraydb.material_mu('kapton', data['energy'][::2]))
+    assert_allclose(out['mu'][1::2], xraydb.material_mu('SiO2', data['energy'][1::2],
+                                                        density=2.2))
+    assert_allclose(out['density'][:2], [1.42, 2.2])
+
+
+def test_cli_material_names(tmp_path, capsys):
+    # long names are not truncated in NPY output
+    longname = 'Si' + 'O2Si'*20 + 'O2'
+    infile, outfile = tmp_path / 'rows.csv', str(tmp_path / 'out.npy')
+    infile.write_text(f'material,density,energy\n{longname},2.2,9000\n')
+    assert main([str(infile), '-o', outfile]) == 1
+    assert 'longer than 64' in capsys.readouterr().err
+    assert main([str(infile), '-o', outfile, '--material-len', '100']) == 0
+    out = np.load(outfile)
+    assert out['material'][0] == longname
+    assert_allclose(out['mu'][0], xraydb.material_mu(longname, 9000.0, density=2.2))
+
+    # rows without a material are an error, not calculated for 'None'
+    infile.write_text('material,density,energy\nkapton,,8000\n,,9000\n')
+    assert main([str(infile), '-o', str(tmp_path / 'out.csv')]) == 1
+    assert 'without a material' in capsys.readouterr().err
+    np.save(str(tmp_path / 'energies.npy'),
+            np.zeros(3, dtype=[('density', 'f8'), ('energy', 'f8')]))
+    assert main([str(tmp_path / 'energies.npy'), '-o', outfile]) == 1
+    assert "no 'material' field" in capsys.readouterr().err
+
+
+def test_cli_thickness(tmp_path, capsys):
+    "transmission with no thickness is reported as an error"
+    infile = tmp_path / 'energies.csv'
+    infile.write_text('8000\n9000\n')
+    assert main([str(infile), '-m', 'water', '-q', 'mu,transmission']) == 2
+    captured = capsys.readouterr()
+    assert "could not calculate for 'water': no thickness" in captured.err
+    lines = captured.out.strip().split('\n')
+    assert float(lines[1].split(',')[4]) > 0
+    assert lines[1].split(',')[5] == 'nan'
+
+    out, errors = calculate(['water', 'water'], [np.nan, np.nan], [8000., 9000.],
+                            thickness=[0.1, np.nan], quantities=('transmission',))
+    assert_allclose(out['transmission'][0], np.exp(-0.1*xraydb.material_mu('water', 8000.)))
+    assert list(errors.keys()) == ['water']
+    assert main([str(infile), '-m', 'water', '-q', 'mu']) == 0
+
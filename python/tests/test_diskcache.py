@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+""" Tests of persistent disk cache  """
+import os
+import sys
+import subprocess
+import pytest
+from collections import namedtuple
+import numpy as np
+from numpy.testing import assert_allclose
+
+import xraydb
+from xraydb import XrayDB
+from xraydb import diskcache
+
+Pair = namedtuple('Pair', ('total', 'values'))
+
+
+@diskcache.disk_cached()
+def cached_pair(values, scale=2.0):
+    values = np.asarray(values)
+    return Pair(scale*values.sum(), scale*values)
+
+
+@pytest.fixture
+def cachedir(tmp_path):
+    xraydb.enable_disk_cache(str(tmp_path))
+    yield str(tmp_path)
+    xraydb.disable_disk_cache()
+
+
+def test_disk_cache(cachedir):
+    expected = cached_pair([1.0, 2.0, 3.0])
+    xraydb.clear_disk_cache()
+    hits = xraydb.disk_cache_info()['hits']
+
+    first = cached_pair([1.0, 2.0, 3.0])
+    # same call with keyword arguments and defaults is found in the cache
+    second = cached_pair(values=[1.0, 2.0, 3.0], scale=2.0)
+    info = xraydb.disk_cache_info()
+    assert info['files'] == 1
+    assert info['hits'] == hits + 1
+    assert type(second) is type(expected)
+    for name, val in expected._asdict().items():
+        assert_allclose(getattr(second, name), val)
+        assert_allclose(getattr(first, name), val)
+
+    energy = np.linspace(1000, 30000, 2000)
+    mu1 = xraydb.material_mu('kapton', energy)
+    mu2 = xraydb.material_mu('kapton', energy)
+    assert_allclose(mu1, mu2, rtol=0)
+    assert xraydb.disk_cache_info()['files'] == 2
+
+    # small calls are not cached
+    xraydb.material_mu('kapton', 8000.0)
+    assert xraydb.disk_cache_info()['files'] == 2
+
+    # a partly written or damaged file is not used
+    for dirpath, _, fnames in os.walk(cachedir):
+        for fname in fnames:
+            if fname.endswith('.npy'):
+                with open(os.path.join(dirpath, fname), 'wb') as fh:
+                    fh.write(b'not numpy')
+    assert_allclose(xraydb.material_mu('kapton', energy), mu1, rtol=0)
+
+
+def test_disk_cache_evict(cachedir):
+    xraydb.enable_disk_cache(cachedir, max_size=100000)
+    energy = np.linspace(1000, 30000, 2000)
+    for density in np.linspace(1.0, 2.0, 10):
+        xraydb.material_mu('water', energy, density=density)
+    info = xraydb.disk_cache_info()
+    assert 0 < info['size'] <= 100000
+    assert info['files'] < 10
+
+
+def test_disk_cache_processes(cachedir):
+    "results written by another process are used"
+    code = ('import numpy as np, xraydb; '
+            'xraydb.material_mu("Ge", np.linspace(5000, 9000, 2000)); '
+            'print(xraydb.disk_cache_info()["misses"])')
+    env = dict(os.environ, XRAYDB_DISK_CACHE=cachedir)
+    out = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                         capture_output=True, text=True)
+    assert out.stdout.strip() == '1'
+    hits = xraydb.disk_cache_info()['hits']
+    xraydb.material_mu('Ge', np.linspace(5000, 9000, 2000))
+    assert xraydb.disk_cache_info()['hits'] == hits + 1
+    assert not any(fname.endswith('.tmp') for _, _, fnames in os.walk(cachedir)
+                   for fname in fnames)
+
+
+def test_disk_cache_materials(cachedir, tmp_path, monkeypatch):
+    "redefining a material does not give stale cached results"
+    import xraydb.materials
+    matfile = str(tmp_path / 'materials.dat')
+    monkeypatch.setattr(xraydb.materials, 'get_user_materialsfile',
+                        lambda create_folder=False: matfile)
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+    xraydb.get_materials(force_read=True)
+
+    energy = np.linspace(1000, 30000, 2000)
+    theta = np.linspace(0, 0.01, 2000)
+    xraydb.add_material('cachetest', 'SiO2', 2.2)
+    mu1 = xraydb.material_mu('cachetest', energy)
+    refl1 = xraydb.mirror_reflectivity('cachetest', theta, 10000.0)
+    xraydb.add_material('cachetest', 'Fe2O3', 5.25)
+    mu2 = xraydb.material_mu('cachetest', energy)
+    refl2 = xraydb.mirror_reflectivity('cachetest', theta, 10000.0)
+    assert_allclose(mu2, xraydb.material_mu('Fe2O3', energy, density=5.25), rtol=0)
+    assert_allclose(refl2, xraydb.mirror_reflectivity('Fe2O3', theta, 10000.0,
+                                                      density=5.25), rtol=0)
+    assert not np.allclose(mu1, mu2)
+    assert not np.allclose(refl1, refl2)
+
+    # an unknown material raises the usual error, and is not cached
+    with pytest.raises(Warning):
+        xraydb.material_mu('not_a_material_xyz', energy)
+    assert xraydb.disk_cache_info()['files'] == 6
+    monkeypatch.undo()
+    xraydb.get_materials(force_read=True)
+
+
+def test_disk_cache_scalars(cachedir):
+    "fast calculations for single values are not cached"
+    xraydb.darwin_width(10000.0, 'Si', (1, 1, 1))
+    xraydb.material_mu('kapton', 8000.0)
+    assert xraydb.disk_cache_info()['files'] == 0
+
+
+def test_disk_cache_coalesced(cachedir):
+    "combined calculations of coalesced requests are not cached"
+    from xraydb.coalesce import group_key, evaluate_group
+    energies = [np.linspace(5000, 9000, 600), np.linspace(9000, 15000, 600)]
+    key = group_key('material_mu', ('kapton', None), {'density': None, 'kind': 'total'})
+    results = evaluate_group(key, energies)
+    assert xraydb.disk_cache_info()['files'] == 0
+    for energy, result in zip(energies, results):
+        assert_allclose(result, xraydb.material_mu('kapton', energy), rtol=0)
+    # separate calls are still cached
+    xraydb.material_mu('kapton', np.linspace(5000, 9000, 2000))
+    assert xraydb.disk_cache_info()['files'] == 1
+
+
+def test_disk_cache_shared_size(cachedir, monkeypatch):
+    "files written by other processes count toward the size limit"
+    xraydb.enable_disk_cache(cachedir, max_size=100000)
+    monkeypatch.setattr(diskcache, 'SIZE_CHECK_INTERVAL', 0)
+    energy = np.linspace(1000, 30000, 2000)
+    xraydb.material_mu('water', energy)
+    other = os.path.join(cachedir, 'other_process')
+    os.makedirs(other)
+    for i in range(5):
+        fname = os.path.join(other, f'{i}.npy')
+        np.save(fname, np.zeros(4000))
+        os.utime(fname, (1.e9, 1.e9))
+    xraydb.material_mu('water', energy, density=1.1)
+    info = xraydb.disk_cache_info()
+    assert 0 < info['size'] <= 100000
+    assert len(os.listdir(other)) < 5
+
+
+def test_disk_cache_db_version(cachedir, monkeypatch):
+    "the database version is found again for a new database instance"
+    version = diskcache._db_version()
+    xdb = XrayDB()
+    monkeypatch.setattr(xraydb.xray, '_xraydb', xdb)
+    assert diskcache._db_version() == version
+    assert diskcache._config['db_version'][0]() is xdb
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+""" Tests of parallel map with shared tables  """
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+import xraydb
+from xraydb.parallel import Pool, SharedTables, auto_chunksize
+
+
+def decoded_is_shared(elem):
+    "whether the Elam table for an element is a read-only view of shared memory"
+    xdb = xraydb.get_xraydb()
+    table = xdb._decoded.get((elem, 'photo'), None)
+    return table is not None and not table[0].flags.writeable
+
+
+def test_shared_tables():
+    tables = SharedTables(elements=['Fe', 'Cu'])
+    try:
+        assert ('Fe', 'photo') in tables.index
+        assert ('Cu', 'chantler', 'f1') in tables.index
+        assert ('Compton_energies', None) in tables.index
+        assert tables.size > 1000
+    finally:
+        tables.close()
+    assert auto_chunksize(100, 4) == 7
+    assert auto_chunksize(3, 4) == 1
+    # builtins are not shadowed by 'from xraydb.parallel import *'
+    import xraydb.parallel
+    assert not hasattr(xraydb.parallel, 'map')
+    assert callable(xraydb.parallel.pool_map)
+
+
+def test_parallel_pool():
+    energy = np.linspace(2000, 30000, 501)
+    names = ['kapton', 'water', 'silicon', 'air']
+    with Pool(2) as pool:
+        assert all(pool.map(decoded_is_shared, ['Fe', 'Mo', 'Au']))
+        edges = pool.map(xraydb.xray_edges, range(20, 40))
+        mus = pool.starmap(xraydb.material_mu, [(name, energy) for name in names])
+        f1 = pool.map_energy(xraydb.f1_chantler, 'Cu', energy=energy, nchunks=3)
+        dbeta = pool.map_energy(xraydb.xray_delta_beta, 'SiO2', 2.2, energy=energy)
+        mu_chunks = pool.map_energy(xraydb.material_mu, 'kapton', energy=energy, nchunks=3)
+
+    for z, edge in zip(range(20, 40), edges):
+        assert edge == xraydb.xray_edges(z)
+    for name, mu in zip(names, mus):
+        assert_allclose(mu, xraydb.material_mu(name, energy), rtol=1.e-12)
+    assert_array_equal(mu_chunks, xraydb.material_mu('kapton', energy))
+    # functions depending on the energy range are not split into chunks
+    assert_array_equal(f1, xraydb.f1_chantler('Cu', energy))
+    for val, expected in zip(dbeta, xraydb.xray_delta_beta('SiO2', 2.2, energy)):
+        assert_array_equal(val, expected)
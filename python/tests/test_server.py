@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+""" Tests of HTTP/JSON service  """
+import json
+import threading
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+import xraydb
+from xraydb.server import XrayDBServer, MAX_BATCH
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = XrayDBServer(('127.0.0.1', 0), max_workers=4, cache_size=100)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(server, path, data=None):
+    url = f'http://127.0.0.1:{server.server_address[1]}{path}'
+    req = None
+    if data is not None:
+        req = Request(url, data=json.dumps(data).encode('utf-8'),
+                      headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(req or url, timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def test_server_call(server):
+    status, out = fetch(server, '/functions')
+    assert status == 200
+    assert 'mu_elam' in out and 'material_mu' in out
+    assert 'add_material' not in out
+
+    energies = [7000.0, 8000.0, 9000.0]
+    status, out = fetch(server, '/call', {'function': 'mu_elam',
+                                          'args': ['Fe', energies]})
+    assert status == 200
+    assert_allclose(out['result'], xraydb.mu_elam('Fe', np.array(energies)))
+
+    status, out = fetch(server, '/call/material_mu?name=kapton&energy=8000')
+    assert status == 200
+    assert_allclose(out['result'], xraydb.material_mu('kapton', 8000))
+
+    status, out = fetch(server, '/call', {'function': 'xray_edge',
+                                          'args': ['Fe', 'K']})
+    assert status == 200
+    assert_allclose(out['result']['energy'], xraydb.xray_edge('Fe', 'K').energy)
+
+    # same request with keyword arguments and default comes from the cache
+    hits = server.stats['cache_hits']
+    status, out = fetch(server, '/call', {'function': 'mu_elam',
+                                          'kwargs': {'element': 'Fe', 'energy': energies,
+                                                     'kind': 'total'}})
+    assert status == 200
+    assert server.stats['cache_hits'] == hits + 1
+
+    assert fetch(server, '/call', {'function': 'no_such_function'})[0] == 404
+    assert fetch(server, '/call', {'function': 'mu_elam', 'args': []})[0] == 400
+    assert fetch(server, '/call', {'function': 'mu_elam', 'args': ['Xx', 8000]})[0] == 400
+    assert fetch(server, '/nowhere')[0] == 404
+
+
+def test_server_batch(server):
+    energies = np.linspace(5000, 25000, 50)
+    requests = [{'function': 'mu_elam', 'args': ['Cu', float(en)]} for en in energies]
+    requests.append({'function': 'xray_delta_beta', 'args': ['SiO2', 2.2, 8000.0]})
+    requests.append({'function': 'atomic_mass', 'args': ['Xx']})
+    calls = server.stats['calls']
+    status, out = fetch(server, '/batch', {'requests': requests})
+    assert status == 200
+    results = out['results']
+    assert len(results) == len(requests)
+    assert_array_equal([res['result'] for res in results[:50]],
+                       [xraydb.mu_elam('Cu', en) for en in energies])
+    assert_allclose(results[50]['result'], xraydb.xray_delta_beta('SiO2', 2.2, 8000.0))
+    assert 'error' in results[51]
+    # one calculation for all Cu energies
+    assert server.stats['calls'] - calls == 3
+
+    status, out = fetch(server, '/batch', {'requests': [requests[0]]*(MAX_BATCH+1)})
+    assert status == 413
+    assert 'too many requests' in out['error']
+
+
+def test_server_materials(server, tmp_path, monkeypatch):
+    "results for a redefined material are not taken from the response cache"
+    import xraydb.materials
+    matfile = str(tmp_path / 'materials.dat')
+    monkeypatch.setattr(xraydb.materials, 'get_user_materialsfile',
+                        lambda create_folder=False: matfile)
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+    xraydb.get_materials(force_read=True)
+
+    path = '/call/material_mu?name=servertest&energy=10000'
+    xraydb.add_material('servertest', 'SiO2', 2.2)
+    assert_allclose(fetch(server, path)[1]['result'],
+                    xraydb.material_mu('SiO2', 10000.0, density=2.2))
+    assert fetch(server, '/call/get_material?name=servertest')[1]['result'] == ['SiO2', 2.2]
+    xraydb.add_material('servertest', 'Fe2O3', 5.25)
+    assert_allclose(fetch(server, path)[1]['result'],
+                    xraydb.material_mu('Fe2O3', 10000.0, density=5.25))
+    assert fetch(server, '/call/get_material?name=servertest')[1]['result'] == ['Fe2O3', 5.25]
+    monkeypatch.undo()
+    xraydb.get_materials(force_read=True)
+
+
+def test_server_concurrent(server):
+    from concurrent.futures import ThreadPoolExecutor
+    energies = np.linspace(6000, 12000, 40)
+
+    def get(en):
+        return fetch(server, f'/call/mu_elam?element=Mo&energy={en}')[1]['result']
+
+    with ThreadPoolExecutor(8) as pool:
+        out = list(pool.map(get, energies))
+    assert_allclose(out, xraydb.mu_elam('Mo', energies), rtol=1.e-12)
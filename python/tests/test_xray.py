@@ -12,10 +12,10 @@ from xraydb import (chemparse, material_mu, material_mu_components,
                     incoherent_cross_section_elam, atomic_number,
                     atomic_symbol, atomic_mass, atomic_density, xray_edges,
                     xray_edge, xray_lines, xray_line, fluor_yield,
-                    ck_probability, core_width, guess_edge,
+                    ck_probability, core_width, guess_edge, guess_edges,
                     xray_delta_beta, darwin_width, mirror_reflectivity,
                     multilayer_reflectivity, coated_reflectivity,
-                    ionchamber_fluxes, XrayDB)
+                    ionchamber_fluxes, XrayDB, EnergyGrid)
 
 
 from xraydb.xray import (chantler_data, formula_to_mass_fracs,
@@ -396,6 +396,46 @@ def test_guess_edge():
     assert _elem == 'Tb'
     assert _edge == 'M3'
 
+    guesses = guess_edges([v[0] for v in vals])
+    assert guesses == [(elem, edge) for en, elem, edge in vals]
+
+    guesses = guess_edges(np.array([1608.0, 1.e9]), edges=['K', 'L1', 'M3'])
+    assert guesses[0] == ('Tb', 'M3')
+
+def test_find_xray_lines():
+    from xraydb import find_xray_lines, nearest_xray_lines, xray_line_index
+    index = xray_line_index()
+    assert len(index.energy) > 1500
+    assert np.all(np.diff(index.energy) >= 0)
+
+    lines = find_xray_lines(6300, 6500, min_intensity=0.2)
+    found = list(zip(lines.element, lines.line))
+    assert ('Fe', 'Ka1') in found
+    assert ('Fe', 'Ka2') in found
+    assert np.all((lines.energy >= 6300) & (lines.energy <= 6500))
+
+    # excitation energy selects the same lines as xray_lines(), and lines
+    # from combined levels when the first level is excited
+    lines = find_xray_lines(0, 1.e6, excitation_energy=12000)
+    for elem in ('Fe', 'Hg', 'Pb'):
+        sel = lines.element == elem
+        found = set(lines.line[sel & ~np.char.count(lines.initial_level, ',').astype(bool)])
+        assert found == set(xray_lines(elem, excitation_energy=12000).keys())
+    assert 'Mz' in lines.line[lines.element == 'Pb']
+    lines = find_xray_lines(0, 1.e6, excitation_energy=2550)
+    assert 'Mz' not in lines.line[lines.element == 'Pb']
+    assert not np.any(np.isnan(index.edge_energy))
+
+    windows = find_xray_lines([8000, 9000], [8100, 9300])
+    assert len(windows) == 2
+    assert 'Cu' in windows[0].element
+    assert 'Ga' in windows[1].element
+
+    near = nearest_xray_lines([6404, 8048, 9251], excitation_energy=10500)
+    assert list(near.element) == ['Fe', 'Cu', 'Ga']
+    assert list(near.line) == ['Ka1', 'Ka1', 'Ka1']
+
+
 def test_fluor_yeild():
     fy1  = (0.351, 6400.75, 0.8746)
     assert_allclose(fy1, fluor_yield('Fe', 'K', 'Ka', 8000), rtol=0.001)
@@ -693,6 +733,171 @@ def test_ionchamber_fluxes():
     assert_allclose(ic4.incident, 1.394e10, rtol=0.03)
 
 
+def test_ionchamber_fluxes_arrays():
+    from xraydb import ionchamber_gas
+    gas = {'nitrogen':0.5, 'helium': 0.5}
+    assert ionchamber_gas(gas) is ionchamber_gas({'helium': 0.5, 'nitrogen':0.5})
+    assert_allclose(ionchamber_gas(gas).ionization_potential, 38.05)
+    assert_allclose(ionchamber_gas('N2').weights, ionchamber_gas('nitrogen').weights)
+
+    energy = np.linspace(6000, 20000, 15)
+    volts = np.linspace(0.5, 2.0, 15)
+    icarr = ionchamber_fluxes(gas=gas, volts=volts, length=20.0,
+                              energy=energy, sensitivity=1.e-6)
+    assert icarr.incident.shape == (15,)
+    for i in (0, 7, 14):
+        ic = ionchamber_fluxes(gas=gas, volts=volts[i], length=20.0,
+                               energy=energy[i], sensitivity=1.e-6)
+        assert isinstance(ic.incident, float)
+        assert_allclose(icarr.incident[i], ic.incident, rtol=1.e-10)
+        assert_allclose(icarr.transmitted[i], ic.transmitted, rtol=1.e-10)
+
+    # broadcast a single energy over volts and sensitivities
+    icarr = ionchamber_fluxes(gas='nitrogen', volts=[1.0, 2.0], energy=10000.0,
+                              sensitivity=np.array([1, 2]), sensitivity_units='uA/V')
+    assert_allclose(icarr.incident[1], 4*icarr.incident[0])
+
+def test_ionchamber_flux_stream():
+    from xraydb import ionchamber_flux_stream
+    energy = 7000 + 0.25*np.arange(4000)
+    volts = np.linspace(0.5, 2.0, 4000)
+    chunks = [(energy[i:i+500], volts[i:i+500]) for i in range(0, 4000, 500)]
+    chunks.append((9000.0, volts[:10]))
+    out = list(ionchamber_flux_stream(chunks, gas='nitrogen', length=20.0,
+                                      energy_tol=0.5, max_energies=100))
+    assert len(out) == 9
+    assert out[-1].incident.shape == (10,)
+    incident = np.concatenate([fl.incident for fl in out[:-1]])
+    ic = ionchamber_fluxes(gas='nitrogen', volts=volts, length=20.0, energy=energy)
+    assert_allclose(incident, ic.incident, rtol=1.e-4)
+    assert_allclose(out[-1].transmitted,
+                    ionchamber_fluxes(gas='nitrogen', volts=volts[:10], length=20.0,
+                                      energy=9000.0).transmitted, rtol=1.e-10)
+
+
+
+def test_beampath(tmp_path, monkeypatch):
+    import xraydb.materials
+    from xraydb import BeamPath, material_mu, add_material, get_materials
+    bp = BeamPath()
+    bp.add_window('kapton', 0.0025)
+    bp.add_ionchamber('nitrogen', 10.0, name='I0', sensitivity=1.e-8)
+    bp.add_air(20.0)
+    bp.add_window('kapton', 0.0025)
+    bp.add_ionchamber({'nitrogen': 0.5, 'argon': 0.5}, 10.0, name='It',
+                      sensitivity=1.e-8)
+    energy = np.linspace(7000, 9000, 21)
+    out = bp.fluxes(energy, flux=1.e11)
+    assert out.incident.shape == (5, 21)
+    assert_allclose(out.incident[1:], out.transmitted[:-1])
+    assert_allclose(out.transmitted[0]/out.incident[0],
+                    np.exp(-0.0025*material_mu('kapton', energy)))
+    assert np.all(np.isnan(out.volts[0]))
+
+    ic = ionchamber_fluxes(gas='nitrogen', volts=out.volts[1], length=10.0,
+                           energy=energy, sensitivity=1.e-8)
+    assert_allclose(ic.incident, out.incident[1], rtol=1.e-10)
+    assert_allclose(ic.photo, out.absorbed[1], rtol=1.e-10)
+    assert_allclose(bp.incident_flux('It', out.volts[4], energy), 1.e11)
+
+    # kapton coefficients are shared by both windows: 4 distinct materials
+    assert len([k for k in bp._mu_cache if k != '_energy_']) == 4
+    with pytest.raises(ValueError):
+        bp.add_window('kapton', 0.001, name='I0')
+
+    # a redefined material is not taken from the cache
+    monkeypatch.setattr(xraydb.materials, 'get_user_materialsfile',
+                        lambda create_folder=False: str(tmp_path / 'materials.dat'))
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+    get_materials(force_read=True)
+    add_material('bpwindow', 'C', 2.2)
+    bp = BeamPath()
+    bp.add_window('bpwindow', 0.01)
+    mu1 = bp.mu(energy)[3][0]
+    add_material('bpwindow', 'Be', 1.85)
+    assert_allclose(bp.mu(energy)[3][0], material_mu('Be', energy, density=1.85))
+    assert not np.allclose(mu1, bp.mu(energy)[3][0])
+    monkeypatch.undo()
+    get_materials(force_read=True)
+
+
+def test_transmission_samples():
+    from xraydb import transmission_samples
+    dilutions = [{'Fe2O3': x, 'BN': -1} for x in (0.01, 0.02, 0.05, 0.1)]
+    out = transmission_samples(dilutions, 7162, area=1.33, density=[2.1]*4)
+    assert len(out) == 4
+    for sample, result in zip(dilutions, out):
+        single = transmission_sample(sample, 7162, area=1.33, density=2.1)
+        assert_allclose(result.mass_total_mg, single.mass_total_mg, rtol=1.e-12)
+        assert_allclose(result.thickness_mm, single.thickness_mm, rtol=1.e-12)
+        assert_allclose(result.absorbance_steps['Fe'],
+                        single.absorbance_steps['Fe'], rtol=1.e-10)
+    assert out[0].absorbance_steps['Fe'] < out[1].absorbance_steps['Fe']
+
+    out = transmission_samples('Cu', [8979+50, 9029, 9200], absorp_total=1)
+    assert [r.energy_eV for r in out] == [9029, 9029, 9200]
+    assert_allclose(out[1].mass_total_mg, 3.640, rtol=0.001)
+    with pytest.raises(ValueError):
+        transmission_samples(['Cu', 'Fe'], [9029, 9200, 9300])
+
+
+def test_optimize_sample_prep():
+    from xraydb import optimize_sample_prep
+    best = optimize_sample_prep('Fe2O3', 'Fe', area=1.33, min_total_mass=100)
+    assert len(best) == 3
+    assert best[0].dilutant == 'polyethylene'
+    for prep in best:
+        assert_allclose(prep.edge_step, 1.0, rtol=0.01)
+        assert prep.absorp_total <= 2.6
+        assert prep.sample_mass_mg + prep.dilutant_mass_mg >= 100
+
+    # compare with transmission_sample for the chosen masses
+    prep = best[1]
+    assert prep.dilutant == 'boron nitride'
+    res = transmission_sample({'Fe2O3': prep.sample_fraction, 'BN': -1},
+                              prep.energy, absorp_total=prep.absorp_total,
+                              area=prep.area_cm2)
+    assert_allclose(res.mass_total_mg, prep.sample_mass_mg + prep.dilutant_mass_mg,
+                    rtol=1.e-6)
+    assert_allclose(res.absorbance_steps['Fe'], prep.edge_step, rtol=1.e-6)
+
+    # edge step limited by total absorption
+    best = optimize_sample_prep({'Cu': 0.02, 'SiO2': -1}, 'Cu', absorp_max=2.0,
+                                dilutants='cellulose')
+    assert len(best) == 1
+    assert best[0].dilutant_mass_mg == 0
+    assert best[0].edge_step < 0.5
+
+    # material names are resolved to their formulas
+    assert (optimize_sample_prep('galena', 'Pb', edge='L3') ==
+            optimize_sample_prep('PbS', 'Pb', edge='L3'))
+
+
+def test_periodic_table():
+    from xraydb import periodic_table
+    ptab = periodic_table()
+    assert ptab is periodic_table()
+    fe = ptab.elements[ptab.elements['symbol'] == 'Fe'][0]
+    assert fe['Z'] == 26
+    assert_allclose(fe['mass'], atomic_mass('Fe'))
+    assert_allclose(fe['density'], atomic_density('Fe'))
+
+    for elem in ('Fe', 'Zr', 'Au'):
+        edges = ptab.edges[ptab.edges['symbol'] == elem]
+        assert set(edges['edge']) == set(xray_edges(elem).keys())
+        for row in edges:
+            assert_allclose(row['energy'], xray_edge(elem, row['edge']).energy)
+        kedge = edges[edges['edge'] == 'K'][0]
+        assert_allclose(kedge['width'], core_width(elem, 'K'))
+        lines = ptab.lines[ptab.lines['symbol'] == elem]
+        assert set(lines['line']) == set(xray_lines(elem).keys())
+
+    kedges = ptab.edges[ptab.edges['edge'] == 'K']
+    sel = (kedges['energy'] > 7000) & (kedges['energy'] < 8000)
+    assert list(kedges['symbol'][sel]) == ['Fe', 'Co']
+    with pytest.raises(ValueError):
+        ptab.lines['energy'][0] = 0
+
 
 def test_formula_to_mass_fracs():
     mf1 = formula_to_mass_fracs('Fe2O3')
@@ -761,3 +966,52 @@ def test_transmission_sample():
     assert_allclose(result3.absorbance_steps['Fe'], 0.706, rtol=0.06)
     assert_allclose(result3.mass_total_mg, 51.7, rtol=0.02)
     assert_allclose(result3.thickness_mm, 0.1466, rtol=0.02)
+
+
+def test_energy_grid():
+    energy = np.linspace(1000, 90000, 2001)
+    grid = EnergyGrid(energy)
+    assert len(grid) == len(energy)
+    assert_allclose(np.asarray(grid), energy)
+
+    for elem in ('H', 'O', 'Fe', 'Cm'):
+        for kind in ('total', 'photo', 'coh', 'incoh'):
+            assert_allclose(mu_elam(elem, grid, kind=kind),
+                            mu_elam(elem, energy, kind=kind), rtol=1.e-12)
+    for elem in ('O', 'Fe', 'Pb'):
+        assert_allclose(f1_chantler(elem, grid), f1_chantler(elem, energy),
+                        rtol=1.e-10, atol=1.e-12)
+        assert_allclose(f2_chantler(elem, grid), f2_chantler(elem, energy), rtol=1.e-12)
+        assert_allclose(mu_chantler(elem, grid), mu_chantler(elem, energy), rtol=1.e-12)
+
+    # repeated use of the grid gives the same results
+    for i in range(2):
+        assert_allclose(material_mu('kapton', grid), material_mu('kapton', energy),
+                        rtol=1.e-12)
+        for new, old in zip(xray_delta_beta('Fe2O3', 5.25, grid),
+                            xray_delta_beta('Fe2O3', 5.25, energy)):
+            assert_allclose(new, old, rtol=1.e-10)
+
+    # results have the shape of the energies
+    assert_allclose(mu_elam('Cu', EnergyGrid(9000.0)), mu_elam('Cu', 9000.0), rtol=1.e-12)
+    energy2d = energy.reshape(3, 667)
+    assert mu_elam('Cu', EnergyGrid(energy2d)).shape == (3, 667)
+
+
+def test_ionchamber_gas_redefined(tmp_path, monkeypatch):
+    "a redefined gas material is not taken from the cache"
+    import xraydb.materials
+    from xraydb import ionchamber_gas, add_material, get_materials
+    monkeypatch.setattr(xraydb.materials, 'get_user_materialsfile',
+                        lambda create_folder=False: str(tmp_path / 'materials.dat'))
+    monkeypatch.setattr(xraydb.materials, 'USERFILE_CHECK_INTERVAL', 0)
+    get_materials(force_read=True)
+    add_material('icgas', 'N2', 0.00125)
+    gas1 = ionchamber_gas('icgas')
+    assert ionchamber_gas('icgas') is gas1
+    add_material('icgas', 'Ar', 0.00178)
+    gas2 = ionchamber_gas('icgas')
+    assert gas2.elements == ['Ar']
+    assert_allclose(gas2.weights, [0.00178])
+    monkeypatch.undo()
+    get_materials(force_read=True)
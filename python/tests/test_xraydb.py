@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 """ Tests of xraydb interface  """
+import os
+import sys
 import time
+import threading
 import pytest
 import numpy as np
 from numpy.testing import assert_allclose
@@ -63,3 +66,213 @@ def test_ionization_potentials():
 
     with pytest.raises(ValueError):
         xdb.ionization_potential('p10')
+
+def test_profile():
+    import xraydb
+    from xraydb.profiling import profile
+    mu_elam = xraydb.mu_elam
+    results = []
+    with profile(callback=results.append) as prof:
+        xraydb.material_mu('kapton', np.linspace(5000, 10000, 201))
+        xraydb.xray_edges('Zr')
+    out = results[0]
+    assert out['calls']['xray.mu_elam']['count'] == 4
+    assert out['calls']['materials.material_mu']['count'] == 1
+    assert out['calls']['chemparser.chemparse']['count'] >= 1
+    assert out['calls']['utils.elam_spline']['count'] >= 4
+    assert out['nqueries'] == sum(prof.queries.values())
+    assert set(out['categories']) == {'sql', 'json', 'spline', 'formula'}
+    assert 'xray.mu_elam' in prof.report()
+
+    # wrappers are removed when not profiling
+    assert xraydb.mu_elam is mu_elam
+    assert not hasattr(XrayDB.mu_elam, '__wrapped__')
+    xraydb.mu_elam('Fe', 8000)
+    assert out['calls']['xray.mu_elam']['count'] == 4
+
+def test_profile_threads():
+    import xraydb
+    from concurrent.futures import ThreadPoolExecutor
+    from xraydb.profiling import profile
+    energy = np.linspace(5000, 10000, 2001)
+    with profile() as prof:
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: xraydb.material_mu('kapton', energy), range(64)))
+    toplevel = prof.as_dict()['toplevel']
+    # each thread has its own outermost call
+    assert toplevel['materials.material_mu']['count'] == 64
+    assert 'xray.mu_elam' not in toplevel
+    assert prof.calls['xray.mu_elam'][0] == 4*64
+
+    # profiles started and stopped from many threads install wrappers once
+    from xraydb import profiling
+    mu_elam = xraydb.mu_elam
+    barrier = threading.Barrier(8)
+    def start_stop(i):
+        barrier.wait()
+        prof = profiling.start_profile()
+        npatches = len(profiling._installed['patches'])
+        barrier.wait()
+        profiling.stop_profile(prof)
+        return npatches
+    with ThreadPoolExecutor(8) as pool:
+        npatches = list(pool.map(start_stop, range(8)))
+    assert len(set(npatches)) == 1
+    assert profiling._installed['patches'] == []
+    assert xraydb.mu_elam is mu_elam
+
+def test_queries_per_call():
+    import xraydb
+    from xraydb.profiling import profile
+    xdb = xraydb.get_xraydb()
+
+    with profile() as prof:
+        for elem in ('Ni', 'Ag', 'Ni', 'Ag'):
+            xdb.xray_line_strengths(elem, excitation_energy=30000)
+            xraydb.xray_edges(elem)
+            xraydb.xray_lines(elem, 'K')
+            xraydb.core_width(elem, 'K')
+            xraydb.ck_probability(elem, 'L1', 'L3')
+    calls = prof.as_dict()['toplevel']
+    # at most one query per table used, and none once cached
+    assert calls['XrayDB.xray_line_strengths']['max_queries'] <= 3
+    assert calls['xray.core_width']['max_queries'] <= 2
+    assert calls['xray.ck_probability']['max_queries'] <= 1
+    assert calls['xray.xray_edges']['queries'] == 0
+    assert calls['xray.xray_lines']['queries'] == 0
+
+    with profile() as prof:
+        for elem in ('Ni', 'Ag'):
+            xdb.xray_line_strengths(elem, excitation_energy=30000)
+            xraydb.core_width(elem, 'K')
+            xraydb.ck_probability(elem, 'L1', 'L3')
+    assert prof.nqueries == 0
+
+def test_indexed_tables():
+    import xraydb
+    from xraydb.profiling import profile
+    xdb = xraydb.get_xraydb()
+    xdb.xray_lines('Fe')
+    xdb.ck_probability('Fe', 'L1', 'L2')
+    xdb.corehole_width('Fe')
+    with profile() as prof:
+        for z in range(1, 99):
+            xdb.xray_edges(z)
+            xdb.xray_edge(z, 'K')
+            xdb.xray_lines(z, ['L3', 'L2'])
+            xdb.ck_probability(z, 'L1', 'L3')
+            xdb.corehole_width(z)
+    assert prof.nqueries == 0
+
+    # returned dicts are copies
+    edges = xdb.xray_edges('Fe')
+    edges.pop('K')
+    assert 'K' in xdb.xray_edges('Fe')
+    lines = xdb.xray_lines('Fe', 'K')
+    lines.clear()
+    assert 'Ka1' in xdb.xray_lines('Fe', 'K')
+    assert xdb.ck_probability('Fe', 'L1', 'X9') == 0.0
+
+def test_open_modes():
+    import sqlalchemy
+    ref = XrayDB()
+    energies = np.linspace(5000, 10000, 11)
+    for mode in ('readonly', 'immutable', 'memory'):
+        xdb = XrayDB(mode=mode)
+        assert xdb.mode == mode
+        assert_allclose(xdb.mu_elam('Fe', energies), ref.mu_elam('Fe', energies))
+        assert xdb.xray_lines('Cu') == ref.xray_lines('Cu')
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            xdb.session.execute(sqlalchemy.text('DELETE FROM elements'))
+        xdb.close()
+
+    with pytest.raises(ValueError):
+        XrayDB(mode='network')
+
+def test_isxraydb(tmp_path):
+    import shutil
+    import sqlite3
+    from xraydb.xraydb import isxrayDB, content_hash, _validated
+
+    dbname = str(tmp_path / 'xraydb_copy.sqlite')
+    shutil.copy(XrayDB().dbname, dbname)
+    conn = sqlite3.connect(dbname)
+    cols = [row[1] for row in conn.execute('PRAGMA table_info(Version)')]
+    if 'content_hash' not in cols:
+        conn.execute('ALTER TABLE Version ADD COLUMN content_hash text')
+    conn.execute('UPDATE Version SET content_hash=? WHERE id=(SELECT max(id) FROM Version)',
+                 (content_hash(conn),))
+    conn.commit()
+    conn.close()
+
+    assert isxrayDB(dbname)
+    assert isxrayDB(dbname, check_hash=True)
+    assert any(key[0] == dbname for key in _validated)
+    XrayDB(dbname, check_hash=True)
+
+    # changed contents fail the hash check, but not the table check
+    conn = sqlite3.connect(dbname)
+    conn.execute("UPDATE elements SET density=1.0 WHERE element='Fe'")
+    conn.commit()
+    conn.close()
+    assert isxrayDB(dbname)
+    assert not isxrayDB(dbname, check_hash=True)
+    with pytest.raises(ValueError):
+        XrayDB(dbname, check_hash=True)
+
+    missing = str(tmp_path / 'missing.sqlite')
+    assert not isxrayDB(missing)
+    assert not (tmp_path / 'missing.sqlite').exists()
+
+def test_connect_resource():
+    from xraydb.xraydb import connect_resource, _is_xraydb_connection
+    conn, where = connect_resource('xraydb.sqlite')
+    assert where.endswith('xraydb.sqlite')
+    assert _is_xraydb_connection(conn)
+    conn.close()
+    with pytest.raises(IOError):
+        connect_resource('no_such_file.sqlite')
+    with pytest.raises(IOError):
+        XrayDB('no_such_file.sqlite')
+
+
+ZIP_LOAD = """
+import json
+import xraydb
+xdb = xraydb.get_xraydb()
+mu = xraydb.mu_elam('Fe', 8000.0)
+kapton = xraydb.material_mu('kapton', 8000.0)
+print(json.dumps({'file': xraydb.__file__, 'dbname': xdb.dbname, 'mode': xdb.mode,
+                  'mu': float(mu), 'kapton': float(kapton)}))
+"""
+
+def test_load_from_zip(tmp_path):
+    import json
+    import zipfile
+    import subprocess
+    import xraydb
+
+    # the xraydb package, as it would be in a zipapp
+    pkgdir = os.path.dirname(xraydb.__file__)
+    zipname = str(tmp_path / 'tool.pyz')
+    with zipfile.ZipFile(zipname, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        for fname in os.listdir(pkgdir):
+            if fname.endswith(('.py', '.sqlite', '.dat')):
+                zfile.write(os.path.join(pkgdir, fname), f'xraydb/{fname}')
+
+    def load(path):
+        env = dict(os.environ, PYTHONPATH=path)
+        env.pop('XRAYDB_MODE', None)
+        out = subprocess.run([sys.executable, '-c', ZIP_LOAD], env=env,
+                             cwd=str(tmp_path), capture_output=True, text=True,
+                             check=True)
+        return json.loads(out.stdout.strip().split('\n')[-1])
+
+    from_zip = load(zipname)
+    from_dir = load(os.path.dirname(pkgdir))
+
+    assert from_zip['file'].startswith(zipname)
+    assert from_zip['dbname'].startswith(zipname)
+    assert from_zip['mode'] == 'memory'
+    assert_allclose(from_zip['mu'], from_dir['mu'], rtol=1.e-12)
+    assert_allclose(from_zip['kapton'], from_dir['kapton'], rtol=1.e-12)
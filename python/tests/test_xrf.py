@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+""" Tests of X-ray fluorescence lines and spectra """
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+import xraydb
+from xraydb import (XrayDB, xrf_lines, xrf_spectrum, mu_elam, xray_edge,
+                    FPModel, fp_intensities, fp_quantify)
+from xraydb.xrf import sample_mass_fractions, detector_fwhm
+
+def test_xrf_lines():
+    lines = xrf_lines('Fe2O3', 10000)
+    assert set(lines.element) == {'Fe', 'O'}
+    assert np.all(np.diff(lines.energy) >= 0)
+
+    # pure element: scaled line strengths from xray_line_strengths()
+    xdb = XrayDB()
+    strengths = xdb.xray_line_strengths('Cu', excitation_energy=12000)
+    edge = xray_edge('Cu', 'K').energy
+    scale = mu_elam('Cu', 12000, kind='photo')/mu_elam('Cu', edge*1.001, kind='photo')
+    lines = xrf_lines('Cu', 12000)
+    for line, initial, intensity in zip(lines.line, lines.initial_level,
+                                        lines.intensity):
+        if initial == 'K':
+            assert_allclose(intensity, strengths[line]*scale, rtol=1.e-6)
+
+    lines = xrf_lines({'Fe': 0.05, 'SiO2': -1}, 6000)
+    assert 'K' not in lines.initial_level[lines.element == 'Fe']
+    assert 'L3' in lines.initial_level[lines.element == 'Fe']
+    assert 'Si' in lines.element
+
+    # combined initial levels are included, and edges below 100 eV are not
+    lines = xrf_lines('PbO', 20000)
+    assert 'M4,5' in lines.initial_level
+    lines = xrf_lines('LiF', 5000)
+    assert set(lines.element) == {'F'}
+
+    with pytest.raises(ValueError):
+        sample_mass_fractions(['Fe'])
+
+
+def test_xrf_spectrum():
+    spec = xrf_spectrum({'Fe': 0.1, 'Cu': 0.05, 'SiO2': -1}, 12000)
+    assert len(spec.energy) == len(spec.spectrum)
+    assert_allclose(spec.energy[spec.spectrum.argmax()], 6400, atol=20)
+    # Gaussians are normalized to line intensities
+    assert_allclose(np.trapezoid(spec.spectrum, spec.energy),
+                    spec.lines.intensity.sum(), rtol=0.01)
+    assert_allclose(spec.fwhm, detector_fwhm(spec.lines.energy))
+    assert_allclose(detector_fwhm(5900, noise=0), 118.6, rtol=0.02)
+
+
+def test_fp_quantify():
+    counts = fp_intensities({'Fe': 0.3, 'Ni': 0.7}, 10000, ['Fe Ka', 'Ni Ka'])
+    assert_allclose(counts['Fe Ka'], 0.0710, rtol=0.01)
+    fracs = fp_quantify(counts, 10000)
+    assert_allclose(fracs['Fe'], 0.3, rtol=1.e-5)
+    assert_allclose(fracs['Ni'], 0.7, rtol=1.e-5)
+
+    # secondary fluorescence of Fe by Cu and Zn K lines
+    model = FPModel(['Fe Ka', 'Cu Ka', 'Zn Ka'], 12000)
+    primary = FPModel(['Fe Ka', 'Cu Ka', 'Zn Ka'], 12000, secondary=False)
+    with_sec = model.intensities([0.2, 0.5, 0.3])[0]
+    without = primary.intensities([0.2, 0.5, 0.3])[0]
+    assert with_sec[0] > 1.2*without[0]
+    assert_allclose(with_sec[2], without[2])
+
+    # many pixels at once, with a matrix making up the balance
+    model = FPModel(['Fe Ka', 'Cu Ka'], 15000, matrix='SiO2')
+    conc = np.random.uniform(0, 0.2, size=(500, 2))
+    result = model.quantify(model.intensities(conc)*3.0, scale=3.0)
+    assert result.elements == ['Fe', 'Cu', 'Si', 'O']
+    assert result.converged.all()
+    assert_allclose(result.mass_fractions[:, :2], conc, atol=1.e-6)
+    assert_allclose(result.mass_fractions.sum(axis=1), 1.0)
+
+    # L lines: absorption by deeper levels, and families from several levels
+    edges, lines = xraydb.xray_edges('Pb'), xraydb.xray_lines('Pb')
+    model = FPModel(['Pb La'], 20000)
+    expected = (xraydb.mu_elam('Pb', 20000, kind='photo') *
+                (1-1/edges['L3'].jump_ratio) * edges['L3'].fyield *
+                (lines['La1'].intensity + lines['La2'].intensity) /
+                (edges['L1'].jump_ratio * edges['L2'].jump_ratio))
+    assert_allclose(model.primary_factor[0], expected, rtol=1.e-10)
+    lb = FPModel(['Pb Lb'], 20000)
+    lb1 = FPModel(['Pb Lb1'], 20000)
+    assert lb1.primary_factor[0] < lb.primary_factor[0] < 2*lb1.primary_factor[0]
+    # below the L2 edge, only the L3 lines of the Lb family are excited
+    lb_l3 = FPModel(['Pb Lb'], 14000)
+    l3_lines = [v for k, v in lines.items() if k.startswith('Lb') and v.initial_level == 'L3']
+    assert_allclose(lb_l3.line_energy[0],
+                    np.average([v.energy for v in l3_lines],
+                               weights=[v.intensity for v in l3_lines]))
+    counts = fp_intensities({'Pb': 0.4, 'Zn': 0.6}, 20000, ['Pb Lb', 'Zn Ka'])
+    fracs = fp_quantify(counts, 20000)
+    assert_allclose(fracs['Pb'], 0.4, rtol=1.e-5)
+
+    with pytest.raises(ValueError):
+        FPModel(['Fe Ka', 'Fe Kb'], 12000)
+    with pytest.raises(ValueError):
+        FPModel(['Zn Ka'], 9000)
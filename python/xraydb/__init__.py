@@ -16,17 +16,40 @@ from .xraydb import XrayDB
 from .chemparser import chemparse, validate_formula
 
 from .materials import (material_mu, material_mu_components, get_materials,
-                        get_material, find_material, add_material)
+                        get_material, find_material, add_material,
+                        add_materials)
 
 from .xray import (atomic_number, atomic_symbol, atomic_name,
-                   atomic_mass, atomic_density, xray_edges, xray_edge,
+                   atomic_mass, atomic_density, periodic_table,
+                   xray_edges, xray_edge,
                    xray_lines, xray_line, fluor_yield, ck_probability,
+                   xray_line_index, find_xray_lines, nearest_xray_lines,
                    core_width, f0, f0_ions, chantler_energies,
                    f1_chantler, f2_chantler, mu_chantler, mu_elam,
                    coherent_cross_section_elam,
-                   incoherent_cross_section_elam, guess_edge,
+                   incoherent_cross_section_elam, guess_edge, guess_edges,
                    xray_delta_beta, get_xraydb, darwin_width,
                    dynamical_theta_offset, mirror_reflectivity,
                    multilayer_reflectivity, coated_reflectivity,
-                   ionchamber_fluxes, ionization_potential,
-                   transmission_sample)
+                   ionchamber_fluxes, ionchamber_flux_stream, ionchamber_gas,
+                   ionization_potential,
+                   transmission_sample, transmission_samples)
+
+from .beampath import BeamPath
+
+from .sampleprep import optimize_sample_prep
+
+from .xrf import xrf_lines, xrf_spectrum
+
+from .fpquant import FPModel, fp_intensities, fp_quantify
+
+from .coalesce import Coalescer
+
+from .energygrid import EnergyGrid
+
+from .diskcache import (enable_disk_cache, disable_disk_cache,
+                        clear_disk_cache, disk_cache_info, _disk_cache_from_env)
+_disk_cache_from_env()
+
+from .profiling import _profile_from_env
+_profile_from_env()
@@ -0,0 +1,222 @@
+"""
+Asyncio interface to xraydb: awaitable calculations run on an executor
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import asyncio
+import weakref
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from . import xray
+from .coalesce import BATCHED, _call, group_key, evaluate_group
+
+# executor and limits, shared by all event loops
+_config = {'executor': None, 'owned': False, 'max_workers': 4,
+           'max_concurrency': 8, 'batch_size': 4096, 'batch_window': 0.0}
+
+# per event loop: semaphore, pending batches, and running batch tasks
+_loops = weakref.WeakKeyDictionary()
+
+
+def configure(executor=None, max_workers=None, max_concurrency=None,
+              batch_size=None, batch_window=None):
+    """set the executor and limits for the awaitable calculations
+
+    Args:
+        executor (None or Executor): executor to run calculations on
+                 [None, to use a ThreadPoolExecutor made when first needed]
+        max_workers (None or int): number of threads for the default executor [4]
+        max_concurrency (None or int): most calculations submitted to the
+                 executor at one time, for each event loop [8]
+        batch_size (None or int): most energy points in a batch of
+                 concurrent requests [4096]
+        batch_window (None or float): time (in sec) to wait for more
+                 requests to add to a batch [0, meaning requests made
+                 in the same iteration of the event loop]
+
+    Notes:
+        1. threads share the decoded data of the XrayDB database.  A
+           ProcessPoolExecutor can also be used: each process then opens
+           its own copy of the database.
+        2. an executor passed in here is not shut down by `shutdown`.
+    """
+    if executor is not None or max_workers is not None:
+        shutdown(wait=False)
+    if executor is not None:
+        _config['executor'] = executor
+        _config['owned'] = False
+    if max_workers is not None:
+        _config['max_workers'] = max_workers
+    if max_concurrency is not None:
+        _config['max_concurrency'] = max_concurrency
+        _loops.clear()
+    if batch_size is not None:
+        _config['batch_size'] = batch_size
+    if batch_window is not None:
+        _config['batch_window'] = batch_window
+
+
+def shutdown(wait=True):
+    "shut down the default executor, if it has been started"
+    executor = _config['executor']
+    if executor is not None and _config['owned']:
+        executor.shutdown(wait=wait)
+    _config['executor'] = None
+    _config['owned'] = False
+
+
+def _executor():
+    "executor for calculations, starting the default one if needed: internal use"
+    if _config['executor'] is None:
+        xray.get_xraydb()   # open the database once, before threads use it
+        _config['executor'] = ThreadPoolExecutor(max_workers=_config['max_workers'],
+                                                 thread_name_prefix='xraydb')
+        _config['owned'] = True
+    return _config['executor']
+
+
+def _loop_state(loop):
+    "semaphore, pending batches, and running tasks for an event loop: internal use"
+    state = _loops.get(loop, None)
+    if state is None:
+        state = _loops[loop] = {'semaphore': asyncio.Semaphore(_config['max_concurrency']),
+                                'batches': {}, 'tasks': set()}
+    return state
+
+
+async def run(func, *args, **kws):
+    """run a function on the executor, within the concurrency limit
+
+    Args:
+        func (callable): function to run
+        args, kws: arguments and keyword arguments for func
+
+    Returns:
+        result of func(*args, **kws)
+
+    Notes:
+        cancelling the awaiting task cancels the calculation if it has
+        not yet started.  A calculation that has started will finish, but
+        its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    state = _loop_state(loop)
+    async with state['semaphore']:
+        return await loop.run_in_executor(_executor(),
+                                          functools.partial(func, *args, **kws))
+
+
+async def _submit(name, args, kws):
+    """run a function by name, adding requests for small energy arrays to
+    a batch for the same function and other arguments: internal use"""
+    if name not in BATCHED:
+        return await run(_call, name, args, kws)
+
+    energy = np.asarray(args[BATCHED[name]], dtype=float)
+    key = group_key(name, args, kws)
+    if key is None or energy.ndim > 1 or energy.size > _config['batch_size']:
+        return await run(_call, name, args, kws)
+
+    loop = asyncio.get_running_loop()
+    state = _loop_state(loop)
+    batch = state['batches'].get(key, None)
+    if batch is None:
+        batch = state['batches'][key] = {'items': [], 'size': 0}
+        if _config['batch_window'] > 0:
+            loop.call_later(_config['batch_window'], _flush, loop, key, batch)
+        else:
+            loop.call_soon(_flush, loop, key, batch)
+    future = loop.create_future()
+    batch['items'].append((args[BATCHED[name]], future))
+    batch['size'] += energy.size
+    if batch['size'] >= _config['batch_size']:
+        _flush(loop, key, batch)
+    return await future
+
+
+def _flush(loop, key, batch):
+    "start calculation for a batch of requests: internal use"
+    state = _loop_state(loop)
+    if state['batches'].get(key, None) is batch:
+        state['batches'].pop(key)
+    items = [item for item in batch['items'] if not item[1].done()]
+    batch['items'] = []
+    if len(items) > 0:
+        task = loop.create_task(_run_batch(key, items))
+        state['tasks'].add(task)
+        task.add_done_callback(state['tasks'].discard)
+
+
+async def _run_batch(key, items):
+    """calculate a batch with one call, and set results of each request.
+    If the batch fails, each request is calculated separately: internal use"""
+    try:
+        results = await run(evaluate_group, key, [energy for energy, _ in items])
+    except asyncio.CancelledError:
+        for _, future in items:
+            future.cancel()
+        raise
+    except Exception as exc:
+        if len(items) > 1:
+            await asyncio.gather(*(_run_batch(key, [item]) for item in items))
+        elif not items[0][1].done():
+            items[0][1].set_exception(exc)
+        return
+    for (_, future), result in zip(items, results):
+        if not future.done():
+            future.set_result(result)
+
+
+async def mu_elam(element, energy, kind='total'):
+    "awaitable version of `xraydb.mu_elam`"
+    return await _submit('mu_elam', (element, energy), {'kind': kind})
+
+
+async def material_mu(name, energy, density=None, kind='total'):
+    "awaitable version of `xraydb.material_mu`"
+    return await _submit('material_mu', (name, energy),
+                         {'density': density, 'kind': kind})
+
+
+async def f0(ion, q):
+    "awaitable version of `xraydb.f0`"
+    return await _submit('f0', (ion, q), {})
+
+
+async def f1_chantler(element, energy, **kws):
+    "awaitable version of `xraydb.f1_chantler`"
+    return await _submit('f1_chantler', (element, energy), kws)
+
+
+async def f2_chantler(element, energy):
+    "awaitable version of `xraydb.f2_chantler`"
+    return await _submit('f2_chantler', (element, energy), {})
+
+
+async def xray_delta_beta(material, density, energy):
+    "awaitable version of `xraydb.xray_delta_beta`"
+    return await _submit('xray_delta_beta', (material, density, energy), {})
+
+
+async def darwin_width(energy, crystal='Si', hkl=(1, 1, 1), **kws):
+    "awaitable version of `xraydb.darwin_width`"
+    return await _submit('darwin_width', (energy, crystal, hkl), kws)
+
+
+async def multilayer_reflectivity(stackup, thickness, substrate, theta, energy, **kws):
+    "awaitable version of `xraydb.multilayer_reflectivity`"
+    return await _submit('multilayer_reflectivity',
+                         (stackup, thickness, substrate, theta, energy), kws)
+
+
+async def ionchamber_fluxes(gas='nitrogen', volts=1.0, length=100.0, energy=10000.0, **kws):
+    "awaitable version of `xraydb.ionchamber_fluxes`"
+    return await _submit('ionchamber_fluxes', (gas, volts, length, energy), kws)
+
+
+async def transmission_sample(sample, energy, **kws):
+    "awaitable version of `xraydb.transmission_sample`"
+    return await _submit('transmission_sample', (sample, energy), kws)
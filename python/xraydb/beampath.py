@@ -0,0 +1,249 @@
+"""
+Beam path of windows, air gaps, samples and ion chambers in series
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+from collections import namedtuple
+import numpy as np
+
+from .utils import QCHARGE
+from .xray import (get_xraydb, ionchamber_gas, _amplifier_sensitivity,
+                   _element_weights)
+from .materials import _material_formula_density
+
+BeamComponent = namedtuple('BeamComponent', ('name', 'kind', 'material',
+                                             'thickness', 'density'))
+
+BeamPathFluxes = namedtuple('BeamPathFluxes', ('energy', 'names', 'incident',
+                                               'transmitted', 'absorbed',
+                                               'volts'))
+
+def _compile_material(material, density=None):
+    """element names and density-weighted mass fractions for a material,
+    so that mu (in 1/cm) = sum(weight*cross_section): internal use"""
+    return _element_weights(*_material_formula_density(material, density))
+
+
+class BeamPath:
+    """Ordered list of windows, air gaps, samples, and ion chambers along an
+    X-ray beam, for calculating the flux incident on, transmitted through,
+    and absorbed by each component.
+
+    Args:
+        components (None or list): list of BeamComponent to start with [None]
+
+    Notes:
+        1. all thicknesses and lengths are in cm.
+        2. the absorption coefficients for each distinct material are
+           calculated once for each energy array, and shared by all
+           components using that material.  Materials are looked up by
+           their current formula and density, so that a redefined material
+           is not taken from the cache.
+        3. ion chambers use the same model as `ionchamber_fluxes`, and
+           report the voltage from their current amplifier.
+
+    Examples:
+        >>> bp = BeamPath()
+        >>> bp.add_window('kapton', 0.0025, name='I0 window')
+        >>> bp.add_ionchamber('nitrogen', 10.0, name='I0', sensitivity=1.e-8)
+        >>> bp.add_air(20.0)
+        >>> bp.add_sample('Fe2O3', 0.001, density=5.24, name='sample')
+        >>> bp.add_ionchamber({'nitrogen': 0.5, 'argon': 0.5}, 10.0,
+        ...                   name='It', sensitivity=1.e-8)
+        >>> out = bp.fluxes(np.linspace(7000, 7500, 501), flux=1.e11)
+        >>> out.volts[out.names.index('It')]
+
+    """
+    def __init__(self, components=None):
+        self.components = []
+        self._chambers = {}
+        self._mu_cache = {}
+        for comp in (components or []):
+            self.add_component(*comp)
+
+    def add_component(self, name, kind, material, thickness, density=None):
+        """add a component to the end of the beam path
+
+        Args:
+            name (str or None): name of component, must be unique
+            kind (str): one of 'window', 'air', 'sample', 'ionchamber'
+            material (str or dict): material name or formula, or gas or mixture
+                     of gases (as for `ionchamber_fluxes`) for ion chambers
+            thickness (float): thickness or length in cm
+            density (None or float): density in gr/cm^3 [None, to use
+                     the known density for the material]
+        """
+        if kind not in ('window', 'air', 'sample', 'ionchamber'):
+            raise ValueError(f"unknown beam path component kind '{kind}'")
+        if name is None:
+            name = f'{kind}{len(self.components)+1}'
+        if name in self.names:
+            raise ValueError(f"beam path already has component named '{name}'")
+        if kind == 'ionchamber':
+            if density is not None:
+                raise ValueError("density cannot be set for ion chamber gases")
+            self._chambers.setdefault(name, {'sensitivity': 1.0,
+                                             'with_compton': True,
+                                             'both_carriers': True})
+            ionchamber_gas(material)
+        else:
+            _compile_material(material, density)
+        self.components.append(BeamComponent(name, kind, material,
+                                             thickness, density))
+
+    def add_window(self, material, thickness, density=None, name=None):
+        "add a window of material with thickness in cm"
+        self.add_component(name, 'window', material, thickness, density)
+
+    def add_air(self, length, material='air', density=None, name=None):
+        "add an air gap (or other gas) with length in cm"
+        self.add_component(name, 'air', material, length, density)
+
+    def add_sample(self, material, thickness, density=None, name=None):
+        "add a sample of material with thickness in cm"
+        self.add_component(name, 'sample', material, thickness, density)
+
+    def add_ionchamber(self, gas='nitrogen', length=10.0, name=None,
+                       sensitivity=1.e-6, sensitivity_units='A/V',
+                       with_compton=True, both_carriers=True):
+        """add an ion chamber (or diode) with fill gas and length in cm,
+        and current amplifier sensitivity, as for `ionchamber_fluxes`"""
+        if name is None:
+            name = f'ionchamber{len(self.components)+1}'
+        self._chambers[name] = {'sensitivity': float(_amplifier_sensitivity(sensitivity,
+                                                                            sensitivity_units)),
+                                'with_compton': with_compton,
+                                'both_carriers': both_carriers}
+        try:
+            self.add_component(name, 'ionchamber', gas, length)
+        except ValueError:
+            self._chambers.pop(name)
+            raise
+
+    @property
+    def names(self):
+        "list of component names"
+        return [comp.name for comp in self.components]
+
+    def _material(self, comp):
+        "cache key, elements, and weights for a component: internal use"
+        if comp.kind == 'ionchamber':
+            gas = ionchamber_gas(comp.material)
+            elements, weights = gas.elements, gas.weights
+        else:
+            elements, weights = _compile_material(comp.material, comp.density)
+        return (tuple(elements), weights.tobytes()), elements, weights
+
+    def mu(self, energy):
+        """absorption coefficients for all components
+
+        Args:
+            energy (float or ndarray): X-ray energy in eV
+
+        Returns:
+            tuple of (photo, incoherent, coherent, total) absorption coefficients
+            (in 1/cm), each as an ndarray with shape (ncomponents, nenergies).
+
+        Notes:
+            coefficients are calculated once for each distinct material, and
+            kept until called with a different energy array.
+        """
+        xdb = get_xraydb()
+        energy = np.atleast_1d(np.asarray(energy, dtype=float))
+        cached_energy = self._mu_cache.get('_energy_', None)
+        if cached_energy is None or not np.array_equal(cached_energy, energy):
+            self._mu_cache = {'_energy_': energy.copy()}
+
+        out = np.zeros((3, len(self.components), len(energy)))
+        for i, comp in enumerate(self.components):
+            key, elements, weights = self._material(comp)
+            if key not in self._mu_cache:
+                mu = np.zeros((3, len(energy)))
+                for elem, weight in zip(elements, weights):
+                    for j, kind in enumerate(('photo', 'incoh', 'coh')):
+                        mu[j] += weight*xdb.cross_section_elam(elem, energy, kind=kind)
+                self._mu_cache[key] = mu
+            out[:, i, :] = self._mu_cache[key]
+        return out[0], out[1], out[2], out.sum(axis=0)
+
+    def fluxes(self, energy, flux=1.0):
+        """fluxes through each component of the beam path
+
+        Args:
+            energy (float or ndarray): X-ray energy in eV
+            flux (float or ndarray): flux incident on the first component in Hz [1]
+
+        Returns:
+            named tuple BeamPathFluxes with fields
+
+               `energy`      energy array, in eV
+               `names`       list of component names
+               `incident`    flux incident on each component, in Hz
+               `transmitted` flux transmitted through each component, in Hz
+               `absorbed`    flux absorbed by photo-electric effect in each component, in Hz
+               `volts`       current amplifier output for ion chambers, nan for others
+
+            where the flux and voltage values have shape (ncomponents, nenergies).
+        """
+        energy = np.atleast_1d(np.asarray(energy, dtype=float))
+        mu_photo, mu_incoh, _, mu_total = self.mu(energy)
+        thickness = np.array([comp.thickness for comp in self.components], dtype=float)
+        trans = np.exp(-thickness[:, None]*mu_total)
+        atten = 1.0 - trans
+
+        ncomp = len(self.components)
+        incident = np.ones((ncomp, len(energy)))
+        if ncomp > 1:
+            incident[1:] = np.cumprod(trans[:-1], axis=0)
+        incident = incident*np.asarray(flux, dtype=float)
+        absorbed = incident*atten*mu_photo/mu_total
+
+        volts = np.nan*np.ones((ncomp, len(energy)))
+        if self._chambers:
+            scales = self._ionchamber_scales(energy, atten, mu_photo, mu_incoh, mu_total)
+            for i, scale in scales.items():
+                name = self.components[i].name
+                volts[i] = incident[i]/(scale*self._chambers[name]['sensitivity'])
+
+        return BeamPathFluxes(energy, self.names, incident, incident*trans,
+                              absorbed, volts)
+
+    def _ionchamber_scales(self, energy, atten, mu_photo, mu_incoh, mu_total):
+        """flux per amplifier current (in Hz/A) for each ion chamber, as in
+        `ionchamber_fluxes`: internal use"""
+        energy_compton = None
+        out = {}
+        for i, comp in enumerate(self.components):
+            if comp.kind != 'ionchamber':
+                continue
+            opts = self._chambers[comp.name]
+            ecompton = 0.0
+            if opts['with_compton']:
+                if energy_compton is None:
+                    energy_compton = get_xraydb().compton_energies(energy).electron_mean
+                ecompton = energy_compton
+            ncarriers = 2 if opts['both_carriers'] else 1
+            atten_photo = atten[i]*mu_photo[i]/mu_total[i]
+            atten_incoh = atten[i]*mu_incoh[i]/mu_total[i]
+            absorbed_energy = ncarriers*(energy*atten_photo + ecompton*atten_incoh)
+            gas = ionchamber_gas(comp.material)
+            out[i] = gas.ionization_potential/(QCHARGE*absorbed_energy)
+        return out
+
+    def incident_flux(self, name, volts, energy):
+        """flux incident on the beam path from the voltage of an ion chamber
+
+        Args:
+            name (str): name of ion chamber component
+            volts (float or ndarray): measured voltage output of current amplifier
+            energy (float or ndarray): X-ray energy in eV
+
+        Returns:
+            flux incident on the first component in Hz, as ndarray
+        """
+        index = self.names.index(name)
+        if self.components[index].kind != 'ionchamber':
+            raise ValueError(f"beam path component '{name}' is not an ion chamber")
+        out = self.fluxes(energy, flux=1.0)
+        return np.asarray(volts, dtype=float)/out.volts[index]
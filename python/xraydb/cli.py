@@ -0,0 +1,401 @@
+"""
+Command-line batch calculator for X-ray absorption by materials
+
+Reads rows of (material, density, energy[, thickness]) from CSV or NPY
+files or from standard input, and writes mu, attenuation length, delta,
+beta, and transmission, as CSV or NPY.
+
+Examples:
+    xraydb rows.csv -o out.csv
+    xraydb rows.npy -o out.npy -q mu,delta,beta --jobs 8
+    xraydb --material kapton -q transmission --thickness 0.005 energies.csv
+    cat rows.csv | xraydb -
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import sys
+import csv
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .version import __version__
+from .xray import xray_delta_beta
+from .materials import material_mu, _material_formula_density
+
+QUANTITIES = ('mu', 'atlen', 'delta', 'beta', 'transmission')
+
+COLUMNS = ('material', 'density', 'energy', 'thickness')
+
+# default width of material names in NPY output, when not set by the input
+MATERIAL_LEN = 64
+
+
+def calculate(material, density, energy, thickness=None, quantities=('mu', 'atlen')):
+    """X-ray quantities for rows of material, density, and energy
+
+    Args:
+        material (ndarray of str): material names or formulas
+        density (ndarray): densities in gr/cm^3, nan for the known density of the material
+        energy (ndarray): X-ray energies in eV
+        thickness (None or ndarray): thicknesses in cm, for transmission [None]
+        quantities (sequence of str): quantities to calculate, from
+                'mu' (1/cm), 'atlen' (cm), 'delta', 'beta', and 'transmission'
+
+    Returns:
+        tuple of (results, errors): dict of {quantity: ndarray}, with 'density'
+        set to the density used, and dict of {material: message} for materials
+        that could not be calculated, which have nan values.  Rows with no
+        thickness (None or nan) when 'transmission' is requested have nan
+        transmission, and are also reported in the errors.
+
+    Notes:
+        rows are grouped by material and density, so that each group is
+        calculated with a single call for all its energies.
+    """
+    material = np.asarray(material, dtype=str)
+    density = np.asarray(density, dtype=float)
+    energy = np.asarray(energy, dtype=float)
+    npts = len(energy)
+    if thickness is None:
+        thickness = np.full(npts, np.nan)
+    thickness = np.asarray(thickness, dtype=float)
+    out = {'density': density.copy()}
+    for quant in quantities:
+        if quant not in QUANTITIES:
+            raise ValueError(f"unknown quantity '{quant}': use one of {QUANTITIES}")
+        out[quant] = np.full(npts, np.nan)
+    errors = {}
+
+    names, name_index = np.unique(material, return_inverse=True)
+    for iname, name in enumerate(names):
+        in_name = np.where(name_index == iname)[0]
+        dens_vals, dens_index = np.unique(density[in_name], return_inverse=True)
+        for idens, dens in enumerate(dens_vals):
+            idx = in_name[dens_index == idens]
+            try:
+                formula, dens = _material_formula_density(name, None if np.isnan(dens) else dens)
+                en = energy[idx]
+                mu = material_mu(formula, en, density=dens)
+                if 'delta' in quantities or 'beta' in quantities:
+                    delta, beta, _ = xray_delta_beta(formula, dens, en)
+            except Exception as exc:
+                errors[name] = str(exc)
+                continue
+            out['density'][idx] = dens
+            if 'mu' in out:
+                out['mu'][idx] = mu
+            if 'atlen' in out:
+                out['atlen'][idx] = 1.0/mu
+            if 'delta' in out:
+                out['delta'][idx] = delta
+            if 'beta' in out:
+                out['beta'][idx] = beta
+            if 'transmission' in out:
+                if np.isnan(thickness[idx]).any():
+                    errors[name] = 'no thickness given for transmission'
+                out['transmission'][idx] = np.exp(-mu*thickness[idx])
+    return out, errors
+
+
+def _calculate_chunk(chunk, quantities):
+    "calculate for a chunk of rows, adding results to chunk: internal use"
+    results, errors = calculate(chunk['material'], chunk['density'], chunk['energy'],
+                                thickness=chunk.get('thickness', None),
+                                quantities=quantities)
+    chunk.update(results)
+    return chunk, errors
+
+
+def _make_chunk(rows, names, material=None, density=None, thickness=None):
+    "dict of column arrays from a list of rows of strings: internal use"
+    cols = {name: [row[i] if i < len(row) else '' for row in rows]
+            for i, name in enumerate(names)}
+    npts = len(rows)
+    chunk = {}
+    if 'material' in cols:
+        names = [val.strip() or material for val in cols['material']]
+    else:
+        names = [material]*npts
+    if None in names:
+        raise ValueError('rows without a material: give a material column or --material')
+    chunk['material'] = np.array(names, dtype=str)
+    for name, default in (('density', density), ('energy', None),
+                          ('thickness', thickness)):
+        if name in cols:
+            vals = [val.strip() for val in cols[name]]
+            chunk[name] = np.array([float(v) if v else np.nan for v in vals])
+            if default is not None:
+                chunk[name][np.isnan(chunk[name])] = default
+        elif name != 'energy':
+            chunk[name] = np.full(npts, np.nan if default is None else default)
+    if 'energy' not in chunk:
+        raise ValueError('no energy column')
+    return chunk
+
+
+def read_csv(stream, chunk_size=100000, material=None, density=None, thickness=None):
+    """read chunks of rows from a CSV stream, yielding dicts of arrays with
+    keys 'material', 'density', 'energy', and 'thickness'
+
+    Notes:
+        a first row with column names from 'material', 'density', 'energy', and
+        'thickness' sets the order of columns.  Otherwise, the columns are
+        (material, density, energy[, thickness]), or (energy[, thickness]) if
+        `material` is given.  Empty density values use the known density.
+        Lines starting with '#' are skipped.
+    """
+    reader = csv.reader(line for line in stream if line.strip() and not line.startswith('#'))
+    names = None
+    rows = []
+    for row in reader:
+        if names is None:
+            words = [w.strip().lower() for w in row]
+            if 'energy' in words:
+                names = words
+                continue
+            names = list(COLUMNS) if material is None else ['energy', 'thickness']
+            if material is None and len(row) < 3:
+                raise ValueError('CSV rows need material, density, energy columns, '
+                                 'or give material')
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield _make_chunk(rows, names, material, density, thickness)
+            rows = []
+    if len(rows) > 0:
+        yield _make_chunk(rows, names, material, density, thickness)
+
+
+def read_npy(fname, chunk_size=100000, material=None, density=None, thickness=None):
+    """read chunks of rows from an NPY file (memory-mapped), yielding dicts of
+    arrays with keys 'material', 'density', 'energy', and 'thickness'
+
+    Notes:
+        the file can hold a structured array with fields 'energy' and some of
+        'material', 'density', and 'thickness', or (if `material` is given) a
+        1-d array of energies or a 2-d array with columns (energy, thickness).
+    """
+    data = np.load(fname, mmap_mode='r')
+    fields = data.dtype.names
+    if fields is None and material is None:
+        raise ValueError('NPY files without field names need a material')
+    if fields is not None and 'energy' not in fields:
+        raise ValueError("NPY file has no 'energy' field")
+    for start in range(0, len(data), chunk_size):
+        part = data[start:start+chunk_size]
+        npts = len(part)
+        chunk = {}
+        if fields is not None:
+            for name in COLUMNS:
+                if name in fields:
+                    chunk[name] = np.array(part[name], dtype=str if name == 'material' else float)
+        elif part.ndim == 1:
+            chunk['energy'] = np.array(part, dtype=float)
+        else:
+            chunk['energy'] = np.array(part[:, 0], dtype=float)
+            if part.shape[1] > 1:
+                chunk['thickness'] = np.array(part[:, 1], dtype=float)
+        if 'material' not in chunk:
+            if material is None:
+                raise ValueError("NPY file has no 'material' field: give --material")
+            chunk['material'] = np.full(npts, material, dtype=object).astype(str)
+        for name, default in (('density', density), ('thickness', thickness)):
+            if name not in chunk:
+                chunk[name] = np.full(npts, np.nan if default is None else default)
+            elif default is not None:
+                chunk[name][np.isnan(chunk[name])] = default
+        yield chunk
+
+
+def _npy_material_len(fname):
+    "width of the material field of an NPY file, or None: internal use"
+    fields = np.load(fname, mmap_mode='r').dtype.fields
+    if fields is None or 'material' not in fields:
+        return None
+    dtype = fields['material'][0]
+    return dtype.itemsize//4 if dtype.kind == 'U' else dtype.itemsize
+
+
+class CSVWriter:
+    "write result chunks as CSV"
+    def __init__(self, stream, quantities):
+        self.stream = stream
+        self.columns = list(COLUMNS) + list(quantities)
+        self.writer = csv.writer(stream, lineterminator='\n')
+        self.writer.writerow(self.columns)
+
+    def write(self, chunk):
+        "write a chunk of results"
+        cols = [chunk['material']] + [chunk[c] for c in self.columns[1:]]
+        self.writer.writerows(zip(*[c.tolist() for c in cols]))
+
+    def close(self):
+        self.stream.flush()
+
+
+class NPYWriter:
+    """write result chunks to an NPY file as a structured array, without
+    holding all results in memory
+
+    Args:
+        fname (str): name of output file
+        quantities (sequence of str): quantities to write
+        material_len (int): width of material names [MATERIAL_LEN]
+
+    Notes:
+        the width of material names is fixed when the file is started, and
+        writing a longer name raises a ValueError rather than truncating it.
+    """
+    def __init__(self, fname, quantities, material_len=MATERIAL_LEN):
+        self.columns = list(COLUMNS) + list(quantities)
+        self.material_len = material_len
+        self.dtype = np.dtype([('material', f'<U{material_len}')] +
+                              [(name, '<f8') for name in self.columns[1:]])
+        self.count = 0
+        self.fh = open(fname, 'wb')
+        self.fh.write(self._header(0))
+
+    def _header(self, count):
+        "NPY header, padded to a size that does not depend on count"
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype),
+                       'fortran_order': False, 'shape': (count,)})
+        full = repr({'descr': np.lib.format.dtype_to_descr(self.dtype),
+                     'fortran_order': False, 'shape': (10**20,)})
+        size = 64*((len(full) + 11)//64 + 1)
+        header = header.ljust(size - 11) + '\n'
+        return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+    def write(self, chunk):
+        "write a chunk of results"
+        names = np.asarray(chunk['material'], dtype=str)
+        if len(names) > 0 and np.char.str_len(names).max() > self.material_len:
+            name = names[np.char.str_len(names).argmax()]
+            raise ValueError(f"material name '{name}' is longer than {self.material_len} "
+                             "characters: use --material-len")
+        out = np.zeros(len(chunk['energy']), dtype=self.dtype)
+        for name in self.columns:
+            out[name] = chunk[name]
+        self.fh.write(out.tobytes())
+        self.count += len(out)
+
+    def close(self):
+        self.fh.seek(0)
+        self.fh.write(self._header(self.count))
+        self.fh.close()
+
+
+def run(chunks, writer, quantities, jobs=1):
+    """calculate quantities for chunks of rows and write the results,
+    returning dict of {material: error message}
+
+    Args:
+        chunks (iterable): dicts of arrays, from `read_csv` or `read_npy`
+        writer (CSVWriter or NPYWriter): output writer
+        quantities (sequence of str): quantities to calculate
+        jobs (int): number of processes [1, to calculate in this process]
+
+    Notes:
+        with more than one process, at most 2*jobs chunks are read ahead,
+        and results are written in the order of the input.
+    """
+    errors = {}
+    if jobs <= 1:
+        for chunk in chunks:
+            chunk, errs = _calculate_chunk(chunk, quantities)
+            errors.update(errs)
+            writer.write(chunk)
+        return errors
+
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_calculate_chunk, chunk, quantities))
+            if len(pending) >= 2*jobs:
+                chunk, errs = pending.pop(0).result()
+                errors.update(errs)
+                writer.write(chunk)
+        for future in pending:
+            chunk, errs = future.result()
+            errors.update(errs)
+            writer.write(chunk)
+    return errors
+
+
+def main(argv=None):
+    "xraydb command-line program"
+    parser = argparse.ArgumentParser(prog='xraydb',
+                                     description='X-ray absorption and refraction for materials: '
+                                     'reads rows of (material, density, energy[, thickness]) '
+                                     'from CSV or NPY and writes results as CSV or NPY.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help="input file (.csv or .npy), or '-' for CSV from stdin ['-']")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file (.csv or .npy), or '-' for CSV to stdout ['-']")
+    parser.add_argument('-q', '--quantities', default='mu,atlen',
+                        help=f"comma-separated quantities, from {', '.join(QUANTITIES)} [mu,atlen]")
+    parser.add_argument('-m', '--material', default=None,
+                        help='material name or formula for rows without a material')
+    parser.add_argument('-d', '--density', type=float, default=None,
+                        help='density (gr/cm^3) for rows without a density')
+    parser.add_argument('-t', '--thickness', type=float, default=None,
+                        help='thickness (cm) for rows without a thickness, for transmission')
+    parser.add_argument('-c', '--chunk-size', type=int, default=100000,
+                        help='number of rows to read and calculate at a time [100000]')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of processes to use [1]')
+    parser.add_argument('--material-len', type=int, default=None,
+                        help='width of material names in NPY output [that of the '
+                        f'input NPY material field or --material, or {MATERIAL_LEN}]')
+    parser.add_argument('--version', action='version', version=f'xraydb {__version__}')
+    args = parser.parse_args(argv)
+
+    quantities = [q.strip() for q in args.quantities.split(',') if q.strip()]
+    for quant in quantities:
+        if quant not in QUANTITIES:
+            parser.error(f"unknown quantity '{quant}': use one of {', '.join(QUANTITIES)}")
+
+    opts = {'chunk_size': args.chunk_size, 'material': args.material,
+            'density': args.density, 'thickness': args.thickness}
+    infile = None
+    material_len = args.material_len
+    if args.input == '-':
+        chunks = read_csv(sys.stdin, **opts)
+    elif args.input.lower().endswith('.npy'):
+        chunks = read_npy(args.input, **opts)
+        if material_len is None:
+            material_len = _npy_material_len(args.input)
+    else:
+        infile = open(args.input, 'r', encoding='utf-8', newline='')
+        chunks = read_csv(infile, **opts)
+
+    outfile = None
+    if material_len is None:
+        material_len = MATERIAL_LEN
+        if args.material is not None:
+            material_len = max(material_len, len(args.material))
+    if args.output.lower().endswith('.npy'):
+        writer = NPYWriter(args.output, quantities, material_len=material_len)
+    elif args.output == '-':
+        writer = CSVWriter(sys.stdout, quantities)
+    else:
+        outfile = open(args.output, 'w', encoding='utf-8', newline='')
+        writer = CSVWriter(outfile, quantities)
+
+    try:
+        errors = run(chunks, writer, quantities, jobs=args.jobs)
+    except ValueError as exc:
+        sys.stderr.write(f'xraydb: {exc}\n')
+        return 1
+    finally:
+        writer.close()
+        for fh in (infile, outfile):
+            if fh is not None:
+                fh.close()
+    for name, msg in errors.items():
+        sys.stderr.write(f"xraydb: could not calculate for '{name}': {msg}\n")
+    return 2 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
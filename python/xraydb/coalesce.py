@@ -0,0 +1,229 @@
+"""
+Coalescing of many small requests into vectorized calculations
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import time
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+from . import xray, materials
+from .diskcache import _bypassed
+
+# functions that can be coalesced, with the position of the energy argument.
+# These give results for each energy that do not depend on the other energies
+# in the call, so that coalesced results are identical to those of separate
+# calls.  This is not so for f1_chantler (and so xray_delta_beta), for which
+# the spline is fit to the table over the range of all energies.
+BATCHED = {'mu_elam': 1, 'material_mu': 1, 'f2_chantler': 1}
+
+
+def _call(name, args, kws):
+    """call a function of xray.py or materials.py by name: internal use,
+    looked up on each call so it can be pickled for a process pool"""
+    mod = materials if name == 'material_mu' else xray
+    return getattr(mod, name)(*args, **kws)
+
+
+def group_key(name, args, kws):
+    """key for requests that can be evaluated together: the function name
+    and all arguments except energy, or None if they are not hashable"""
+    pos = BATCHED[name]
+    key = (name, tuple(args[:pos]) + tuple(args[pos+1:]), tuple(sorted(kws.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def evaluate_group(key, energies):
+    """evaluate a group of requests with one vectorized call
+
+    Args:
+        key (tuple): group key, from `group_key`
+        energies (list): energy (float or ndarray) for each request
+
+    Returns:
+        list of results, one for each request, with the shape of its energy.
+
+    Notes:
+        the disk cache is not used for the combined call, as the same
+        combination of energies is unlikely to be requested again.
+    """
+    name, others, kws = key
+    pos = BATCHED[name]
+    if len(energies) == 1:
+        return [_call(name, others[:pos] + (energies[0],) + others[pos:], dict(kws))]
+
+    energies = [np.asarray(en, dtype=float) for en in energies]
+    allen = np.concatenate([en.ravel() for en in energies])
+    with _bypassed():
+        out = _call(name, others[:pos] + (allen,) + others[pos:], dict(kws))
+    results, start = [], 0
+    for en in energies:
+        stop = start + en.size
+        if isinstance(out, tuple):
+            results.append(tuple(_split(val, start, stop, en.shape) for val in out))
+        else:
+            results.append(_split(out, start, stop, en.shape))
+        start = stop
+    return results
+
+
+def _split(value, start, stop, shape):
+    "part of a combined result, with the shape of the request: internal use"
+    value = value[start:stop].reshape(shape)
+    return value[()] if shape == () else value
+
+
+class Coalescer:
+    """Collect small requests from many threads over a short time window,
+    and evaluate each group of requests for the same element or material
+    with a single vectorized call.
+
+    Args:
+        window (float): longest time (in sec) to wait for more requests
+               after the first request of a batch [0.002]
+        max_batch (int): number of energy points at which to evaluate
+               a batch without waiting for the window to end [4096]
+
+    Notes:
+        1. requests are grouped by function and all arguments other than
+           energy: `mu_elam` for each element and kind, `material_mu` for
+           each material, density and kind, and so on.
+        2. the methods `mu_elam`, `material_mu`, and `f2_chantler` block
+           until the result is ready.  `submit` returns a
+           concurrent.futures.Future.  Results are identical to those of
+           separate calls.
+        3. if evaluating a group fails, each request in the group is
+           evaluated separately, so that an error is only reported for
+           the request that caused it.
+
+    Examples:
+        >>> from concurrent.futures import ThreadPoolExecutor
+        >>> coalescer = Coalescer()
+        >>> with ThreadPoolExecutor(32) as pool:
+        ...     mus = list(pool.map(lambda en: coalescer.mu_elam('Fe', en),
+        ...                         np.linspace(7000, 8000, 1001)))
+        ...
+        >>> coalescer.close()
+
+    """
+    def __init__(self, window=0.002, max_batch=4096):
+        self.window = window
+        self.max_batch = max_batch
+        self.nrequests = 0
+        self.ncalls = 0
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._size = 0
+        self._first = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, daemon=True,
+                                        name='xraydb-coalescer')
+        self._thread.start()
+
+    def submit(self, name, *args, **kws):
+        """submit a request for a function by name
+
+        Args:
+            name (str): one of 'mu_elam', 'material_mu', 'f2_chantler'
+            args, kws: arguments and keyword arguments for the function
+
+        Returns:
+            concurrent.futures.Future for the result
+        """
+        if name not in BATCHED:
+            raise ValueError(f"cannot coalesce requests for '{name}'")
+        future = Future()
+        key = group_key(name, args, kws)
+        if key is None:
+            try:
+                future.set_result(_call(name, args, kws))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        energy = args[BATCHED[name]]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Coalescer is closed')
+            self._pending.setdefault(key, []).append((energy, future))
+            self._size += np.size(energy)
+            self.nrequests += 1
+            if self._first is None:
+                self._first = time.monotonic()
+                self._cond.notify()
+            elif self._size >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def mu_elam(self, element, energy, kind='total'):
+        "`xraydb.mu_elam`, coalesced with other requests"
+        return self.submit('mu_elam', element, energy, kind=kind).result()
+
+    def material_mu(self, name, energy, density=None, kind='total'):
+        "`xraydb.material_mu`, coalesced with other requests"
+        return self.submit('material_mu', name, energy, density=density,
+                           kind=kind).result()
+
+    def f2_chantler(self, element, energy):
+        "`xraydb.f2_chantler`, coalesced with other requests"
+        return self.submit('f2_chantler', element, energy).result()
+
+    def _worker(self):
+        "collect and evaluate batches of requests: internal use"
+        while True:
+            with self._cond:
+                while len(self._pending) == 0 and not self._closed:
+                    self._cond.wait()
+                if len(self._pending) == 0:
+                    return
+                deadline = self._first + self.window
+                while self._size < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                groups = self._pending
+                self._pending, self._size, self._first = {}, 0, None
+            for key, items in groups.items():
+                self._evaluate(key, items)
+
+    def _evaluate(self, key, items):
+        "evaluate a group of requests and set their results: internal use"
+        items = [(en, fut) for en, fut in items if fut.set_running_or_notify_cancel()]
+        if len(items) == 0:
+            return
+        self.ncalls += 1
+        try:
+            results = evaluate_group(key, [en for en, _ in items])
+        except Exception as exc:
+            if len(items) == 1:
+                items[0][1].set_exception(exc)
+                return
+            results = None
+        if results is None:
+            for en, fut in items:
+                try:
+                    fut.set_result(evaluate_group(key, [en])[0])
+                except Exception as exc:
+                    fut.set_exception(exc)
+            return
+        for (_, fut), result in zip(items, results):
+            fut.set_result(result)
+
+    def close(self):
+        "evaluate any pending requests, and stop the worker thread"
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
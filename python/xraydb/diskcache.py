@@ -0,0 +1,359 @@
+"""
+Opt-in persistent cache of expensive results, stored as .npy files
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import os
+import sys
+import inspect
+import hashlib
+import time
+import weakref
+import tempfile
+import threading
+from functools import wraps
+from contextlib import contextmanager
+import numpy as np
+import platformdirs
+
+from .version import __version__
+
+# settings and statistics: the cache is disabled while 'directory' is None.
+# 'size' is the total size of cached files, measured from the directory at
+# time 'size_checked' and updated for files written since by this process
+_config = {'directory': None, 'max_size': 1.e9, 'size': None,
+           'size_checked': None, 'scanning': False,
+           'hits': 0, 'misses': 0, 'db_version': None}
+
+# guards the statistics and the running total size in _config
+_lock = threading.Lock()
+
+# depth of _bypassed() contexts in each thread
+_bypass = threading.local()
+
+# fraction of max_size to remove down to when evicting files
+EVICT_TO = 0.8
+
+# seconds between measurements of the total size of the cache directory,
+# which includes files written by other processes
+SIZE_CHECK_INTERVAL = 60.0
+
+
+def get_disk_cache_dir():
+    "default directory for the disk cache, under the users cache directory"
+    return os.path.join(platformdirs.user_cache_dir('xraydb', 'xraydb'), 'results')
+
+
+def enable_disk_cache(directory=None, max_size=1.e9):
+    """enable the persistent disk cache for expensive results
+
+    Args:
+        directory (None or str): cache directory [None, for `get_disk_cache_dir()`]
+        max_size (float): largest total size of cached files in bytes [1e9]
+
+    Notes:
+        1. results of `mirror_reflectivity`, `multilayer_reflectivity`,
+           `coated_reflectivity`, and `material_mu` for at least 1000
+           energies or angles are saved, and read back when called again
+           with the same arguments, in this or any later session.
+        2. cached results are keyed by function, normalized arguments, the
+           current formula and density of named materials, and the versions
+           of the database and of xraydb.
+        3. the least recently used files are removed when the total size
+           exceeds `max_size`.  Files are written with an atomic rename, so
+           that several processes can share a cache directory.  The total
+           size, including files written by other processes, is measured
+           from the directory at most once every SIZE_CHECK_INTERVAL
+           seconds, and is otherwise updated for files written by this
+           process.
+        4. setting the environment variable XRAYDB_DISK_CACHE to '1' or to
+           a directory name before importing xraydb enables the cache.
+    """
+    if directory is None:
+        directory = get_disk_cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    with _lock:
+        _config.update(directory=directory, max_size=max_size, size=None,
+                       size_checked=None)
+
+
+def disable_disk_cache():
+    "disable the persistent disk cache, leaving cached files in place"
+    _config['directory'] = None
+
+
+def clear_disk_cache():
+    "remove all files from the disk cache directory"
+    for path, _, _ in _cache_files():
+        _remove(path)
+    with _lock:
+        _config.update(size=0, size_checked=time.monotonic())
+
+
+def disk_cache_info():
+    """dict with the disk cache 'directory', number of 'files', total 'size'
+    in bytes, and numbers of 'hits' and 'misses' in this process"""
+    files = _cache_files()
+    with _lock:
+        hits, misses = _config['hits'], _config['misses']
+    return {'directory': _config['directory'], 'files': len(files),
+            'size': sum(size for _, size, _ in files),
+            'hits': hits, 'misses': misses}
+
+
+def _cache_files():
+    "list of (path, size, access time) for cached files: internal use"
+    out = []
+    top = _config['directory']
+    if top is None or not os.path.isdir(top):
+        return out
+    for dirpath, _, fnames in os.walk(top):
+        for fname in fnames:
+            if fname.endswith(('.npy', '.npz')):
+                path = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                out.append((path, stat.st_size, stat.st_mtime))
+    return out
+
+
+def _remove(path):
+    "remove a file, which another process may have removed: internal use"
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _add_size(size):
+    """add the size of a file written by this process to the total, and
+    measure the total and remove least recently used files when needed:
+    internal use"""
+    with _lock:
+        if _config['size'] is not None:
+            _config['size'] += size
+        checked = _config['size_checked']
+        refresh = not _config['scanning'] and (
+            _config['size'] is None or _config['size'] > _config['max_size'] or
+            checked is None or time.monotonic() - checked >= SIZE_CHECK_INTERVAL)
+        if refresh:
+            _config['scanning'] = True
+    if refresh:
+        try:
+            _evict()
+        finally:
+            with _lock:
+                _config['scanning'] = False
+
+
+def _evict():
+    """measure the total size of cached files, and remove least recently
+    used files if it is over the size limit: internal use"""
+    files = _cache_files()
+    size = sum(f[1] for f in files)
+    if size > _config['max_size']:
+        target = EVICT_TO*_config['max_size']
+        for path, fsize, _ in sorted(files, key=lambda f: f[2]):
+            if size <= target:
+                break
+            _remove(path)
+            size -= fsize
+    with _lock:
+        _config.update(size=size, size_checked=time.monotonic())
+
+
+def _db_version():
+    """version of the database, for cache keys, found again when the
+    database instance from get_xraydb() changes: internal use"""
+    from .xray import get_xraydb
+    xdb = get_xraydb()
+    cached = _config['db_version']
+    if cached is None or cached[0]() is not xdb:
+        row = sorted(xdb.get_cache('Version'), key=lambda r: r.date)[-1]
+        cached = (weakref.ref(xdb), f"{row.tag}:{getattr(row, 'content_hash', None)}")
+        _config['db_version'] = cached
+    return cached[1]
+
+
+def _encode(value, hasher):
+    """add a normalized value to hasher, returning the number of array points.
+    Raises TypeError for values that cannot be used in a key: internal use"""
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        hasher.update(repr((type(value).__name__, value)).encode('utf-8'))
+        return 0
+    if isinstance(value, np.generic):
+        hasher.update(repr((value.dtype.str, value.item())).encode('utf-8'))
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            raise TypeError('object arrays cannot be cached')
+        hasher.update(repr(('ndarray', value.dtype.str, value.shape)).encode('utf-8'))
+        hasher.update(np.ascontiguousarray(value).tobytes())
+        return value.size
+    if isinstance(value, (list, tuple)):
+        hasher.update(f'{type(value).__name__}[{len(value)}]'.encode('utf-8'))
+        npts = sum(_encode(val, hasher) for val in value)
+        return max(npts, len(value))
+    if isinstance(value, dict):
+        hasher.update(f'dict[{len(value)}]'.encode('utf-8'))
+        npts = 0
+        for key in sorted(value, key=str):
+            npts += _encode(key, hasher) + _encode(value[key], hasher)
+        return npts
+    raise TypeError(f'{type(value).__name__} cannot be cached')
+
+
+def _save(path, result):
+    """save result to path (without extension) with an atomic rename,
+    returning the file size, or None if it cannot be saved: internal use"""
+    if isinstance(result, (np.ndarray, np.generic, float, int)) and not isinstance(result, bool):
+        arr = np.asarray(result)
+        if arr.dtype.hasobject:
+            return None
+        ext, arrays = '.npy', arr
+    elif isinstance(result, tuple):
+        arrays = {'__type__': np.array(type(result).__name__),
+                  '__fields__': np.array(getattr(result, '_fields', ()), dtype=str),
+                  '__len__': np.array(len(result))}
+        for i, val in enumerate(result):
+            if val is not None:
+                arr = np.asarray(val)
+                if arr.dtype.hasobject:
+                    return None
+                arrays[f'v{i}'] = arr
+        ext = '.npz'
+    else:
+        return None
+
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            if ext == '.npy':
+                np.save(fh, arrays, allow_pickle=False)
+            else:
+                np.savez(fh, **arrays)
+        os.replace(tmpname, path + ext)
+    except Exception:
+        _remove(tmpname)
+        raise
+    return os.path.getsize(path + ext)
+
+
+def _scalar(arr):
+    "0-d array to a scalar, keeping float64 for floats: internal use"
+    if arr.ndim > 0:
+        return arr
+    if arr.dtype.kind in 'fc':
+        return arr[()]
+    return arr.item()
+
+
+def _load(path, module):
+    """load result from path (without extension), returning (found, result):
+    internal use"""
+    for ext in ('.npy', '.npz'):
+        fname = path + ext
+        try:
+            if ext == '.npy':
+                result = _scalar(np.load(fname, allow_pickle=False))
+            else:
+                with np.load(fname, allow_pickle=False) as data:
+                    vals = [_scalar(data[f'v{i}']) if f'v{i}' in data.files else None
+                            for i in range(int(data['__len__']))]
+                    typename = str(data['__type__'])
+                    fields = data['__fields__'].tolist()
+                if len(fields) > 0:
+                    result = getattr(sys.modules[module], typename)(*vals)
+                else:
+                    result = tuple(vals)
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            continue
+        try:
+            os.utime(fname)      # mark as recently used
+        except OSError:
+            pass
+        return True, result
+    return False, None
+
+
+@contextmanager
+def _bypassed():
+    """context in which this thread does not use the disk cache, as for
+    one-off combined calculations: internal use"""
+    depth = getattr(_bypass, 'depth', 0)
+    _bypass.depth = depth + 1
+    try:
+        yield
+    finally:
+        _bypass.depth = depth
+
+
+def disk_cached(min_points=0, resolve=None):
+    """decorator to use the disk cache for a function, when enabled
+
+    Args:
+        min_points (int): smallest number of array points in the arguments
+                  for a result to be cached [0]
+        resolve (None or callable): function of the dict of arguments,
+                  returning other values the result depends on, such as
+                  the formula and density of a named material, which are
+                  added to the key [None]
+
+    Notes:
+        the key is made and looked up on every call, so this is only
+        worthwhile for functions taking much longer than reading a file.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kws):
+            top = _config['directory']
+            if top is None or getattr(_bypass, 'depth', 0) > 0:
+                return func(*args, **kws)
+            hasher = hashlib.sha256()
+            try:
+                bound = signature.bind(*args, **kws)
+                bound.apply_defaults()
+                hasher.update(repr((name, __version__, _db_version())).encode('utf-8'))
+                npts = _encode(bound.arguments, hasher)
+            except TypeError:
+                return func(*args, **kws)
+            if npts < min_points:
+                return func(*args, **kws)
+            if resolve is not None:
+                try:
+                    _encode(resolve(bound.arguments), hasher)
+                except Exception:
+                    return func(*args, **kws)
+
+            path = os.path.join(top, func.__name__, hasher.hexdigest())
+            found, result = _load(path, func.__module__)
+            with _lock:
+                _config['hits' if found else 'misses'] += 1
+            if found:
+                return result
+            result = func(*args, **kws)
+            try:
+                size = _save(path, result)
+            except OSError:
+                size = None
+            if size is not None:
+                _add_size(size)
+            return result
+        return wrapper
+    return decorator
+
+
+def _disk_cache_from_env():
+    "enable the disk cache if XRAYDB_DISK_CACHE is set: internal use"
+    value = os.environ.get('XRAYDB_DISK_CACHE', '').strip()
+    if value in ('', '0'):
+        return
+    enable_disk_cache(None if value == '1' else value)
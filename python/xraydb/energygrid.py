@@ -0,0 +1,141 @@
+"""
+Fixed array of energies, with interpolation brackets for the Elam and
+Chantler tables computed once and reused
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import numpy as np
+from scipy.interpolate import splrep, PPoly
+
+from .utils import spline_brackets, spline_eval
+
+# energy ranges (in eV) of the tables, energies outside are clipped
+ELAM_EMIN, ELAM_EMAX = 100.0, 8.e5
+CHANTLER_EMAX = 1.e6
+
+
+class EnergyGrid:
+    """array of energies to be used for many calculations
+
+    Args:
+        energy (float or ndarray): energies (in eV)
+
+    Notes:
+        1. an EnergyGrid can be given for the energy argument of `mu_elam`,
+           `f1_chantler`, `f2_chantler`, `mu_chantler`, `material_mu`,
+           and `xray_delta_beta`, with results having the shape of energy.
+        2. clipped log-energies are calculated when the grid is made.  The
+           indices and weights for interpolating the table of an element
+           are calculated the first time that element is used, so that
+           later calculations with that element are gathers from the table
+           and multiply-adds.
+        3. the brackets take about 50 bytes per energy for each element
+           and cross-section kind used.
+
+    Examples:
+        >>> import numpy as np
+        >>> from xraydb import EnergyGrid, material_mu, f1_chantler
+        >>> grid = EnergyGrid(np.linspace(6000, 10000, 4001))
+        >>> mu_fe2o3 = material_mu('Fe2O3', grid, density=5.25)
+        >>> mu_feo = material_mu('FeO', grid, density=5.74)
+        >>> f1_fe = f1_chantler('Fe', grid)
+
+    """
+    def __init__(self, energy):
+        energy = np.array(energy, dtype=float)
+        self.shape = energy.shape
+        self.energy = energy.ravel()
+        self.energy.flags.writeable = False
+
+        self.elam_below = self.energy < ELAM_EMIN
+        self.elam_above = self.energy > ELAM_EMAX
+        self.elam_log_energy = np.log(np.clip(self.energy, ELAM_EMIN, ELAM_EMAX))
+
+        self.chantler_above = self.energy > CHANTLER_EMAX
+        self.chantler_energy = np.minimum(self.energy, CHANTLER_EMAX)
+        self.chantler_log_energy = np.log(self.chantler_energy)
+        self.chantler_range = (self.chantler_energy.min(), self.chantler_energy.max())
+        self._brackets = {}
+
+    def __len__(self):
+        return self.energy.size
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.energy.reshape(self.shape)
+        return values if dtype is None else values.astype(dtype)
+
+    def __repr__(self):
+        return f'<EnergyGrid: {self.energy.size} energies, {len(self._brackets)} tables>'
+
+    @property
+    def values(self):
+        "energies with the shape given"
+        return self.shaped(self.energy)
+
+    def shaped(self, values):
+        "values calculated on the grid, with the shape of the energies given"
+        values = values.reshape(self.shape)
+        return values[()] if self.shape == () else values
+
+    def _get(self, key, calc, *args):
+        "brackets for key, calculated with calc(*args) if needed: internal use"
+        out = self._brackets.get(key, None)
+        if out is None:
+            out = self._brackets.setdefault(key, calc(*args))
+        return out
+
+    def elam_spline(self, key, xin, yin, yspl_in):
+        """Elam spline of log values at the clipped log-energies
+
+        Args:
+            key (tuple): key for the table, such as (element, kind)
+            xin (ndarray): log energies of table
+            yin (ndarray): log values of table
+            yspl_in (ndarray): spline coefficients of table
+        """
+        brackets = self._get(key, spline_brackets, xin, self.elam_log_energy)
+        return spline_eval(brackets, yin, yspl_in)
+
+    def loglog_interp(self, key, xin, yin):
+        """linear interpolation of log(yin) vs log(xin) at the log-energies
+
+        Args:
+            key (tuple): key for the table energies, such as (element, 'chantler')
+            xin (ndarray): energies of table
+            yin (ndarray): positive values of table
+        """
+        index, weight = self._get(key, _linear_brackets, np.log(xin),
+                                  self.chantler_log_energy)
+        ylog = np.log(yin)
+        return np.exp(ylog[index] + weight*(ylog[index+1] - ylog[index]))
+
+    def chantler_spline(self, key, xin, yin, smoothing=0):
+        """cubic spline of yin vs xin at the energies, as from UnivariateSpline
+
+        Args:
+            key (tuple): key for the table values, such as (element, 'f1', smoothing)
+            xin (ndarray): energies of table
+            yin (ndarray): values of table
+            smoothing (float): smoothing factor for spline [0]
+        """
+        coefs, index, dx = self._get(key, _spline_brackets, xin, yin,
+                                     smoothing, self.chantler_energy)
+        return ((coefs[0, index]*dx + coefs[1, index])*dx + coefs[2, index])*dx + coefs[3, index]
+
+
+def _linear_brackets(xin, x):
+    "indices and weights for linear interpolation, as np.interp: internal use"
+    index = np.clip(np.searchsorted(xin, x, side='right') - 1, 0, len(xin)-2)
+    step = xin[index+1] - xin[index]
+    weight = np.divide(x - xin[index], step, out=np.zeros(len(x)), where=step > 0)
+    return index, np.clip(weight, 0, 1)
+
+
+def _spline_brackets(xin, yin, smoothing, x):
+    """polynomial coefficients of a cubic spline, with the intervals
+    and offsets for x: internal use"""
+    poly = PPoly.from_spline(splrep(xin, yin, s=smoothing))
+    index = np.clip(np.searchsorted(poly.x, x, side='right') - 1,
+                    3, len(poly.x) - 5)
+    return poly.c, index, x - poly.x[index]
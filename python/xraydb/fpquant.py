@@ -0,0 +1,373 @@
+"""
+Fundamental-parameters X-ray fluorescence intensities and quantification
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+from collections import namedtuple
+import numpy as np
+
+from .xraydb import XrayLine
+from .xray import (mu_elam, xray_lines, xray_edges, _select_xray_lines)
+from .xrf import sample_mass_fractions
+from .energygrid import ELAM_EMIN
+
+FPQuantResult = namedtuple('FPQuantResult', ('elements', 'mass_fractions',
+                                             'niter', 'converged'))
+
+def _parse_line(line):
+    "(element, line) tuple for 'Fe Ka' or ('Fe', 'Ka'): internal use"
+    if isinstance(line, str):
+        words = line.replace('_', ' ').split()
+        if len(words) != 2:
+            raise ValueError(f"analysis line must be like 'Fe Ka', not '{line}'")
+        line = words
+    elem, name = line
+    return (elem.title(), name)
+
+
+def _line_members(elem, name):
+    """list of XrayLines for an analysis line, with all lines of a family
+    such as 'Ka' or 'Lb': internal use"""
+    lines = xray_lines(elem)
+    family = {'k': 'ka', 'l': 'la'}.get(name.lower(), name.lower())
+    if family in ('ka', 'kb', 'la', 'lb', 'lg'):
+        return [val for key, val in lines.items() if key.lower().startswith(family)]
+    line = lines.get(name.title(), None)
+    return [] if line is None else [line]
+
+
+def _excitation_factor(edges, lines, energy):
+    """fluorescence of lines per photo-absorption by the element at energies:
+    internal use
+
+    Args:
+        edges (dict): XrayEdges of the element, from `xray_edges`
+        lines (list): XrayLines of the element
+        energy (ndarray): energies of the exciting X-rays
+
+    Notes:
+        for each line, the fraction of photo-absorption creating a vacancy
+        in its initial level is (1-1/J) for the jump ratio J of the level,
+        divided by the jump ratios of all deeper levels that are excited,
+        following Sherman.  This is multiplied by the fluorescence yield of
+        the level and the relative intensity of the line.  For combined
+        levels, such as 'M4,5', the first level is used.
+    """
+    energy = np.asarray(energy, dtype=float)
+    out = np.zeros(energy.shape)
+    for line in lines:
+        edge = edges.get(line.initial_level.split(',')[0].title(), None)
+        if edge is None or edge.jump_ratio <= 1:
+            continue
+        factor = np.where(energy > edge.energy,
+                          (1-1/edge.jump_ratio)*edge.fyield*line.intensity, 0)
+        for deeper in edges.values():
+            if deeper.energy > edge.energy and deeper.jump_ratio > 1:
+                factor = np.where(energy > deeper.energy, factor/deeper.jump_ratio, factor)
+        out += factor
+    return out
+
+
+class FPModel:
+    """Fundamental-parameters model of X-ray fluorescence intensities
+
+    Args:
+        lines (list): analysis lines, as 'Fe Ka' or ('Fe', 'Ka'), one
+                per element. Families 'Ka', 'Kb', 'La', 'Lb', 'Lg'
+                or specific lines 'Ka1', 'Lb1', ... can be used, with
+                families summing all their lines.
+        excitation_energy (float): incident X-ray energy (in eV)
+        matrix (None, str, or dict): composition of the unmeasured part of
+                the sample, as a formula, material name, or dict of
+                fractions, as for `xrf_lines` [None]
+        incident_angle (float): angle of incident beam to the sample
+                surface, in degrees [45]
+        exit_angle (float): angle of detected fluorescence to the sample
+                surface, in degrees [45]
+        secondary (bool): whether to include secondary fluorescence [True]
+
+    Notes:
+        1. intensities are for an infinitely thick, homogeneous sample,
+           with primary fluorescence following Sherman, and secondary
+           fluorescence (from all excited lines of all elements in the
+           sample) following Shiraiwa and Fujino.
+        2. all table lookups (line energies, edges, yields, jump ratios,
+           and attenuation and photo-absorption coefficients of all elements
+           at all needed energies) are done once, when the model is created.
+           Intensities and quantification for many samples or pixels are
+           then array operations on composition matrices.
+        3. the lines of a family, such as 'Lb', can come from different
+           initial levels, each with its own edge, jump ratio and yield.
+           Absorption by deeper levels (such as K, L1, and L2 for L3 lines)
+           is included with their jump ratios.  The energy of a family is
+           the average of its lines, weighted by their primary intensities.
+        4. Coster-Kronig transitions and cascades are not included.
+
+    Examples:
+        >>> model = FPModel(['Fe Ka', 'Cu Ka', 'Zn Ka'], 12000)
+        >>> counts = model.intensities([[0.2, 0.5, 0.3]])
+        >>> model.quantify(counts).mass_fractions
+        array([[0.2, 0.5, 0.3]])
+
+    """
+    def __init__(self, lines, excitation_energy, matrix=None,
+                 incident_angle=45.0, exit_angle=45.0, secondary=True):
+        self.lines = [_parse_line(line) for line in lines]
+        self.excitation_energy = excitation_energy
+        self.secondary = secondary
+        self.sin_in = np.sin(np.radians(incident_angle))
+        self.sin_out = np.sin(np.radians(exit_angle))
+
+        analytes = [elem for elem, _ in self.lines]
+        if len(set(analytes)) != len(analytes):
+            raise ValueError('FPModel supports one analysis line per element')
+
+        self.matrix = {}
+        if matrix is not None:
+            self.matrix = sample_mass_fractions(matrix)
+        self.elements = analytes + [e for e in self.matrix if e not in analytes]
+        self.analyte_index = np.arange(len(analytes))
+        self.matrix_weights = np.array([self.matrix.get(e, 0.0)
+                                        for e in self.elements])
+
+        # analysis lines: members, edges, and energies
+        members, elem_edges = [], {}
+        for elem, name in self.lines:
+            mlines = _line_members(elem, name)
+            if len(mlines) == 0:
+                raise ValueError(f"unknown X-ray line '{elem} {name}'")
+            members.append(mlines)
+            elem_edges[elem] = xray_edges(elem)
+        for elem in self.elements:
+            if elem not in elem_edges:
+                elem_edges[elem] = xray_edges(elem)
+        energies = []
+        for (elem, name), mlines in zip(self.lines, members):
+            strength = [_excitation_factor(elem_edges[elem], [m], excitation_energy)
+                        for m in mlines]
+            if sum(strength) <= 0:
+                raise ValueError(f"line '{elem} {name}' is not excited at {excitation_energy} eV")
+            energies.append(np.average([m.energy for m in mlines], weights=strength))
+        self.line_energy = np.array(energies)
+
+        # enhancing lines: all excited lines of all elements
+        index = _select_xray_lines(excitation_energy=excitation_energy,
+                                   min_intensity=1.e-3)
+        # lines below the Elam tables cannot excite edges within them
+        keep = np.isin(index.element, self.elements) & (index.energy >= ELAM_EMIN)
+        if not secondary:
+            keep[:] = False
+        self.enh_energy = index.energy[keep]
+        self.enh_index = np.array([self.elements.index(e)
+                                   for e in index.element[keep]], dtype=int)
+        enh_factor = np.array([_excitation_factor(elem_edges[e],
+                                                  [XrayLine(en, inten, level, '')],
+                                                  excitation_energy)
+                               for e, en, inten, level in
+                               zip(index.element[keep], index.energy[keep],
+                                   index.intensity[keep], index.initial_level[keep])])
+
+        # attenuation for all elements at all energies, and photo-absorption
+        # for analyte and enhancing elements, with one call per element
+        nlines = len(self.lines)
+        allen = np.concatenate(([excitation_energy], self.line_energy,
+                                self.enh_energy))
+        self.mu_table = np.array([mu_elam(e, allen) for e in self.elements])
+        self.primary_factor = np.zeros(nlines)
+        self.enhance_factor = np.zeros((nlines, len(self.enh_energy)))
+        self.enh_primary = np.zeros(len(self.enh_energy))
+        for i, elem in enumerate(self.elements):
+            tau = mu_elam(elem, np.concatenate(([excitation_energy],
+                                                self.enh_energy)), kind='photo')
+            if i < nlines:
+                factor = _excitation_factor(elem_edges[elem], members[i],
+                                            np.concatenate(([excitation_energy],
+                                                            self.enh_energy)))
+                self.primary_factor[i] = tau[0]*factor[0]
+                self.enhance_factor[i, :] = tau[1:]*factor[1:]
+            sel = np.where(self.enh_index == i)[0]
+            self.enh_primary[sel] = tau[0]*enh_factor[sel]
+
+    def _as_fractions(self, mass_fractions):
+        "2D array of mass fractions for all elements: internal use"
+        conc = np.atleast_2d(np.asarray(mass_fractions, dtype=float))
+        nanalyte = len(self.analyte_index)
+        if conc.shape[1] == nanalyte:
+            balance = np.clip(1 - conc.sum(axis=1), 0, None)
+            conc = np.concatenate((conc, np.zeros((len(conc), len(self.elements)-nanalyte))),
+                                  axis=1)
+            conc[:, nanalyte:] = balance[:, None]*self.matrix_weights[None, nanalyte:]
+        elif conc.shape[1] != len(self.elements):
+            raise ValueError('mass fractions must be given for analytes or all elements')
+        return conc
+
+    def intensities(self, mass_fractions, chunk_size=4096):
+        """fluorescence intensities for the analysis lines
+
+        Args:
+            mass_fractions (ndarray): mass fractions, shape (npixels, nanalytes)
+                for the analytes (with the matrix making up the balance),
+                or shape (npixels, nelements) for all elements in `elements`.
+            chunk_size (int): number of pixels to calculate at a time [4096]
+
+        Returns:
+            ndarray of intensities, shape (npixels, nlines)
+        """
+        conc = self._as_fractions(mass_fractions)
+        out = np.zeros((len(conc), len(self.lines)))
+        for i0 in range(0, len(conc), chunk_size):
+            out[i0:i0+chunk_size] = self._intensities(conc[i0:i0+chunk_size])
+        return out
+
+    def _intensities(self, conc):
+        "intensities for a 2D array of fractions for all elements: internal use"
+        nlines = len(self.lines)
+        s_in, s_out = self.sin_in, self.sin_out
+        mu = conc @ self.mu_table
+        mu0 = mu[:, :1]
+        mu_line = mu[:, 1:1+nlines]
+        mu_enh = mu[:, 1+nlines:]
+        conc_line = conc[:, self.analyte_index]
+
+        chi = mu0/s_in + mu_line/s_out
+        primary = conc_line * self.primary_factor / (s_in*chi)
+        if mu_enh.shape[1] == 0:
+            return primary
+
+        # secondary fluorescence: enhancing line j, analyte line i
+        src = conc[:, self.enh_index] * self.enh_primary        # (n, nenh)
+        term_in = (s_in/mu0) * np.log(1 + mu0/(s_in*mu_enh))      # (n, nenh)
+        term_out = ((s_out/mu_line)[:, :, None] *
+                    np.log(1 + (mu_line/s_out)[:, :, None]/mu_enh[:, None, :]))
+        second = (0.5 * (conc_line/(s_in*chi))[:, :, None] *
+                  self.enhance_factor[None, :, :] * src[:, None, :] *
+                  (term_in[:, None, :] + term_out))
+        return primary + second.sum(axis=2)
+
+    def quantify(self, intensities, scale=1.0, max_iter=100, tol=1.e-6):
+        """mass fractions of analytes from measured line intensities
+
+        Args:
+            intensities (ndarray): measured intensities, shape (npixels, nlines)
+                or (nlines,)
+            scale (float or ndarray): instrument scale factor, so that
+                intensities/scale are on the scale of `intensities()` [1]
+            max_iter (int): maximum number of iterations [100]
+            tol (float): convergence tolerance for mass fractions [1.e-6]
+
+        Returns:
+            FPQuantResult namedtuple with fields
+               `elements`       list of all elements
+               `mass_fractions` ndarray of mass fractions, shape (npixels, nelements)
+               `niter`          number of iterations used
+               `converged`      ndarray of bool, whether each pixel converged
+
+        Notes:
+            1. starting from intensities relative to the pure elements, the
+               analyte mass fractions are iterated with
+               C_i <- C_i * I_measured_i / I_calculated_i(C), for all pixels
+               at once.
+            2. with no matrix, analyte fractions are normalized to sum to 1,
+               otherwise the matrix makes up the balance.
+        """
+        meas = np.atleast_2d(np.asarray(intensities, dtype=float)) / scale
+        nanalyte = len(self.analyte_index)
+        pure = np.diag(self.intensities(np.eye(nanalyte, len(self.elements))))
+        conc = np.clip(meas/pure, 0, None)
+
+        def constrain(conc):
+            if len(self.matrix) == 0:
+                total = conc.sum(axis=1, keepdims=True)
+                conc = conc / np.where(total > 0, total, 1)
+            return conc
+
+        conc = constrain(conc)
+        converged = np.zeros(len(conc), dtype=bool)
+        niter = 0
+        for niter in range(1, max_iter+1):
+            calc = self.intensities(conc)
+            ratio = np.divide(meas, calc, out=np.zeros_like(meas), where=calc > 0)
+            new = constrain(np.clip(conc*ratio, 0, 1))
+            converged = np.all(abs(new - conc) <= tol*np.maximum(new, tol), axis=1)
+            conc = new
+            if converged.all():
+                break
+        return FPQuantResult(list(self.elements), self._as_fractions(conc),
+                             niter, converged)
+
+
+def fp_intensities(sample, excitation_energy, lines, incident_angle=45.0,
+                   exit_angle=45.0, secondary=True, frac_type='mass'):
+    """fundamental-parameters fluorescence intensities for a sample
+
+    Args:
+        sample (str or dict): material name, chemical formula, or dict of
+                   elements/compounds and fractions, as for `transmission_sample`
+        excitation_energy (float): incident X-ray energy (in eV)
+        lines (list): analysis lines, as 'Fe Ka' or ('Fe', 'Ka')
+        incident_angle (float): angle of incident beam to sample, in degrees [45]
+        exit_angle (float): angle of detected fluorescence to sample, in degrees [45]
+        secondary (bool): whether to include secondary fluorescence [True]
+        frac_type (str): for dict samples, whether fractions are `mass`
+                   or `molar` fractions ['mass']
+
+    Returns:
+        dict with keys of analysis lines ('Fe Ka') and values of intensities
+
+    See Also:
+        `FPModel` for many samples or pixels at once.
+
+    Examples:
+        >>> fp_intensities('Fe2O3', 10000, ['Fe Ka'])
+        {'Fe Ka': 0.17874419633163852}
+
+    """
+    fracs = sample_mass_fractions(sample, frac_type=frac_type)
+    lines = [_parse_line(line) for line in lines]
+    analytes = [elem for elem, _ in lines]
+    matrix = {e: f for e, f in fracs.items() if e not in analytes}
+    if len(matrix) > 0:
+        total = sum(matrix.values())
+        matrix = {e: f/total for e, f in matrix.items()}
+    model = FPModel(lines, excitation_energy, matrix=matrix if matrix else None,
+                    incident_angle=incident_angle, exit_angle=exit_angle,
+                    secondary=secondary)
+    conc = [[fracs.get(e, 0.0) for e in model.elements]]
+    out = model.intensities(conc)[0]
+    return {f'{elem} {name}': val for (elem, name), val in zip(lines, out)}
+
+
+def fp_quantify(intensities, excitation_energy, matrix=None, scale=1.0,
+                incident_angle=45.0, exit_angle=45.0, secondary=True):
+    """mass fractions from measured fluorescence intensities, using
+    fundamental parameters
+
+    Args:
+        intensities (dict): measured intensities, with keys of analysis lines
+                   ('Fe Ka' or ('Fe', 'Ka')), one line per element
+        excitation_energy (float): incident X-ray energy (in eV)
+        matrix (None, str, or dict): composition of the unmeasured part of
+                the sample [None]
+        scale (float): instrument scale factor [1]
+        incident_angle (float): angle of incident beam to sample, in degrees [45]
+        exit_angle (float): angle of detected fluorescence to sample, in degrees [45]
+        secondary (bool): whether to include secondary fluorescence [True]
+
+    Returns:
+        dict of mass fractions for all elements
+
+    See Also:
+        `FPModel.quantify` for many pixels at once.
+
+    Examples:
+        >>> counts = fp_intensities({'Fe': 0.3, 'Ni': 0.7}, 10000, ['Fe Ka', 'Ni Ka'])
+        >>> fp_quantify(counts, 10000)
+        {'Fe': 0.2999999997547342, 'Ni': 0.7000000002452658}
+
+    """
+    model = FPModel(list(intensities.keys()), excitation_energy, matrix=matrix,
+                    incident_angle=incident_angle, exit_angle=exit_angle,
+                    secondary=secondary)
+    result = model.quantify(list(intensities.values()), scale=scale)
+    return dict(zip(result.elements, result.mass_fractions[0]))
@@ -5,13 +5,21 @@ Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchic
 using the MIT license
 """
 import os
+import time
 from collections import namedtuple
+from importlib import resources
 import platformdirs
 
 from .chemparser import chemparse
 from .xray import mu_elam, atomic_mass
+from .diskcache import disk_cached
 
 MATERIALS = None
+_USERFILE_STATE = None
+_USERFILE_CHECKED = None
+
+# seconds between checks of the users materials file for changes
+USERFILE_CHECK_INTERVAL = 1.0
 
 Material = namedtuple('Material', ('formula', 'density', 'name', 'categories'))
 
@@ -36,48 +44,130 @@ def get_user_materialsfile(create_folder=False):
         os.makedirs(conf_dir)
     return os.path.join(conf_dir, 'materials.dat')
 
-def _read_materials_db():
+def _parse_materials_lines(lines, materials):
+    """parse lines of a materials file, adding Material instances to
+    the materials dictionary
     """
-    return MATERIALS dictionary, creating it if needed
+    for line in lines:
+        line = line.strip()
+        if len(line) > 2 and not line.startswith('#'):
+            words = [i.strip() for i in line.split('|')]
+            if len(words) == 4: # valid material line
+                name = words[0].lower()
+                density = float(words[1])
+                categories = [w.strip() for w in words[2].split(',')]
+                formula = words[3].replace(' ', '')
+                materials[name] = Material(formula, density, name, categories)
+
+
+def _read_materialsfile(fname, materials, offset=0):
+    """read materials file, starting at byte offset, adding entries to
+    the materials dictionary.
+
+    Returns the byte offset at the end of the last complete line read.
+    When reading from an offset, only complete lines are parsed, as a
+    final line without a newline may still be being written.  When reading
+    the whole file, a final line without a newline is also parsed, but will
+    be read again if more is appended.  Undecodable bytes are replaced.
     """
-    global MATERIALS
-    if MATERIALS is None:
-        # initialize materials table
-        MATERIALS = {}
-
-        def read_materialsfile(fname):
-            with open(fname, 'r', encoding='utf-8') as fh:
-                lines = fh.readlines()
-            for line in lines:
-                line = line.strip()
-                if len(line) > 2 and not line.startswith('#'):
-                    words = [i.strip() for i in line.split('|')]
-                    formula = None
-                    if len(words) == 4: # valid material line
-                        name = words[0].lower()
-                        density = float(words[1])
-                        categories = [w.strip() for w in words[2].split(',')]
-                        formula = words[3].replace(' ', '')
-                        MATERIALS[name] = Material(formula, density, name, categories)
-
-        # first, read from standard list
-        local_dir, _ = os.path.split(__file__)
-        fname = os.path.join(local_dir, 'materials.dat')
-        if os.path.exists(fname):
-            read_materialsfile(fname)
-        # next, read from users materials file
-        fname = get_user_materialsfile()
-        if os.path.exists(fname):
-            read_materialsfile(fname)
+    with open(fname, 'rb') as fh:
+        fh.seek(offset)
+        data = fh.read()
+    nread = data.rfind(b'\n') + 1
+    if offset > 0:
+        data = data[:nread]
+    _parse_materials_lines(data.decode('utf-8', errors='replace').split('\n'),
+                           materials)
+    return offset + nread
+
+
+def _user_materials_state(fname, offset):
+    """file state (mtime, size, offset, tail) used to detect changes to
+    the users materials file: `tail` holds the last bytes read, so that an
+    edited file of increased size is not mistaken for an appended file.
+    """
+    stat = os.stat(fname)
+    tail = b''
+    if offset > 0:
+        with open(fname, 'rb') as fh:
+            fh.seek(max(0, offset-64))
+            tail = fh.read(min(offset, 64))
+    return {'fname': fname, 'mtime': stat.st_mtime_ns,
+            'size': stat.st_size, 'offset': offset, 'tail': tail}
+
+
+def _read_materials_db(force_read=False):
+    """
+    return MATERIALS dictionary, creating it if needed.
 
+    The users materials file is checked for changes (by modification time
+    and size) at most once every USERFILE_CHECK_INTERVAL seconds. Lines
+    appended since the last read are read incrementally, while any other
+    change causes a full re-read.  A new dictionary replaces MATERIALS
+    after any change, so that a dictionary in use is never altered.
+    """
+    global MATERIALS, _USERFILE_STATE, _USERFILE_CHECKED
+    now = time.monotonic()
+    if MATERIALS is not None and not force_read:
+        if (_USERFILE_CHECKED is not None and
+            now - _USERFILE_CHECKED < USERFILE_CHECK_INTERVAL):
+            return MATERIALS
+    _USERFILE_CHECKED = now
+    fname = get_user_materialsfile()
+    state = _USERFILE_STATE
+    if MATERIALS is not None and not force_read:
+        if not os.path.exists(fname):
+            if state is None:
+                return MATERIALS
+        else:
+            stat = os.stat(fname)
+            if (state is not None and state['fname'] == fname and
+                stat.st_mtime_ns == state['mtime'] and
+                stat.st_size == state['size']):
+                return MATERIALS
+            if (state is not None and state['fname'] == fname and
+                stat.st_size > state['offset']):
+                offset = state['offset']
+                with open(fname, 'rb') as fh:
+                    fh.seek(max(0, offset-64))
+                    tail = fh.read(min(offset, 64))
+                if tail == state['tail']:
+                    materials = dict(MATERIALS)
+                    offset = _read_materialsfile(fname, materials, offset)
+                    _USERFILE_STATE = _user_materials_state(fname, offset)
+                    MATERIALS = materials
+                    return MATERIALS
+
+    # full read: first, read from standard list, then from users materials file
+    materials = {}
+    state = None
+    local_dir, _ = os.path.split(__file__)
+    sysfile = os.path.join(local_dir, 'materials.dat')
+    if os.path.exists(sysfile):
+        _read_materialsfile(sysfile, materials)
+    else:   # not a file on disk, as when imported from a zip file
+        sysdata = resources.files(__package__).joinpath('materials.dat')
+        _parse_materials_lines(sysdata.read_text(encoding='utf-8').split('\n'),
+                               materials)
+    if os.path.exists(fname):
+        offset = _read_materialsfile(fname, materials)
+        state = _user_materials_state(fname, offset)
+    _USERFILE_STATE = state
+    MATERIALS = materials
     return MATERIALS
 
+def _material_definition(arguments):
+    "formula and density used by material_mu, for disk cache keys: internal use"
+    return _material_formula_density(arguments['name'], arguments['density'])
+
+
+@disk_cached(min_points=1000, resolve=_material_definition)
 def material_mu(name, energy, density=None, kind='total'):
     """X-ray attenuation length (in 1/cm) for a material by name or formula
 
     Args:
         name (str): chemical formul or name of material from materials list.
-        energy (float or ndarray):   energy or array of energies in eV
+        energy (float, ndarray, or EnergyGrid): energy or array of energies in eV
         density (None or float):  material density (gr/cm^3).
         kind (str): 'photo' or 'total' for whether to return the
                     photo-absorption or total cross-section ['total']
@@ -94,11 +184,20 @@ def material_mu(name, energy, density=None, kind='total'):
         >>> material_mu('H2O', 10000.0)
         5.32986401658495
     """
+    formula, density = _material_formula_density(name, density)
+    mass_tot, mu = 0.0, 0.0
+    for elem, frac in chemparse(formula).items():
+        mass  = frac * atomic_mass(elem)
+        mu   += mass * mu_elam(elem, energy, kind=kind)
+        mass_tot += mass
+    return density*mu/mass_tot
+
+
+def _material_formula_density(name, density=None):
+    """formula and density for a material name or formula, as used
+    by material_mu(): internal use"""
     global MATERIALS
-    if MATERIALS is None:
-        MATERIALS = _read_materials_db()
-    formula = None
-    _density  = None
+    MATERIALS = _read_materials_db()
     mater = MATERIALS.get(name.lower(), None)
     if mater is None:
         for val in MATERIALS.values():
@@ -107,22 +206,12 @@ def material_mu(name, energy, density=None, kind='total'):
                 break
 
     # default to using passed in name as a formula
-    if formula is None:
-        if mater is None:
-            formula = name
-        else:
-            formula = mater.formula
+    formula = name if mater is None else mater.formula
     if density is None and mater is not None:
         density = mater.density
     if density is None:
         raise Warning('material_mu(): must give density for unknown materials')
-
-    mass_tot, mu = 0.0, 0.0
-    for elem, frac in chemparse(formula).items():
-        mass  = frac * atomic_mass(elem)
-        mu   += mass * mu_elam(elem, energy, kind=kind)
-        mass_tot += mass
-    return density*mu/mass_tot
+    return formula, density
 
 
 def material_mu_components(name, energy, density=None, kind='total'):
@@ -130,7 +219,7 @@ def material_mu_components(name, energy, density=None, kind='total'):
 
     Args:
         name (str): chemical formul or name of material from materials list.
-        energy (float or ndarray):   energy or array of energies in eV
+        energy (float, ndarray, or EnergyGrid): energy or array of energies in eV
         density (None or float):  material density (gr/cm^3).
         kind (str):  'photo' or 'total'for whether to
                   return photo-absorption or total cross-section ['total']
@@ -150,8 +239,7 @@ def material_mu_components(name, energy, density=None, kind='total'):
         'Si': (1, 28.0855, 33.87943243018506), 'O': (2.0, 15.9994, 5.952824815297084)}
      """
     global MATERIALS
-    if MATERIALS is None:
-        MATERIALS = _read_materials_db()
+    MATERIALS = _read_materials_db()
     mater = MATERIALS.get(name.lower(), None)
     if mater is None:
         formula = name
@@ -212,8 +300,7 @@ def find_material(name):
 
     """
     global MATERIALS
-    if MATERIALS is None:
-        MATERIALS = _read_materials_db()
+    MATERIALS = _read_materials_db()
 
     mat =  MATERIALS.get(name.lower(), None)
 
@@ -254,8 +341,7 @@ def get_materials(force_read=False, categories=None):
     """
     global MATERIALS
 
-    if force_read or MATERIALS is None:
-        MATERIALS = _read_materials_db()
+    MATERIALS = _read_materials_db(force_read=force_read)
     if categories is not None:
         if not isinstance(categories, list):
             categories = list([categories])
@@ -287,27 +373,90 @@ def add_material(name, formula, density, categories=None):
     Examples:
         >>> xraydb.add_material('becopper', 'Cu0.98e0.02', 8.3, categories=['metal'])
 
+    See Also:
+       add_materials()
     """
-    global MATERIALS
-    if MATERIALS is None:
-        MATERIALS = _read_materials_db()
-    formula = formula.replace(' ', '')
+    add_materials([(name, formula, density, categories)])
+
 
-    if categories is None:
-        categories = []
-    MATERIALS[name.lower()] = Material(formula, float(density), name, categories)
+def add_materials(materials):
+    """add several materials to the users local material database
 
-    text = ['# user-specific database of materials',
-            '# name  |  density |  categories | formula']
+    Args:
+        materials (list): list of materials, each a tuple of
+               (name, formula, density) or (name, formula, density, categories),
+               or a dict with keys 'name', 'formula', 'density', and
+               (optionally) 'categories'.
 
+    Returns:
+        None
+
+    Notes:
+        1. the data will be appended to the file 'xraydb/materials.dat' in the
+           users configuration folder with a single write, and will be useful
+           in subsequent sessions.
+        2. changes to that file made by other processes are detected by file
+           modification time and size, checked at most once every
+           USERFILE_CHECK_INTERVAL seconds, and appended lines are read
+           incrementally.
+
+    Examples:
+        >>> xraydb.add_materials([('becopper', 'Cu0.98Be0.02', 8.3, ['metal']),
+        ...                       ('caffeine', 'C8H10N4O2', 1.23)])
+
+    See Also:
+       add_material()
+    """
+    global MATERIALS, _USERFILE_STATE
+    MATERIALS = _read_materials_db()
+
+    text, new = [], {}
+    for mat in materials:
+        if isinstance(mat, dict):
+            name, formula = mat['name'], mat['formula']
+            density, categories = mat['density'], mat.get('categories', None)
+        elif len(mat) == 3:
+            (name, formula, density), categories = mat, None
+        else:
+            name, formula, density, categories = mat
+        formula = formula.replace(' ', '')
+        if categories is None:
+            categories = []
+        elif isinstance(categories, str):
+            categories = [categories]
+        density = float(density)
+        for word in [name, formula] + list(categories):
+            if '|' in word or '\n' in word:
+                raise ValueError(f"invalid material definition for '{name}'")
+        new[name.lower()] = Material(formula, density, name, categories)
+        text.append(f" {name:s} | {density:.6g} | {', '.join(categories):s} | {formula:s}\n")
 
     fname = get_user_materialsfile(create_folder=True)
-    if os.path.exists(fname):
-        with open(fname, 'r', encoding='utf-8') as fh:
-            text = [s[:-1] for s in fh.readlines()]
-
-    # catstring = ', '.join(categories)
-    text.append(f" {name:s} | {density:.6g} | {', '.join(categories):s} | {formula:s}")
-    text.append('')
-    with open(fname, 'w', encoding='utf-8') as fh:
-        fh.write('\n'.join(text))
+    size = os.stat(fname).st_size if os.path.exists(fname) else 0
+    if size == 0:
+        text.insert(0, '# user-specific database of materials\n'
+                       '# name  |  density |  categories | formula\n')
+    else:
+        with open(fname, 'rb') as fh:
+            fh.seek(size-1)
+            if fh.read(1) != b'\n':
+                text.insert(0, '\n')
+    buff = ''.join(text).encode('utf-8')
+
+    # a single write with O_APPEND will not interleave with other writers
+    fd = os.open(fname, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        nout = 0
+        while nout < len(buff):
+            nout += os.write(fd, buff[nout:])
+    finally:
+        os.close(fd)
+
+    MATERIALS = {**MATERIALS, **new}
+    # if no other process appended to the file, the new lines need not be re-read
+    state = _USERFILE_STATE
+    if state is None:
+        state = {'fname': fname, 'size': 0, 'offset': 0}
+    if (state['fname'] == fname and state['size'] == state['offset'] == size and
+        os.stat(fname).st_size == size + len(buff)):
+        _USERFILE_STATE = _user_materials_state(fname, size + len(buff))
@@ -0,0 +1,285 @@
+"""
+Parallel map over elements, materials, or energies with a pool of processes
+that share the decoded data tables
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import os
+import math
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .xray import get_xraydb, atomic_symbol
+
+# decoded tables that are shared: Elam cross-sections, Chantler columns,
+# and Compton energies
+ELAM_KINDS = ('photo', 'coh', 'incoh')
+CHANTLER_COLUMNS = ('energy', 'f1', 'f2', 'mu_photo', 'mu_incoh', 'mu_total')
+
+# in worker processes: the attached shared memory, kept open while in use
+_worker = {'shm': None}
+
+# functions whose results depend on the range of all energies given, as the
+# f1 spline is fit to the Chantler table over that range: these are not split
+# into chunks by Pool.map_energy, so that results match a single call.
+RANGE_DEPENDENT = {f'xraydb.xray.{name}' for name in
+                   ('f1_chantler', 'chantler_data', 'xray_delta_beta',
+                    'mirror_reflectivity', 'multilayer_reflectivity',
+                    'coated_reflectivity', 'darwin_width',
+                    'dynamical_theta_offset')}
+
+
+class SharedTables:
+    """decoded data tables of XrayDB, published once in shared memory
+
+    Args:
+        elements (None or list): elements to include [None, meaning all]
+
+    Notes:
+        1. the tables are decoded in the process making SharedTables, and
+           copied into one block of shared memory with an index of
+           {key: [(offset, length), ...]}.  Processes calling `attach`
+           use the arrays in shared memory directly, without decoding
+           or copying them.
+        2. `close` must be called by the process making SharedTables when
+           the tables are no longer needed.
+    """
+    def __init__(self, elements=None):
+        xdb = get_xraydb()
+        if elements is None:
+            elements = [atomic_symbol(z) for z in range(1, 99)]
+        tables = {}
+        for elem in elements:
+            elem = xdb.symbol(elem)
+            for kind in ELAM_KINDS:
+                tables[(elem, kind)] = xdb._elam_table(elem, kind)
+            if xdb.atomic_number(elem) <= 92:
+                for col in CHANTLER_COLUMNS:
+                    tables[(elem, 'chantler', col)] = (xdb._chantler_column(elem, col),)
+        xdb.compton_energies(1000.0)
+        tables[('Compton_energies', None)] = xdb._decoded[('Compton_energies', None)]
+
+        self.index = {}
+        offset = 0
+        for key, arrays in tables.items():
+            self.index[key] = []
+            for arr in arrays:
+                self.index[key].append((offset, arr.size))
+                offset += arr.size
+        self.size = offset
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8, 8*offset))
+        buff = np.ndarray((offset,), dtype=np.float64, buffer=self.shm.buf)
+        for key, arrays in tables.items():
+            for (start, npts), arr in zip(self.index[key], arrays):
+                buff[start:start+npts] = arr.ravel()
+        del buff
+
+    @property
+    def name(self):
+        "name of shared memory block"
+        return self.shm.name
+
+    def close(self):
+        "release and remove the shared memory"
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def attach(name, index):
+    """use shared tables in this process, as made by SharedTables
+
+    Args:
+        name (str): name of shared memory block, SharedTables.name
+        index (dict): index of tables, SharedTables.index
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    buff = np.ndarray((sum(n for vals in index.values() for _, n in vals),),
+                      dtype=np.float64, buffer=shm.buf)
+    buff.flags.writeable = False
+    xdb = get_xraydb()
+    for key, locs in index.items():
+        arrays = [buff[start:start+npts] for start, npts in locs]
+        if len(key) == 3:
+            xdb._decoded[key] = arrays[0]
+        elif key[0] == 'Compton_energies':
+            xdb._decoded[key] = arrays
+        else:
+            xdb._decoded[key] = tuple(arrays)
+    _worker['shm'] = shm
+
+
+def _init_worker(name, index):
+    "initialize worker process: internal use"
+    attach(name, index)
+
+
+def _run_chunk(func, items, star):
+    "run func on a chunk of items: internal use"
+    if star:
+        return [func(*item) for item in items]
+    return [func(item) for item in items]
+
+
+def auto_chunksize(nitems, nworkers, per_worker=4):
+    """number of items to send to a worker at one time, so that each
+    worker gets about `per_worker` chunks"""
+    return max(1, math.ceil(nitems/(nworkers*per_worker)))
+
+
+class Pool:
+    """pool of worker processes sharing the decoded XrayDB data tables
+
+    Args:
+        processes (None or int): number of processes [None, the number of CPUs]
+        elements (None or list): elements for shared tables [None, meaning all]
+        mp_context (None or multiprocessing context): context for starting
+                 processes [None, the default]
+
+    Notes:
+        1. the functions given to `map`, `starmap` and `map_energy` must be
+           importable by the worker processes: functions of xraydb, or
+           functions defined at the top level of a module.
+        2. worker processes use the decoded tables in shared memory, so that
+           they do not need to read and decode them from the database.
+
+    Examples:
+        >>> import xraydb
+        >>> from xraydb.parallel import Pool
+        >>> energy = np.linspace(1000, 50000, 5001)
+        >>> with Pool(4) as pool:
+        ...    mus = pool.starmap(xraydb.material_mu,
+        ...                       [(name, energy) for name in xraydb.get_materials()])
+        ...    edges = pool.map(xraydb.xray_edges, range(1, 99))
+
+    See Also:
+        pool_map, pool_starmap
+
+    """
+    def __init__(self, processes=None, elements=None, mp_context=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.tables = SharedTables(elements=elements)
+        self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                            mp_context=mp_context,
+                                            initializer=_init_worker,
+                                            initargs=(self.tables.name, self.tables.index))
+
+    def _map(self, func, items, chunksize, star):
+        items = list(items)
+        if chunksize is None:
+            chunksize = auto_chunksize(len(items), self.processes)
+        chunks = [items[i:i+chunksize] for i in range(0, len(items), chunksize)]
+        out = []
+        for result in self.executor.map(_run_chunk, [func]*len(chunks), chunks,
+                                        [star]*len(chunks)):
+            out.extend(result)
+        return out
+
+    def map(self, func, iterable, chunksize=None):
+        """list of func(item) for each item, calculated in parallel
+
+        Args:
+            func (callable): function of one argument
+            iterable (iterable): items, such as elements or material names
+            chunksize (None or int): number of items to send to a worker
+                      at one time [None, for about 4 chunks per worker]
+        """
+        return self._map(func, iterable, chunksize, False)
+
+    def starmap(self, func, iterable, chunksize=None):
+        """list of func(*args) for each tuple of args, calculated in parallel
+
+        Args:
+            func (callable): function
+            iterable (iterable): tuples of arguments
+            chunksize (None or int): number of items to send to a worker
+                      at one time [None, for about 4 chunks per worker]
+        """
+        return self._map(func, iterable, chunksize, True)
+
+    def map_energy(self, func, *args, energy=None, nchunks=None, **kws):
+        """func(*args, energy=chunk, **kws) for chunks of an energy array,
+        calculated in parallel, and joined together
+
+        Args:
+            func (callable): function with an `energy` keyword argument,
+                 returning an ndarray (or tuple of ndarrays) with the shape of energy
+            args: other arguments for func
+            energy (ndarray): energies
+            nchunks (None or int): number of chunks [None, the number of processes]
+            kws: other keyword arguments for func
+
+        Notes:
+            functions in RANGE_DEPENDENT, such as `f1_chantler` and
+            `xray_delta_beta`, give results that depend on the range of all
+            energies.  These are calculated for all energies in one worker
+            process, so that results are the same as for a single call.
+
+        Examples:
+            >>> mu = pool.map_energy(xraydb.material_mu, 'kapton',
+                                     energy=np.linspace(1000, 50000, 1000000))
+        """
+        energy = np.asarray(energy, dtype=float)
+        nchunks = min(len(energy), nchunks or self.processes)
+        fname = f"{getattr(func, '__module__', '')}.{getattr(func, '__name__', '')}"
+        if fname in RANGE_DEPENDENT:
+            nchunks = 1
+        chunks = np.array_split(energy, max(1, nchunks))
+        futures = [self.executor.submit(_call_energy, func, args, kws, chunk)
+                   for chunk in chunks]
+        results = [fut.result() for fut in futures]
+        if isinstance(results[0], tuple):
+            return tuple(np.concatenate(vals) for vals in zip(*results))
+        return np.concatenate(results)
+
+    def close(self):
+        "shut down worker processes and release the shared tables"
+        self.executor.shutdown(wait=True)
+        self.tables.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _call_energy(func, args, kws, energy):
+    "call func with an energy chunk: internal use"
+    return func(*args, energy=energy, **kws)
+
+
+def pool_map(func, iterable, processes=None, chunksize=None):
+    """list of func(item) for each item, calculated with a temporary `Pool`
+
+    Args:
+        func (callable): function of one argument
+        iterable (iterable): items, such as elements or material names
+        processes (None or int): number of processes [None, the number of CPUs]
+        chunksize (None or int): number of items to send to a worker
+                 at one time [None, for about 4 chunks per worker]
+
+    Examples:
+        >>> from xraydb.parallel import pool_map
+        >>> from xraydb import xray_edges
+        >>> edges = pool_map(xray_edges, range(1, 99))
+    """
+    with Pool(processes=processes) as pool:
+        return pool.map(func, iterable, chunksize=chunksize)
+
+
+def pool_starmap(func, iterable, processes=None, chunksize=None):
+    """list of func(*args) for each tuple of args, calculated with a temporary `Pool`
+
+    Args:
+        func (callable): function
+        iterable (iterable): tuples of arguments
+        processes (None or int): number of processes [None, the number of CPUs]
+        chunksize (None or int): number of items to send to a worker
+                 at one time [None, for about 4 chunks per worker]
+    """
+    with Pool(processes=processes) as pool:
+        return pool.starmap(func, iterable, chunksize=chunksize)
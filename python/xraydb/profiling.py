@@ -0,0 +1,330 @@
+"""
+Opt-in profiling of xraydb: call counts, times, and database queries
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import inspect
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# active Profile instances: wrappers are installed only while this is not empty.
+# This list is replaced, not changed, so that wrappers can loop over it
+_profiles = []
+_installed = {'patches': [], 'engine': None, 'listeners': []}
+
+# guards starting and stopping profiles, with installing and removing wrappers
+_profiles_lock = threading.Lock()
+
+
+class _TopLevel(threading.local):
+    "the outermost profiled call in progress in a thread, and its queries"
+    def __init__(self):
+        self.depth = 0
+        self.name = None
+        self.nqueries = 0
+        self.query_time = 0.0
+
+
+_toplevel = _TopLevel()
+
+# time spent in these functions is also reported by category
+CATEGORIES = {'json.loads': 'json', 'utils.elam_spline': 'spline',
+              'chemparser.chemparse': 'formula'}
+
+SQL_TABLES = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+class Profile:
+    """call counts and times for xraydb functions and methods, and counts
+    and times of database queries per table, as recorded by `profile`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        "clear all recorded data"
+        with self._lock:
+            self.calls = {}
+            self.queries = {}
+            self.nqueries = 0
+            self.query_time = 0.0
+            self.toplevel = {}
+
+    def _add_call(self, name, dt):
+        with self._lock:
+            count, total = self.calls.get(name, (0, 0.0))
+            self.calls[name] = (count+1, total+dt)
+
+    def _add_query(self, tables, dt):
+        with self._lock:
+            self.nqueries += 1
+            self.query_time += dt
+            for tab in tables:
+                self.queries[tab] = self.queries.get(tab, 0) + 1
+
+    def _add_toplevel(self, name, nqueries, query_time):
+        with self._lock:
+            ncalls, total, most, qtime = self.toplevel.get(name, (0, 0, 0, 0.0))
+            self.toplevel[name] = (ncalls+1, total+nqueries, max(most, nqueries),
+                                   qtime+query_time)
+
+    def as_dict(self):
+        """recorded data as a dict with keys
+
+           `calls`       {name: {'count': ncalls, 'time': cumulative time in sec}}
+           `queries`     {table name: number of queries}
+           `nqueries`    total number of queries
+           `toplevel`    {name: {'count': ncalls, 'queries': nqueries,
+                                 'max_queries': most queries in one call,
+                                 'query_time': time in sec}}
+                         for queries made within each outermost call
+           `categories`  {'sql', 'json', 'spline', 'formula': time in sec}
+        """
+        with self._lock:
+            calls, queries = dict(self.calls), dict(self.queries)
+            nqueries, query_time = self.nqueries, self.query_time
+            toplevel = dict(self.toplevel)
+        cats = {'sql': query_time, 'json': 0.0, 'spline': 0.0, 'formula': 0.0}
+        for name, cat in CATEGORIES.items():
+            cats[cat] += calls.get(name, (0, 0.0))[1]
+        return {'calls': {name: {'count': count, 'time': total}
+                          for name, (count, total) in calls.items()},
+                'queries': queries,
+                'nqueries': nqueries,
+                'toplevel': {name: {'count': count, 'queries': nq,
+                                    'max_queries': most, 'query_time': qtime}
+                             for name, (count, nq, most, qtime) in toplevel.items()},
+                'categories': cats}
+
+    def report(self, nrows=25):
+        "text table of the functions with largest cumulative times"
+        out = self.as_dict()
+        lines = [f"{'function':40s} {'calls':>8s} {'time (ms)':>12s}"]
+        calls = sorted(out['calls'].items(), key=lambda x: -x[1]['time'])
+        for name, dat in calls[:nrows]:
+            lines.append(f"{name:40s} {dat['count']:8d} {1000*dat['time']:12.3f}")
+        lines.append('')
+        lines.append(f"{'category':40s} {'time (ms)':>21s}")
+        for cat, val in out['categories'].items():
+            lines.append(f"{cat:40s} {1000*val:21.3f}")
+        lines.append('')
+        lines.append(f"{'table':40s} {'queries':>21s}")
+        for tab, count in sorted(out['queries'].items(), key=lambda x: -x[1]):
+            lines.append(f"{tab:40s} {count:21d}")
+        lines.append('')
+        lines.append(f"{'outermost call':40s} {'calls':>8s} {'queries':>12s} {'max/call':>9s}")
+        for name, dat in sorted(out['toplevel'].items(), key=lambda x: -x[1]['queries']):
+            if dat['queries'] > 0:
+                lines.append(f"{name:40s} {dat['count']:8d} {dat['queries']:12d} {dat['max_queries']:9d}")
+        return '\n'.join(lines)
+
+
+def _wrap(name, func):
+    "wrap function to record calls and times with active profiles"
+    @wraps(func)
+    def wrapper(*args, **kws):
+        top = _toplevel
+        if top.depth == 0:
+            top.name, top.nqueries, top.query_time = name, 0, 0.0
+        top.depth += 1
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kws)
+        finally:
+            dt = time.perf_counter() - t0
+            top.depth -= 1
+            for prof in _profiles:
+                prof._add_call(name, dt)
+                if top.depth == 0:
+                    prof._add_toplevel(name, top.nqueries, top.query_time)
+    return wrapper
+
+
+class _JSONProxy:
+    "stand-in for the json module with a profiled `loads`: internal use"
+    def __init__(self, loads):
+        self.loads = loads
+
+    def __getattr__(self, attr):
+        return getattr(json, attr)
+
+
+def _targets():
+    """(name, function) for functions to profile: the public
+    functions of xray.py and materials.py, and the helpers for spline
+    evaluation and formula parsing."""
+    targets = []
+    for modname in ('xray', 'materials'):
+        mod = sys.modules.get(f'xraydb.{modname}')
+        if mod is None:
+            continue
+        for name, obj in vars(mod).items():
+            if (inspect.isfunction(obj) and not name.startswith('_')
+                    and obj.__module__ == mod.__name__):
+                targets.append((f'{modname}.{name}', obj))
+    from . import utils, chemparser
+    targets.append(('utils.elam_spline', utils.elam_spline))
+    targets.append(('chemparser.chemparse', chemparser.chemparse))
+    return targets
+
+
+def _install():
+    "install wrappers and query listeners: internal use"
+    from .xraydb import XrayDB
+    from .xray import get_xraydb
+    patches = _installed['patches']
+
+    # methods of XrayDB
+    for name, obj in list(vars(XrayDB).items()):
+        if inspect.isfunction(obj) and not name.startswith('__'):
+            setattr(XrayDB, name, _wrap(f'XrayDB.{name}', obj))
+            patches.append((XrayDB, name, obj))
+
+    # functions, replaced in every xraydb module that refers to them
+    modules = [mod for mname, mod in list(sys.modules.items())
+               if mod is not None and (mname == 'xraydb' or mname.startswith('xraydb.'))]
+    for name, func in _targets():
+        wrapper = _wrap(name, func)
+        for mod in modules:
+            for attr, obj in list(vars(mod).items()):
+                if obj is func:
+                    setattr(mod, attr, wrapper)
+                    patches.append((mod, attr, func))
+
+    xdbmod = sys.modules['xraydb.xraydb']
+    patches.append((xdbmod, 'json', xdbmod.json))
+    xdbmod.json = _JSONProxy(_wrap('json.loads', json.loads))
+
+    # database queries, per table
+    engine = get_xraydb().engine
+    def before_execute(conn, cursor, statement, params, context, executemany):
+        conn.info.setdefault('_xraydb_t0', []).append(time.perf_counter())
+
+    def after_execute(conn, cursor, statement, params, context, executemany):
+        dt = time.perf_counter() - conn.info['_xraydb_t0'].pop()
+        tables = sorted(set(SQL_TABLES.findall(statement)))
+        top = _toplevel
+        if top.depth > 0:
+            top.nqueries += 1
+            top.query_time += dt
+        for prof in _profiles:
+            prof._add_query(tables, dt)
+
+    for evt, func in (('before_cursor_execute', before_execute),
+                      ('after_cursor_execute', after_execute)):
+        event.listen(engine, evt, func)
+        _installed['listeners'].append((evt, func))
+    _installed['engine'] = engine
+
+
+def _uninstall():
+    "remove wrappers and query listeners: internal use"
+    for obj, attr, orig in reversed(_installed['patches']):
+        setattr(obj, attr, orig)
+    _installed['patches'] = []
+    engine = _installed['engine']
+    for evt, func in _installed['listeners']:
+        event.remove(engine, evt, func)
+    _installed['listeners'] = []
+    _installed['engine'] = None
+
+
+def start_profile():
+    """start recording calls and queries, returning a new Profile
+
+    Notes:
+        wrappers are installed when the first profile is started and
+        removed when the last profile is stopped, so that there is no
+        overhead when no profile is active.
+    """
+    global _profiles
+    prof = Profile()
+    with _profiles_lock:
+        if len(_profiles) == 0:
+            _install()
+        _profiles = _profiles + [prof]
+    return prof
+
+
+def stop_profile(prof):
+    "stop recording calls and queries for a Profile"
+    global _profiles
+    with _profiles_lock:
+        _profiles = [p for p in _profiles if p is not prof]
+        if len(_profiles) == 0 and len(_installed['patches']) > 0:
+            _uninstall()
+
+
+@contextmanager
+def profile(callback=None):
+    """context manager to record call counts, times and database queries
+    for xraydb functions and XrayDB methods
+
+    Args:
+        callback (None or callable): function to call on exit with
+                 the dict of results from `Profile.as_dict()` [None]
+
+    Yields:
+        Profile instance, with `calls` and `queries` attributes,
+        and `as_dict()` and `report()` methods.
+
+    Notes:
+        1. recorded functions are the methods of XrayDB, the public functions
+           in xray.py and materials.py, JSON decoding, spline evaluation
+           (elam_spline), and formula parsing (chemparse).  Times are cumulative,
+           including time spent in other recorded functions.
+        2. database queries are counted and timed for each table they use,
+           and for each outermost (top-level) call to a recorded function,
+           so that calls making many queries can be found.  Only queries to
+           the shared database of `get_xraydb()` are recorded, not those of
+           XrayDB instances created separately.
+        3. setting the environment variable XRAYDB_PROFILE before importing
+           xraydb will profile the whole process, and print a report at exit.
+           If the value of XRAYDB_PROFILE ends with '.json', the results will
+           be written to that file instead.
+
+    Examples:
+        >>> from xraydb.profiling import profile
+        >>> with profile() as prof:
+        ...     xraydb.material_mu('kapton', np.linspace(5000, 10000, 501))
+        ...
+        >>> prof.as_dict()['calls']['xray.mu_elam']
+        {'count': 4, 'time': 0.012...}
+        >>> print(prof.report())
+
+    """
+    prof = start_profile()
+    try:
+        yield prof
+    finally:
+        stop_profile(prof)
+        if callback is not None:
+            callback(prof.as_dict())
+
+
+def _profile_from_env():
+    "start profiling the process if XRAYDB_PROFILE is set: internal use"
+    value = os.environ.get('XRAYDB_PROFILE', '').strip()
+    if value in ('', '0'):
+        return
+    prof = start_profile()
+
+    def _finish():
+        stop_profile(prof)
+        if value.lower().endswith('.json'):
+            with open(value, 'w', encoding='utf-8') as fh:
+                json.dump(prof.as_dict(), fh, indent=2)
+        else:
+            sys.stderr.write(prof.report() + '\n')
+    atexit.register(_finish)
@@ -0,0 +1,132 @@
+"""
+Sample preparation for transmission XAFS: choice of dilutant and masses
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+from collections import namedtuple
+import numpy as np
+
+from .xray import xray_edge, transmission_samples
+from .materials import (get_materials, find_material, material_mu,
+                        _material_formula_density)
+
+SamplePrep = namedtuple('SamplePrep', ('dilutant', 'sample_mass_mg',
+                                       'dilutant_mass_mg', 'sample_fraction',
+                                       'edge_step', 'absorp_total',
+                                       'energy', 'area_cm2'))
+
+
+def optimize_sample_prep(sample, element, edge='K', area=1.33, edge_step=1.0,
+                         absorp_max=2.6, min_total_mass=None, dilutants=None,
+                         sample_masses=None, dilutant_masses=None,
+                         energy=None, frac_type='mass'):
+    """choose dilutant and masses of sample and dilutant for a transmission
+    sample, such as a pressed pellet.
+
+    Args:
+        sample (str or dict): sample formula, material name or dict of mass fractions,
+                   as for `transmission_sample`
+        element (str): absorbing element
+        edge (str): absorption edge ['K']
+        area (float): area of sample or pellet in cm^2 [1.33, for 13 mm diameter]
+        edge_step (float): target edge step for the element [1.0]
+        absorp_max (float): largest allowed total absorption (mu_t*d) [2.6]
+        min_total_mass (None or float): smallest total mass (in mg), as needed
+                   to make a pellet [None, no minimum]
+        dilutants (None, str or list): names of dilutant materials
+                   [None, meaning all materials with category 'dilutant']
+        sample_masses (None or ndarray): sample masses (in mg) to consider
+                   [None, 201 masses up to 2x that for the target edge step]
+        dilutant_masses (None or ndarray): dilutant masses (in mg) to consider
+                   [None, 0 to 500 mg, in 1 mg steps]
+        energy (None or float): X-ray energy in eV [None, edge energy + 50 eV]
+        frac_type (str): `mass` or `molar`, as for `transmission_sample`
+
+    Returns:
+        list of SamplePrep named tuples with fields
+           (dilutant, sample_mass_mg, dilutant_mass_mg, sample_fraction,
+           edge_step, absorp_total, energy, area_cm2)
+        with the best choice for each dilutant, best first.  Dilutants
+        with no choice meeting the constraints are not included.
+
+    Notes:
+        1. the best choice has the edge step closest to the target value,
+           and then the lowest total absorption, with total absorption at
+           most `absorp_max` and total mass at least `min_total_mass`.
+        2. the sample edge step and absorption per mass are found with
+           `transmission_samples`, and dilutant absorption with `material_mu`,
+           each called once.  All combinations of dilutant, sample mass
+           and dilutant mass are then evaluated together as arrays.
+
+    Examples:
+        >>> best = optimize_sample_prep('Fe2O3', 'Fe', min_total_mass=100)
+        >>> best[0].dilutant, best[0].sample_mass_mg, best[0].dilutant_mass_mg
+        ('polyethylene', 5.481202288591105, 95.0)
+        >>> best[0].edge_step, best[0].absorp_total
+        (1.0049751243781093, 1.5702344696130974)
+
+    """
+    if energy is None:
+        energy = xray_edge(element, edge).energy + 50.0
+    if dilutants is None:
+        dilutants = list(get_materials(categories='dilutant').keys())
+    elif isinstance(dilutants, str):
+        dilutants = [dilutants]
+    if len(dilutants) == 0:
+        raise ValueError('no dilutants given')
+
+    if isinstance(sample, str):
+        mat = find_material(sample)
+        if mat is not None:
+            sample = mat.formula
+
+    # edge step and absorption per mass thickness of sample (in cm^2/gr)
+    result = transmission_samples([sample], energy, absorp_total=1.0, area=1.0,
+                                  frac_type=frac_type)[0]
+    if element not in result.absorbance_steps:
+        raise ValueError(f"element '{element}' is not in sample")
+    sample_mu = 1000.0/result.mass_total_mg
+    sample_step = result.absorbance_steps[element]*sample_mu
+
+    dilutant_mu = []
+    for name in dilutants:
+        _, density = _material_formula_density(name)
+        dilutant_mu.append(material_mu(name, energy)/density)
+    dilutant_mu = np.array(dilutant_mu)
+
+    if sample_masses is None:
+        target_mass = 1000.0*area*edge_step/sample_step
+        sample_masses = np.linspace(0, 2*target_mass, 202)[1:]
+    if dilutant_masses is None:
+        dilutant_masses = np.arange(501.0)
+    sample_masses = np.asarray(sample_masses, dtype=float)
+    dilutant_masses = np.asarray(dilutant_masses, dtype=float)
+
+    # grid of (dilutant, sample mass, dilutant mass)
+    msample = sample_masses[None, :, None]
+    mdilutant = dilutant_masses[None, None, :]
+    steps = np.broadcast_to(msample*sample_step/(1000.0*area),
+                            (len(dilutants), len(sample_masses), len(dilutant_masses)))
+    absorp = (msample*sample_mu + mdilutant*dilutant_mu[:, None, None])/(1000.0*area)
+    valid = absorp <= absorp_max
+    if min_total_mass is not None:
+        valid &= (msample + mdilutant) >= min_total_mass
+
+    score = np.where(valid, abs(steps - edge_step), np.inf).reshape(len(dilutants), -1)
+    absorp = absorp.reshape(len(dilutants), -1)
+    out = []
+    for i, name in enumerate(dilutants):
+        if not np.isfinite(score[i]).any():
+            continue
+        best = np.lexsort((absorp[i], score[i]))[0]
+        isamp, idil = np.unravel_index(best, (len(sample_masses), len(dilutant_masses)))
+        msamp, mdil = sample_masses[isamp], dilutant_masses[idil]
+        out.append(SamplePrep(dilutant=name, sample_mass_mg=float(msamp),
+                              dilutant_mass_mg=float(mdil),
+                              sample_fraction=float(msamp/(msamp+mdil)),
+                              edge_step=float(steps[i, isamp, idil]),
+                              absorp_total=float(absorp[i, best]),
+                              energy=float(energy), area_cm2=area))
+    out.sort(key=lambda p: (abs(p.edge_step - edge_step), p.absorp_total))
+    return out
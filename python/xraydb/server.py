@@ -0,0 +1,368 @@
+"""
+HTTP/JSON service for xraydb calculations
+
+Run with
+    python -m xraydb.server --port 8000
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+import json
+import inspect
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+import numpy as np
+
+from . import xray, materials
+from .version import __version__
+from .coalesce import BATCHED, group_key, evaluate_group
+
+# functions that are not served: no JSON results, or change files
+EXCLUDED = ('get_xraydb', 'ionchamber_flux_stream', 'periodic_table',
+            'get_user_materialsfile', 'add_material', 'add_materials')
+
+# arguments that are converted from lists to ndarrays
+ARRAY_ARGS = ('energy', 'energies', 'k', 'theta', 'volts')
+
+# arguments that can be names of materials, whose current definitions
+# are added to the cache key
+MATERIAL_ARGS = ('name', 'formula', 'stackup', 'substrate', 'coating',
+                 'binder', 'gas')
+
+# functions whose results are not cached: they look up the materials database
+UNCACHED = ('get_material', 'find_material', 'get_materials')
+
+# largest request (in characters of its normalized form) to cache
+MAX_CACHED_REQUEST = 100000
+
+# most requests in one batch
+MAX_BATCH = 1000
+
+
+class RequestError(Exception):
+    "invalid request, with HTTP status"
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def server_functions():
+    """dict of {name: module} for the functions of xray.py and
+    materials.py that are served"""
+    out = {}
+    for mod in (xray, materials):
+        for name, obj in vars(mod).items():
+            if (inspect.isfunction(obj) and not name.startswith('_')
+                    and obj.__module__ == mod.__name__ and name not in EXCLUDED):
+                out[name] = mod
+    return out
+
+
+def _material_definitions(arguments):
+    """current (formula, density) of material names given for MATERIAL_ARGS,
+    for response cache keys: internal use"""
+    out = {}
+    for arg in MATERIAL_ARGS:
+        names = arguments.get(arg, None)
+        if isinstance(names, str):
+            names = [names]
+        if isinstance(names, (list, tuple, dict)):
+            out[arg] = [materials.get_material(name) if isinstance(name, str) else None
+                        for name in names]
+    return out
+
+
+def to_json(value):
+    """convert a result to a value that can be written as JSON:
+    ndarrays to lists, namedtuples to dicts, and numpy scalars to numbers"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, '_asdict'):
+        return {key: to_json(val) for key, val in value._asdict().items()}
+    if isinstance(value, dict):
+        return {str(key): to_json(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_json(val) for val in value]
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+class XrayDBServer(ThreadingHTTPServer):
+    """HTTP server for xraydb calculations, with JSON requests and results
+
+    Args:
+        address (tuple): (host, port) to listen on [('127.0.0.1', 8000)]
+        max_workers (int): most calculations to run at one time [8]
+        cache_size (int): number of results to keep in the response cache [4096]
+        verbose (bool): whether to log each request [False]
+
+    Notes:
+        endpoints are
+
+          GET  /functions          names, signatures and descriptions of functions
+          GET  /stats              numbers of requests, calculations, and cache hits
+          GET  /call/<name>?arg=value&...    call one function
+          POST /call               call one function, with JSON body
+                                   {"function": name, "args": [...], "kwargs": {...}}
+          POST /batch              call many functions, with JSON body
+                                   {"requests": [{"function": ..., "args": ..., "kwargs": ...}, ...]}
+
+        results are returned as {"result": value}, and errors as {"error": message}.
+        For /batch, results are returned as {"results": [...]}, with a result or
+        error for each request.  Lists given for arguments named 'energy',
+        'energies', 'k', 'theta', or 'volts' are converted to arrays, and
+        arrays in results are returned as lists.
+
+        requests are normalized (positional and keyword arguments, and
+        default values) before looking for them in the response cache, and
+        material names are looked up so that results for a redefined user
+        material are not taken from the cache.  Requests in a batch for
+        `mu_elam`, `material_mu`, or `f2_chantler` that differ only in energy
+        are calculated with a single call.  A batch can have at most
+        MAX_BATCH requests, and takes one of the `max_workers` slots for each
+        calculation, as separate requests do.
+
+    Examples:
+        >>> server = XrayDBServer(('127.0.0.1', 8000))
+        >>> server.serve_forever()
+
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 8000), max_workers=8,
+                 cache_size=4096, verbose=False):
+        super().__init__(address, XrayDBRequestHandler)
+        self.functions = server_functions()
+        self.workers = threading.BoundedSemaphore(max_workers)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.verbose = verbose
+        self.stats = {'requests': 0, 'calls': 0, 'cache_hits': 0}
+        self._lock = threading.Lock()
+        xray.get_xraydb()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def normalize(self, request):
+        """(name, args, kwargs, cache key) for a request dict with keys
+        'function', 'args', and 'kwargs'"""
+        if not isinstance(request, dict):
+            raise RequestError('request must be a JSON object')
+        name = request.get('function', None)
+        if name not in self.functions:
+            raise RequestError(f"unknown function '{name}'", status=404)
+        args = request.get('args', [])
+        kwargs = request.get('kwargs', {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise RequestError("'args' must be a list and 'kwargs' an object")
+        func = getattr(self.functions[name], name)
+        try:
+            bound = inspect.signature(func).bind(*args, **kwargs)
+        except TypeError as exc:
+            raise RequestError(f'{name}: {exc}') from None
+        bound.apply_defaults()
+        key = None
+        if name not in UNCACHED:
+            key = json.dumps([name, bound.args, bound.kwargs,
+                              _material_definitions(bound.arguments)], sort_keys=True)
+        for arg in ARRAY_ARGS:
+            val = bound.arguments.get(arg, None)
+            if isinstance(val, list):
+                bound.arguments[arg] = np.asarray(val, dtype=float)
+        return name, bound.args, bound.kwargs, key
+
+    def _cached(self, key):
+        if key is None:
+            return False, None
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return True, self.cache[key]
+        return False, None
+
+    def _store(self, key, result):
+        if key is not None and self.cache_size > 0 and len(key) <= MAX_CACHED_REQUEST:
+            with self._lock:
+                self.cache[key] = result
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+    def call(self, request):
+        "result of a request dict, as a value to be written as JSON"
+        self._count('requests')
+        name, args, kwargs, key = self.normalize(request)
+        found, result = self._cached(key)
+        if found:
+            return result
+        with self.workers:
+            self._count('calls')
+            try:
+                result = to_json(getattr(self.functions[name], name)(*args, **kwargs))
+            except Exception as exc:
+                raise RequestError(f'{name}: {exc}') from None
+        self._store(key, result)
+        return result
+
+    def call_batch(self, requests):
+        """results for a list of request dicts, as a list of
+        {'result': value} or {'error': message}"""
+        if not isinstance(requests, list):
+            raise RequestError("'requests' must be a list")
+        if len(requests) > MAX_BATCH:
+            raise RequestError(f'too many requests in batch: at most {MAX_BATCH}',
+                               status=413)
+        self._count('requests', len(requests))
+        out = [None]*len(requests)
+        groups = {}
+        for i, request in enumerate(requests):
+            try:
+                name, args, kwargs, key = self.normalize(request)
+            except RequestError as exc:
+                out[i] = {'error': str(exc)}
+                continue
+            found, result = self._cached(key)
+            if found:
+                out[i] = {'result': result}
+                continue
+            gkey = None
+            if name in BATCHED:
+                gkey = group_key(name, args, kwargs)
+            if gkey is None:
+                gkey = ('single', i)
+            groups.setdefault(gkey, []).append((i, name, args, kwargs, key))
+
+        for gkey, items in groups.items():
+            with self.workers:
+                self._count('calls')
+                results = None
+                if gkey[0] != 'single' and len(items) > 1:
+                    pos = BATCHED[gkey[0]]
+                    try:
+                        results = evaluate_group(gkey, [args[pos] for _, _, args, _, _ in items])
+                    except Exception:
+                        results = None
+                for j, (i, name, args, kwargs, key) in enumerate(items):
+                    try:
+                        if results is not None:
+                            result = to_json(results[j])
+                        else:
+                            result = to_json(getattr(self.functions[name], name)(*args, **kwargs))
+                    except Exception as exc:
+                        out[i] = {'error': f'{name}: {exc}'}
+                        continue
+                    self._store(key, result)
+                    out[i] = {'result': result}
+        return out
+
+    def describe(self):
+        "dict of {name: {'signature': signature, 'doc': first line of docstring}}"
+        out = {}
+        for name, mod in sorted(self.functions.items()):
+            func = getattr(mod, name)
+            doc = (inspect.getdoc(func) or '').split('\n')[0]
+            out[name] = {'signature': f'{name}{inspect.signature(func)}', 'doc': doc}
+        return out
+
+
+class XrayDBRequestHandler(BaseHTTPRequestHandler):
+    "request handler for XrayDBServer"
+    server_version = f'xraydb/{__version__}'
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, func, *args):
+        try:
+            self._send(200, func(*args))
+        except RequestError as exc:
+            self._send(exc.status, {'error': str(exc)})
+        except Exception as exc:
+            self._send(500, {'error': f'{exc.__class__.__name__}: {exc}'})
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            raise RequestError('request body is not valid JSON') from None
+
+    def do_GET(self):
+        "handle GET requests"
+        url = urlparse(self.path)
+        if url.path == '/functions':
+            self._handle(self.server.describe)
+        elif url.path == '/stats':
+            self._handle(lambda: dict(self.server.stats, cached=len(self.server.cache)))
+        elif url.path.startswith('/call/'):
+            def call():
+                kwargs = {}
+                for key, val in parse_qsl(url.query):
+                    try:
+                        kwargs[key] = json.loads(val)
+                    except ValueError:
+                        kwargs[key] = val
+                return {'result': self.server.call({'function': url.path[6:],
+                                                    'kwargs': kwargs})}
+            self._handle(call)
+        else:
+            self._send(404, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self):
+        "handle POST requests"
+        url = urlparse(self.path)
+        if url.path == '/call':
+            self._handle(lambda: {'result': self.server.call(self._read_json())})
+        elif url.path == '/batch':
+            def batch():
+                data = self._read_json()
+                if isinstance(data, dict):
+                    data = data.get('requests', None)
+                return {'results': self.server.call_batch(data)}
+            self._handle(batch)
+        else:
+            self._send(404, {'error': f'unknown path {url.path}'})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    "run xraydb server"
+    parser = argparse.ArgumentParser(description='HTTP/JSON service for xraydb')
+    parser.add_argument('--host', default='127.0.0.1', help='host to listen on [127.0.0.1]')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on [8000]')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='most calculations to run at one time [8]')
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help='number of results to cache [4096]')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log requests')
+    args = parser.parse_args()
+
+    server = XrayDBServer((args.host, args.port), max_workers=args.workers,
+                          cache_size=args.cache_size, verbose=args.verbose)
+    print(f'xraydb {__version__} serving on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -52,19 +52,51 @@ def elam_spline(xin, yin, yspl_in, xout):
     Returns:
         ndarray: interpolated values
     """
-    x = as_ndarray(xout)
-    lo, hi = [], []
-    for e in x:
-        _elo = np.where(xin < e)[0]
-        _ehi = np.where(xin > e)[0]
-        lo.append(_elo[-1] if len(_elo) > 0 else 0)
-        hi.append(_ehi[0] if len(_ehi) > 0 else len(xin)-1)
+    return spline_eval(spline_brackets(xin, as_ndarray(xout)), yin, yspl_in)
 
+
+def spline_brackets(xin, x):
+    """
+    bracketing indices and weights for evaluating elam_spline at x values,
+    which can be reused for any y and spline values tabulated at xin.
+
+    Parameters:
+        xin (ndarray): x values for interpolation data
+        x (ndarray): x values to be evaluated at
+
+    Returns:
+        tuple of ndarrays: (lo, hi, a, b, ca, cb)
+
+    Notes:
+        lo is the last index with xin < x and hi the first index with xin > x,
+        found with searchsorted on the running minimum (from the end) and
+        maximum of xin, which are xin itself when xin is in order.
+    """
+    xmin = np.minimum.accumulate(xin[::-1])[::-1]
+    xmax = np.maximum.accumulate(xin)
+    lo = np.maximum(np.searchsorted(xmin, x, side='left') - 1, 0)
+    hi = np.minimum(np.searchsorted(xmax, x, side='right'), len(xin)-1)
     diff = xin[hi] - xin[lo]
-    if any(diff <= 0):
+    if np.any(diff <= 0):
         raise ValueError('x must be strictly increasing')
     a = (xin[hi] - x) / diff
     b = (x - xin[lo]) / diff
-    return (a * yin[lo] + b * yin[hi] +
-            (diff*diff/6) * ((a*a - 1) * a * yspl_in[lo] +
-                             (b*b - 1) * b * yspl_in[hi]))
+    scale = diff*diff/6
+    return lo, hi, a, b, scale*(a*a - 1)*a, scale*(b*b - 1)*b
+
+
+def spline_eval(brackets, yin, yspl_in):
+    """
+    evaluate elam_spline with brackets from spline_brackets
+
+    Parameters:
+        brackets (tuple): (lo, hi, a, b, ca, cb) from spline_brackets
+        yin (ndarray): y values for interpolation data
+        yspl_in (ndarray): spline coefficients (second derivatives of y) for
+                       interpolation data
+
+    Returns:
+        ndarray: interpolated values
+    """
+    lo, hi, a, b, ca, cb = brackets
+    return a*yin[lo] + b*yin[hi] + ca*yspl_in[lo] + cb*yspl_in[hi]
@@ -4,14 +4,19 @@ calculations using XrayDB
 Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
 using the MIT license
 """
-from collections import namedtuple
+import os
+import threading
+from functools import lru_cache
+from collections import namedtuple, OrderedDict
 import numpy as np
 
 from .utils import (R_ELECTRON_CM, AVOGADRO, PLANCK_HC,
-                    QCHARGE, SI_PREFIXES, index_nearest)
+                    QCHARGE, SI_PREFIXES)
 
 from .xraydb import XrayDB,  XrayLine
+from .energygrid import EnergyGrid
 from .chemparser import chemparse
+from .diskcache import disk_cached
 
 R0 = 1.e8 * R_ELECTRON_CM
 
@@ -26,6 +31,13 @@ DarwinWidth = namedtuple('DarwinWidth', ('theta', 'theta_offset',
                                          'zeta', 'dtheta', 'denergy',
                                          'intensity', 'rocking_curve'))
 
+XrayLineIndex = namedtuple('XrayLineIndex', ('energy', 'intensity',
+                                             'atomic_number', 'element',
+                                             'line', 'initial_level',
+                                             'final_level', 'edge_energy'))
+
+PeriodicTable = namedtuple('PeriodicTable', ('elements', 'edges', 'lines'))
+
 TransmissionSample = namedtuple('TransmissionSample', ('energy_eV',
                                                        'absorp_total',
                                                        'mass_fractions',
@@ -146,7 +158,16 @@ _edge_energies = {'k': np.array([-1.0, 13.6, 24.6, 54.7, 111.5, 188.0,
                                   3552.0, 3664.0, 3775.0, 3890.0, 4009.0,
                                   4127.0])}
 
+_edge_sorted = {}
+
+_edge_symbols = None
+
+_xray_line_index = None
+
+_periodic_table = None
+
 _xraydb = None
+_xraydb_lock = threading.Lock()
 
 def get_xraydb():
     """return instance of the XrayDB
@@ -158,10 +179,18 @@ def get_xraydb():
         >>> import xraydb
         >>> xdb = xraydb.get_xraydb()
 
+    Notes:
+        the environment variable XRAYDB_MODE can be set to the mode for
+        opening the database file (see `XrayDB`), for example 'immutable'
+        or 'memory' for slow or network-mounted file systems.
+
     """
     global _xraydb
-    if _xraydb is None:
-        _xraydb = XrayDB()
+    if _xraydb is None or _xraydb.pid != os.getpid():
+        with _xraydb_lock:
+            # a new process (as from fork) must not use the parent's connection
+            if _xraydb is None or _xraydb.pid != os.getpid():
+                _xraydb = XrayDB(mode=os.environ.get('XRAYDB_MODE', 'file'))
     return _xraydb
 
 def f0(ion, k):
@@ -229,7 +258,7 @@ def chantler_data(element, energy, column, **kws):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
         column (str): data to return, one of 'f1', 'f2', 'mu_photo',
                      'mu_incoh', 'mu_total'
 
@@ -246,7 +275,7 @@ def f1_chantler(element, energy, **kws):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
 
     Returns:
         float value or ndarray
@@ -265,7 +294,7 @@ def f2_chantler(element, energy):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
 
     Returns:
         float value or ndarray
@@ -284,7 +313,7 @@ def mu_chantler(element, energy, incoh=False, photo=False):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
         incoh (bool): whether to return only the incoherent contribution [False]
         photo (bool): whether to return only the photo-electric contribution [False]
 
@@ -304,7 +333,7 @@ def mu_elam(element, energy, kind='total'):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
         kind (str):  type of cross-section to use, one of ('total',
                      'photo', 'coh', 'incoh') ['total']
 
@@ -326,7 +355,7 @@ def coherent_cross_section_elam(element, energy):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
 
     Returns:
         float value or ndarray
@@ -344,7 +373,7 @@ def incoherent_cross_section_elam(element, energy):
 
     Args:
         element (int, str):  atomic number, atomic symbol for element
-        energy (float or ndarray):   energy or array of energies
+        energy (float, ndarray, or EnergyGrid): energy or array of energies
 
     Returns:
         float value or ndarray
@@ -546,6 +575,197 @@ def xray_line(element, line):
     return lines.get(line.title(), None)
 
 
+def xray_line_index():
+    """index of X-ray emission lines for all elements, sorted by energy
+
+    Returns:
+        XrayLineIndex namedtuple of ndarrays with fields
+        (energy, intensity, atomic_number, element, line, initial_level,
+        final_level, edge_energy), one entry per emission line.
+
+    Notes:
+        1. `line` is the siegbahn notation for the line, and `edge_energy`
+           is the energy of the initial level, or NaN if not available.  For
+           combined initial levels, such as 'M4,5', the energy of the first
+           level is used, as for `xray_line_strengths` and `xrf_lines`, so
+           that these lines are kept by `find_xray_lines` and
+           `nearest_xray_lines` when the first level is excited.
+        2. the index is built once, and shared by `find_xray_lines` and
+           `nearest_xray_lines`.
+
+    """
+    global _xray_line_index
+    if _xray_line_index is None:
+        xdb = get_xraydb()
+        znum = {r.element: int(r.atomic_number) for r in xdb.get_cache('elements')}
+        edges = {(r.element, r.iupac_symbol): r.absorption_edge
+                 for r in xdb.get_cache('xray_levels')}
+        def edge_energy(elem, level):
+            return edges.get((elem, level), edges.get((elem, level.split(',')[0]), np.nan))
+        rows = sorted(xdb.get_cache('xray_transitions'),
+                      key=lambda r: (r.emission_energy, znum[r.element]))
+        _xray_line_index = XrayLineIndex(
+            energy=np.array([r.emission_energy for r in rows], dtype=float),
+            intensity=np.array([r.intensity for r in rows], dtype=float),
+            atomic_number=np.array([znum[r.element] for r in rows], dtype=int),
+            element=np.array([r.element for r in rows]),
+            line=np.array([r.siegbahn_symbol for r in rows]),
+            initial_level=np.array([r.initial_level for r in rows]),
+            final_level=np.array([r.final_level for r in rows]),
+            edge_energy=np.array([edge_energy(r.element, r.initial_level)
+                                  for r in rows], dtype=float))
+    return _xray_line_index
+
+
+def _select_xray_lines(excitation_energy=None, min_intensity=0.0):
+    "subset of xray_line_index(), still sorted by energy: internal use"
+    index = xray_line_index()
+    if excitation_energy is None and min_intensity <= 0:
+        return index
+    keep = index.intensity >= min_intensity
+    if excitation_energy is not None:
+        with np.errstate(invalid='ignore'):
+            keep &= index.edge_energy < excitation_energy
+    return XrayLineIndex(*[field[keep] for field in index])
+
+
+def find_xray_lines(energy_min, energy_max, excitation_energy=None,
+                    min_intensity=0.0):
+    """X-ray emission lines of all elements within an energy range
+
+    Args:
+        energy_min (float or ndarray): lower bound(s) of emission energy (in eV)
+        energy_max (float or ndarray): upper bound(s) of emission energy (in eV)
+        excitation_energy (None or float): limit output to lines that are
+             excited by X-rays of this energy (in eV) [None]
+        min_intensity (float): smallest relative line intensity to include [0]
+
+    Returns:
+        XrayLineIndex namedtuple of ndarrays, sorted by energy, as from
+        `xray_line_index`, or a list of these if `energy_min` and `energy_max`
+        are arrays.
+
+    Examples:
+        >>> lines = xraydb.find_xray_lines(6300, 6500, min_intensity=0.2)
+        >>> for elem, line, en in zip(lines.element, lines.line, lines.energy):
+        ...     print(elem, line, en)
+        ...
+        Sm Lb3 6317.2
+        Fe Ka2 6392.1
+        Fe Ka1 6405.2
+        Eu Lb4 6438.0
+        Eu Lb1 6458.4
+        Dy La1 6498.0
+
+    """
+    index = _select_xray_lines(excitation_energy=excitation_energy,
+                               min_intensity=min_intensity)
+    lo = np.searchsorted(index.energy, energy_min, side='left')
+    hi = np.searchsorted(index.energy, energy_max, side='right')
+    if np.ndim(lo) == 0:
+        return XrayLineIndex(*[field[lo:hi] for field in index])
+    return [XrayLineIndex(*[field[i:j] for field in index])
+            for i, j in zip(lo, hi)]
+
+
+def nearest_xray_lines(energies, excitation_energy=None, min_intensity=0.0):
+    """X-ray emission lines nearest to energies, for all elements
+
+    Args:
+        energies (float or ndarray): emission energies (in eV)
+        excitation_energy (None or float): limit output to lines that are
+             excited by X-rays of this energy (in eV) [None]
+        min_intensity (float): smallest relative line intensity to include [0]
+
+    Returns:
+        XrayLineIndex namedtuple of ndarrays, with one entry for each energy.
+
+    Examples:
+        >>> lines = xraydb.nearest_xray_lines([6404, 8048], excitation_energy=10000)
+        >>> list(zip(lines.element, lines.line))
+        [('Fe', 'Ka1'), ('Cu', 'Ka1')]
+
+    """
+    index = _select_xray_lines(excitation_energy=excitation_energy,
+                               min_intensity=min_intensity)
+    if len(index.energy) == 0:
+        raise ValueError('no X-ray emission lines match the selection')
+    energy = np.atleast_1d(np.asarray(energies, dtype=float))
+    nmax = len(index.energy) - 1
+    ihi = np.searchsorted(index.energy, energy)
+    ilo = np.clip(ihi-1, 0, nmax)
+    ihi = np.clip(ihi, 0, nmax)
+    use_hi = abs(index.energy[ihi] - energy) < abs(energy - index.energy[ilo])
+    inear = np.where(use_hi, ihi, ilo)
+    return XrayLineIndex(*[field[inear] for field in index])
+
+
+def periodic_table():
+    """properties, edges, and emission lines for all elements, as
+    NumPy structured arrays
+
+    Returns:
+        PeriodicTable namedtuple with fields
+
+           `elements`  array with fields (Z, symbol, name, mass, density),
+                       one entry per element
+           `edges`     array with fields (Z, symbol, edge, energy, fyield,
+                       jump_ratio, width), one entry per X-ray level, with
+                       width the core hole width in eV, or NaN if not available
+           `lines`     array with fields (Z, symbol, line, energy, intensity,
+                       initial_level, final_level), one entry per emission line
+
+        each sorted by atomic number.
+
+    Notes:
+        1. the arrays are built once from the full data tables, cached,
+           and are read-only.
+        2. the arrays can be filtered with array operations, for example
+               lines = periodic_table().lines
+               lines[(lines['energy'] > 5000) & (lines['initial_level'] == 'K')]
+
+    Examples:
+        >>> ptab = periodic_table()
+        >>> kedges = ptab.edges[ptab.edges['edge'] == 'K']
+        >>> kedges['symbol'][(kedges['energy'] > 7000) & (kedges['energy'] < 8000)]
+        array(['Fe', 'Co'], dtype='<U3')
+
+    """
+    global _periodic_table
+    if _periodic_table is None:
+        xdb = get_xraydb()
+        elems = sorted(xdb.get_cache('elements'), key=lambda r: r.atomic_number)
+        levels = xdb._index('xray_levels')
+        transitions = xdb._index('xray_transitions')
+
+        elements, edges, lines = [], [], []
+        for row in elems:
+            znum, sym = int(row.atomic_number), row.element.title()
+            elements.append((znum, sym, row.name, row.molar_mass, row.density))
+            widths = xdb.corehole_width(sym)
+            for edge, dat in levels.get(sym, {}).items():
+                edges.append((znum, sym, edge, dat.energy, dat.fyield,
+                              dat.jump_ratio, widths.get(edge, np.nan)))
+            for line, dat in transitions.get(sym, {}).items():
+                lines.append((znum, sym, line, dat.energy, dat.intensity,
+                              dat.initial_level, dat.final_level))
+
+        out = []
+        for data, dtype in ((elements, [('Z', int), ('symbol', 'U3'), ('name', 'U16'),
+                                        ('mass', float), ('density', float)]),
+                            (edges, [('Z', int), ('symbol', 'U3'), ('edge', 'U8'),
+                                     ('energy', float), ('fyield', float),
+                                     ('jump_ratio', float), ('width', float)]),
+                            (lines, [('Z', int), ('symbol', 'U3'), ('line', 'U8'),
+                                     ('energy', float), ('intensity', float),
+                                     ('initial_level', 'U8'), ('final_level', 'U8')])):
+            arr = np.array(data, dtype=dtype)
+            arr.flags.writeable = False
+            out.append(arr)
+        _periodic_table = PeriodicTable(*out)
+    return _periodic_table
+
+
 def fluor_yield(element, edge, line, energy):
     """fluorescence yield for an X-ray emission line or family of lines.
 
@@ -675,6 +895,131 @@ def ionization_potential(gas):
         return 32.0
 
 
+def _edge_table(edge):
+    """array of energies for an edge, indexed by atomic number,
+    with -1000 for missing edges: internal use"""
+    ename = edge.lower()
+    if ename not in _edge_energies:
+        xdb = get_xraydb()
+        znum = {r.element: int(r.atomic_number) for r in xdb.get_cache('elements')}
+        energies = -1000.0*np.ones(1 + max(znum.values()))
+        for row in xdb.get_cache('xray_levels'):
+            if row.iupac_symbol.lower() == ename:
+                energies[znum[row.element]] = row.absorption_edge
+        _edge_energies[ename] = energies
+    return _edge_energies[ename]
+
+
+def _edge_index(edge):
+    """sorted index of (energy, atomic number) for an edge: internal use"""
+    ename = edge.lower()
+    if ename not in _edge_sorted:
+        energies = _edge_table(ename)
+        # stable sort: equal energies stay ordered by atomic number
+        order = np.argsort(energies, kind='stable')
+        _edge_sorted[ename] = (energies[order], order)
+    return _edge_sorted[ename]
+
+
+def _atomic_symbols():
+    """list of atomic symbols indexed by atomic number: internal use"""
+    global _edge_symbols
+    if _edge_symbols is None:
+        rows = get_xraydb().get_cache('elements')
+        symbols = [None]*(1 + max(int(r.atomic_number) for r in rows))
+        for row in rows:
+            symbols[int(row.atomic_number)] = row.element.title()
+        _edge_symbols = symbols
+    return _edge_symbols
+
+
+def _nearest_edge(edge, energy):
+    """atomic number with the nearest energy for an edge, taking the lowest
+    atomic number for ties, as with index_nearest(): internal use"""
+    sorted_en, sorted_z = _edge_index(edge)
+    nmax = len(sorted_en) - 1
+    ihi = int(np.searchsorted(sorted_en, energy))
+    ilo = int(np.searchsorted(sorted_en, sorted_en[max(ihi-1, 0)]))
+    ihi = min(ihi, nmax)
+    dlo, dhi = abs(energy - sorted_en[ilo]), abs(energy - sorted_en[ihi])
+    zlo, zhi = int(sorted_z[ilo]), int(sorted_z[ihi])
+    return zhi if (dhi < dlo or (dhi == dlo and zhi < zlo)) else zlo
+
+
+def _edge_penalty(edge, iz, diff):
+    """weighted difference from an edge energy, used to choose edges: internal use"""
+    if diff < 0: # prefer positive errors
+        diff = -2.0*diff
+    if iz < 10 or iz > 92: # penalize extreme elements
+        diff = 2.0*diff
+    if edge == 'K': # prefer K edge
+        diff = 0.25*diff
+    elif edge in ('L1', 'M5'): # penalize L1 and M5 edges
+        diff = 2.0*diff
+    return diff
+
+
+def guess_edges(energies, edges=('K', 'L3', 'L2', 'L1', 'M5')):
+    """guess elements and edges for an array of energies (in eV)
+
+    Args:
+        energies (float or ndarray) : approximate edge energies (in eV)
+        edges (None or list of strings) : edges to consider
+
+    Returns:
+        a list of tuples of (atomic symbol, edge) for best guess
+        for each energy, with (None, None) if no guess can be made.
+
+    Notes:
+        1. by default, the list of edges is ('K', 'L3', 'L2', 'L1', 'M5')
+        2. this gives the same result as `guess_edge` for each energy,
+           using a sorted index of edge energies for all elements.
+
+    Examples:
+        >>> xraydb.guess_edges([7112, 8979, 11919])
+        [('Fe', 'K'), ('Cu', 'K'), ('Au', 'L3')]
+
+    """
+    energy = np.atleast_1d(np.asarray(energies, dtype=float))
+    diffs = np.zeros((len(edges), len(energy)))
+    znums = np.zeros((len(edges), len(energy)), dtype=int)
+
+    for i, edge in enumerate(edges):
+        table = _edge_table(edge)
+        sorted_en, sorted_z = _edge_index(edge)
+        nmax = len(sorted_en) - 1
+        # nearest edge energy: compare neighbors below and above, taking
+        # the lowest atomic number for ties, as with index_nearest()
+        ihi = np.searchsorted(sorted_en, energy)
+        ilo = np.clip(ihi-1, 0, nmax)
+        ihi = np.clip(ihi, 0, nmax)
+        ilo = np.searchsorted(sorted_en, sorted_en[ilo])
+        dlo = abs(energy - sorted_en[ilo])
+        dhi = abs(energy - sorted_en[ihi])
+        zlo, zhi = sorted_z[ilo], sorted_z[ihi]
+        iz = np.where((dhi < dlo) | ((dhi == dlo) & (zhi < zlo)), zhi, zlo)
+
+        diff = energy - table[iz]
+        diff = np.where(diff < 0, -2.0*diff, diff) # prefer positive errors
+        diff = np.where((iz < 10) | (iz > 92), 2.0*diff, diff) # penalize extreme elements
+        if edge == 'K': # prefer K edge
+            diff = 0.25*diff
+        elif edge in ('L1', 'M5'): # penalize L1 and M5 edges
+            diff = 2.0*diff
+        diffs[i, :] = diff
+        znums[i, :] = iz
+
+    valid = (abs(diffs - diffs.min(axis=0)) < 2) & (znums > 0)
+    ibest = valid.argmax(axis=0)
+    found = valid[ibest, np.arange(len(energy))]
+    zbest = znums[ibest, np.arange(len(energy))]
+    symbols = _atomic_symbols()
+    out = []
+    for iedge, iz, ok in zip(ibest, zbest, found):
+        out.append((symbols[int(iz)], edges[iedge]) if ok else (None, None))
+    return out
+
+
 def guess_edge(energy, edges=('K', 'L3', 'L2', 'L1', 'M5')):
     """guess an element and edge based on energy (in eV)
 
@@ -688,44 +1033,19 @@ def guess_edge(energy, edges=('K', 'L3', 'L2', 'L1', 'M5')):
     Notes:
         by default, the list of edges is ('K', 'L3', 'L2', 'L1', 'M5')
 
+    See Also:
+        `guess_edges` for arrays of energies.
+
     """
-    xdb = get_xraydb()
+    energy = float(energy)
     ret = []
-    min_diff = 1e9
-
     for edge in edges:
-        ename =  edge.lower()
-        # if not already in _edge_energies, look it up and save it now
-
-        if ename not in _edge_energies:
-            energies = [-1000]*150
-            maxz = 0
-            xquery = xdb.tables['xray_levels'].select()
-            for row in xdb.session.execute(xquery).fetchall():
-                ir, elem, edgename, en, eyield, _ = row
-                iz = xdb.atomic_number(elem)
-                maxz = max(iz, maxz)
-                if ename == edgename.lower():
-                    energies[iz] = en
-            _edge_energies[ename] = np.array(energies[:maxz])
-
-        energies = _edge_energies[ename]
-        iz = int(index_nearest(energies, energy))
-        diff = energy - energies[iz]
-        if diff < 0: # prefer positive errors
-            diff = -2.0*diff
-        if iz < 10 or iz > 92: # penalize extreme elements
-            diff = 2.0*diff
-        if edge == 'K': # prefer K edge
-            diff = 0.25*diff
-        elif edge in ('L1', 'M5'): # penalize L1 and M5 edges
-            diff = 2.0*diff
-        min_diff = min(diff, min_diff)
-        ret.append((edge, iz, diff))
-
+        iz = _nearest_edge(edge, energy)
+        ret.append((edge, iz, _edge_penalty(edge, iz, energy - _edge_table(edge)[iz])))
+    min_diff = min(diff for _, _, diff in ret)
     for edge, iz, diff in ret:
         if abs(diff - min_diff) < 2 and iz > 0:
-            return (atomic_symbol(iz), edge)
+            return (_atomic_symbols()[iz], edge)
     return (None, None)
 
 
@@ -752,7 +1072,7 @@ def xray_delta_beta(material, density, energy):
     Args:
        material:   chemical formula  ('Fe2O3', 'CaMg(CO3)2', 'La1.9Sr0.1CuO4')
        density:    material density in g/cm^3
-       energy:     x-ray energy in eV
+       energy:     x-ray energy in eV (float, ndarray, or EnergyGrid)
 
     Returns:
       (delta, beta, atlen)
@@ -770,7 +1090,10 @@ def xray_delta_beta(material, density, energy):
 
     """
 
-    lamb_cm = 1.e-8 * PLANCK_HC / energy # lambda in cm
+    if isinstance(energy, EnergyGrid):
+        lamb_cm = 1.e-8 * PLANCK_HC / energy.values
+    else:
+        lamb_cm = 1.e-8 * PLANCK_HC / energy # lambda in cm
     elements = []
 
     for symbol, number in chemparse(material).items():
@@ -794,6 +1117,24 @@ def xray_delta_beta(material, density, energy):
         beta_total = max(beta_total, 1.e-19)
     return delta, beta_photo, lamb_cm/(4*np.pi*beta_total)
 
+
+def _material_definitions(*argnames):
+    """make a function returning the current definitions of the material
+    names given for the arguments, for disk cache keys: internal use"""
+    def resolve(arguments):
+        from .materials import get_material
+        out = []
+        for argname in argnames:
+            names = arguments[argname]
+            if isinstance(names, str):
+                names = [names]
+            out.append([get_material(name) if isinstance(name, str) else None
+                        for name in names])
+        return out
+    return resolve
+
+
+@disk_cached(min_points=1000, resolve=_material_definitions('formula'))
 def mirror_reflectivity(formula, theta, energy, density=None,
                         roughness=0.0, polarization='s', output='intensity'):
     """mirror reflectivity for a thick, single-layer mirror.
@@ -860,6 +1201,8 @@ def mirror_reflectivity(formula, theta, energy, density=None,
     else:
         raise Exception(f"Unknown output type {output}. Use 'intensity' or 'amplitude'.")
 
+@disk_cached(min_points=1000,
+             resolve=_material_definitions('stackup', 'substrate'))
 def multilayer_reflectivity(stackup, thickness, substrate, theta, energy, n_periods=1,
                                 density=None, substrate_density=None, substrate_rough=0.0,
                                 surface_rough=0.0, polarization='s', output='intensity'):
@@ -990,6 +1333,8 @@ def multilayer_reflectivity(stackup, thickness, substrate, theta, energy, n_peri
         raise Exception(f"Unknown output type {output}. Use 'intensity' or 'amplitude'.")
 
 
+@disk_cached(min_points=1000,
+             resolve=_material_definitions('coating', 'substrate', 'binder'))
 def coated_reflectivity(coating, coating_thick, substrate, theta, energy, coating_dens=None, surface_roughness=0.0,
                         substrate_dens=None, substrate_roughness=0.0, binder=None, binder_thick=None, binder_dens=None,
                         polarization='s', output='intensity'):
@@ -1056,11 +1401,12 @@ def ionchamber_fluxes(gas='nitrogen', volts=1.0, length=100.0, energy=10000.0,
     recorded voltage and current amplifier sensitivity.  See note for details.
 
     Args:
-        gas (string or dict):  name or formula of fill gas (see note 1) ['nitrogen']
-        volts (float):  measured voltage output of current amplifier  [1.0]
+        gas (string, dict, or IonChamberGas):  name or formula of fill gas
+                            (see note 1) ['nitrogen']
+        volts (float or ndarray):  measured voltage output of current amplifier  [1.0]
         length (float): active length of ion chamber in cm [100]
-        energy (float): X-ray energy in eV [10000]
-        sensitivity (float): current amplifier sensitivity [1.e-6]
+        energy (float or ndarray): X-ray energy in eV [10000]
+        sensitivity (float or ndarray): current amplifier sensitivity [1.e-6]
         sensitivity_units (string): units of current amplifier sensitivity
                                     (see note 2 for options) ['A/V']
         with_compton (bool): switch to control the contribution of Compton
@@ -1129,51 +1475,56 @@ def ionchamber_fluxes(gas='nitrogen', volts=1.0, length=100.0, energy=10000.0,
           the number of carries below, `N_carriers` is 2.  To consider the
           current from 1 carrier, for example if using a Frisch grid, use
           `both_carries=False`, which will set `N_carriers` to 1.
+
+       5. `volts`, `energy`, and `sensitivity` can be arrays, which will be
+          broadcast together. Each gas or gas mixture is precompiled once
+          (see `ionchamber_gas`), so that repeated calls need only evaluate
+          the tabulated cross-sections for the elements of the gas.
     """
-    from .materials import material_mu
+    sensitivity = _amplifier_sensitivity(sensitivity, sensitivity_units)
+    energy = np.asarray(energy, dtype=float)
+    volts = np.asarray(volts, dtype=float)
+    scale, frac_photo, frac_incoh, frac_coh, frac_out = _ionchamber_coefs(
+        gas, length, energy, with_compton=with_compton,
+        both_carriers=both_carriers)
+
+    flux_in = volts*sensitivity*scale
+    out = fluxes(incident=flux_in, transmitted=flux_in*frac_out,
+                 photo=flux_in*frac_photo, incoherent=flux_in*frac_incoh,
+                 coherent=flux_in*frac_coh)
+    if np.ndim(flux_in) == 0:
+        out = fluxes(*[float(val) for val in out])
+    return out
 
-    xdb = get_xraydb()
 
+def _amplifier_sensitivity(sensitivity, sensitivity_units='A/V'):
+    "current amplifier sensitivity in A/V: internal use"
     units = sensitivity_units.replace('Volts', 'V').replace('Volt', 'V')
     units = units.replace('Amperes', 'A').replace('Ampere', 'A')
     units = units.replace('Amps', 'A').replace('Amp', 'A')
     units = units.replace('A/V', '')
-    sensitivity *= SI_PREFIXES.get(units, 1)
+    return np.asarray(sensitivity) * SI_PREFIXES.get(units, 1)
 
-    ncarriers = 2 if both_carriers else 1
-    if isinstance(gas, str):
-        gas = {gas: 1.0}
 
-    gas_total = 0.0
-    gas_comps = []
-    for gname, frac in gas.items():
-        ionpot = ionization_potential(gname)
-        if gname == 'N2':
-            gname = 'nitrogen'
-        if gname == 'O2':
-            gname = 'oxygen'
-        gas_total += frac
-        gas_comps.append((gname, frac, ionpot))
+def _ionchamber_coefs(gas, length, energy, with_compton=True, both_carriers=True):
+    """energy-dependent coefficients for ion chamber fluxes: internal use
+
+    Returns:
+        tuple of (scale, photo, incoherent, coherent, transmitted), where
+        incident flux = volts*sensitivity*scale, and the other values are
+        fractions of the incident flux.
+    """
+    ncarriers = 2 if both_carriers else 1
+    gas = ionchamber_gas(gas)
 
     # energy of Compton-scattered electron: mean energy, found from
     # tabulated values of integration over the Klein-Nishina cross-section
     energy_compton = 0   # if no Compton contribution
     if with_compton:     # mean energy of the Compton-scattered electron
-        energy_compton = xdb.compton_energies(energy).electron_mean
+        energy_compton = get_xraydb().compton_energies(energy).electron_mean
 
     # use weighted sums for mu values and ionization potential
-    mu_photo, mu_incoh, mu_total, mu_coh, ion_pot =  0.0, 0.0, 0.0, 0.0, 0.0
-    for gas_name, gas_frac, gas_ion_pot in gas_comps:
-        gasmu_photo = material_mu(gas_name, energy=energy, kind='photo')
-        gasmu_total = material_mu(gas_name, energy=energy, kind='total')
-        gasmu_incoh = material_mu(gas_name, energy=energy, kind='incoh')
-        gasmu_coh   = material_mu(gas_name, energy=energy, kind='coh')
-
-        mu_photo += gasmu_photo * gas_frac/gas_total
-        mu_total += gasmu_total * gas_frac/gas_total
-        mu_incoh += gasmu_incoh * gas_frac/gas_total
-        mu_coh   += gasmu_coh * gas_frac/gas_total
-        ion_pot  += gas_ion_pot * gas_frac/gas_total
+    mu_photo, mu_incoh, mu_coh, mu_total = gas.mu(energy)
 
     atten_total = 1.0 - np.exp(-length*mu_total)
     atten_photo = atten_total*mu_photo/mu_total
@@ -1181,14 +1532,183 @@ def ionchamber_fluxes(gas='nitrogen', volts=1.0, length=100.0, energy=10000.0,
     atten_coh   = atten_total*mu_coh/mu_total
 
     absorbed_energy = ncarriers*(energy*atten_photo + energy_compton*atten_incoh)
-    flux_in    = volts*sensitivity*ion_pot/(QCHARGE*absorbed_energy)
-    flux_photo = flux_in * atten_photo
-    flux_incoh = flux_in * atten_incoh
-    flux_out   = flux_in * (1-atten_total)
-    flux_coh   = flux_in * atten_coh
+    scale = gas.ionization_potential/(QCHARGE*absorbed_energy)
+    return scale, atten_photo, atten_incoh, atten_coh, 1-atten_total
+
 
-    return fluxes(incident=flux_in, transmitted=flux_out,
-                  photo=flux_photo, incoherent=flux_incoh, coherent=flux_coh)
+def ionchamber_flux_stream(chunks, gas='nitrogen', length=100.0,
+                           sensitivity=1.e-6, sensitivity_units='A/V',
+                           with_compton=True, both_carriers=True,
+                           energy_tol=0.5, max_energies=10000):
+    """convert a stream of ion chamber voltages to fluxes, chunk by chunk
+
+    Args:
+        chunks (iterable): chunks of (energy, volts), where each of energy
+                (in eV) and volts can be a float or ndarray, as from a
+                file or socket reader.
+        gas (string, dict, or IonChamberGas):  name or formula of fill gas ['nitrogen']
+        length (float): active length of ion chamber in cm [100]
+        sensitivity (float): current amplifier sensitivity [1.e-6]
+        sensitivity_units (string): units of current amplifier sensitivity ['A/V']
+        with_compton (bool): whether to include Compton scattering [True]
+        both_carriers (bool): whether to count both electron and ion current [True]
+        energy_tol (float): energy tolerance (in eV) for reusing coefficients [0.5]
+        max_energies (int): maximum number of energies to cache coefficients for [10000]
+
+    Yields:
+        named tuple IonchamberFluxes for each chunk, as from `ionchamber_fluxes`.
+
+    Notes:
+        1. the energy-dependent coefficients are calculated at energies rounded
+           to multiples of `energy_tol`, and cached, so that they are only
+           recalculated when the energy changes by more than `energy_tol`.
+        2. the cache holds at most `max_energies` energies, dropping the
+           least recently used, so memory use does not grow with the stream.
+
+    Examples:
+        >>> def reader(fname, size=10000):
+        ...     data = np.loadtxt(fname)
+        ...     for i in range(0, len(data), size):
+        ...         yield data[i:i+size, 0], data[i:i+size, 1]
+        ...
+        >>> for fl in ionchamber_flux_stream(reader('i0.dat'), gas='nitrogen', length=10):
+        ...     print(fl.incident.mean())
+
+    """
+    sensitivity = _amplifier_sensitivity(sensitivity, sensitivity_units)
+    gas = ionchamber_gas(gas)
+    cache = OrderedDict()
+    for energy, volts in chunks:
+        energy = np.asarray(energy, dtype=float)
+        volts = np.asarray(volts, dtype=float)
+        keys, inverse = np.unique(np.round(energy/energy_tol).astype(np.int64),
+                                  return_inverse=True)
+        new = [k for k in keys if k not in cache]
+        if len(new) > 0:
+            coefs = _ionchamber_coefs(gas, length, energy_tol*np.array(new, dtype=float),
+                                      with_compton=with_compton,
+                                      both_carriers=both_carriers)
+            for i, key in enumerate(new):
+                cache[key] = [c[i] for c in coefs]
+        for key in keys:
+            cache.move_to_end(key)
+        while len(cache) > max(max_energies, len(keys)):
+            cache.popitem(last=False)
+
+        coefs = np.array([cache[k] for k in keys])[inverse.reshape(energy.shape)]
+        flux_in = volts*sensitivity*coefs[..., 0]
+        yield fluxes(incident=flux_in, transmitted=flux_in*coefs[..., 4],
+                     photo=flux_in*coefs[..., 1], incoherent=flux_in*coefs[..., 2],
+                     coherent=flux_in*coefs[..., 3])
+
+
+@lru_cache(maxsize=256)
+def _element_weights(formula, density):
+    """element names and density-weighted mass fractions for a formula and
+    density, so that mu (in 1/cm) = sum(weight*cross_section): internal use"""
+    comps = chemparse(formula)
+    mass_tot = sum(n*atomic_mass(el) for el, n in comps.items())
+    elements = tuple(comps.keys())
+    weights = np.array([density*comps[el]*atomic_mass(el)/mass_tot
+                        for el in elements])
+    weights.flags.writeable = False
+    return elements, weights
+
+
+def _gas_formula_density(gas):
+    """formula and density for the name or formula of a gas: internal use"""
+    from .materials import _material_formula_density
+    return _material_formula_density({'N2': 'nitrogen', 'O2': 'oxygen'}.get(gas, gas))
+
+
+class IonChamberGas:
+    """Gas, mixture of gases, or diode material for ion chambers,
+    precompiled for repeated calculations of absorption coefficients.
+
+    Args:
+        gas (string or dict):  name or formula of fill gas, or dict with
+                keys of gas names or formulas and values of relative
+                fractions, as for `ionchamber_fluxes`.
+
+    Notes:
+        1. The formulas, densities and ionization potentials for each
+           gas are looked up once, and combined into weights for each element,
+           so that mu values for the mixture are weighted sums of the
+           Elam cross-sections for the elements.
+        2. use `ionchamber_gas` to get a cached instance.
+    """
+    def __init__(self, gas='nitrogen'):
+        if isinstance(gas, str):
+            gas = {gas: 1.0}
+        self.gas = dict(gas)
+
+        gas_total = sum(gas.values())
+        weights = {}
+        self.ionization_potential = 0.0
+        for gname, frac in gas.items():
+            self.ionization_potential += ionization_potential(gname) * frac/gas_total
+            for elem, wt in zip(*_element_weights(*_gas_formula_density(gname))):
+                weights[elem] = weights.get(elem, 0.0) + wt*frac/gas_total
+        self.elements = list(weights.keys())
+        self.weights = np.array([weights[e] for e in self.elements])
+
+    def mu(self, energy):
+        """absorption coefficients (in 1/cm) for the gas
+
+        Args:
+            energy (float or ndarray): X-ray energy in eV
+
+        Returns:
+            tuple of (photo, incoherent, coherent, total) absorption coefficients
+        """
+        xdb = get_xraydb()
+        shape = np.shape(energy)
+        en = np.ravel(np.asarray(energy, dtype=float))
+        mu_photo, mu_incoh, mu_coh = 0.0, 0.0, 0.0
+        for elem, weight in zip(self.elements, self.weights):
+            mu_photo = mu_photo + weight*xdb.cross_section_elam(elem, en, kind='photo')
+            mu_incoh = mu_incoh + weight*xdb.cross_section_elam(elem, en, kind='incoh')
+            mu_coh   = mu_coh + weight*xdb.cross_section_elam(elem, en, kind='coh')
+        out = [mu_photo, mu_incoh, mu_coh, mu_photo + mu_incoh + mu_coh]
+        if len(shape) == 0:
+            return tuple(float(mu[0]) for mu in out)
+        return tuple(mu.reshape(shape) for mu in out)
+
+
+def ionchamber_gas(gas='nitrogen'):
+    """precompiled gas or mixture of gases for ion chamber calculations
+
+    Args:
+        gas (string or dict):  name or formula of fill gas, or dict with
+                keys of gas names or formulas and values of relative
+                fractions, as for `ionchamber_fluxes`.
+
+    Returns:
+        IonChamberGas instance, cached for each gas or mixture.
+
+    Notes:
+        the most recently used instances are cached, keyed by the current
+        formula and density of each gas, so that a redefined material is
+        not taken from the cache.
+
+    Examples:
+        >>> n2_he = ionchamber_gas({'nitrogen': 0.5, 'helium': 0.5})
+        >>> fl = ionchamber_fluxes(gas=n2_he, volts=[1.0, 1.1, 1.2], energy=10000)
+
+    """
+    if isinstance(gas, IonChamberGas):
+        return gas
+    if isinstance(gas, str):
+        gas = {gas: 1.0}
+    return _ionchamber_gas(tuple(sorted((gname, *_gas_formula_density(gname), frac)
+                                        for gname, frac in gas.items())))
+
+
+@lru_cache(maxsize=128)
+def _ionchamber_gas(key):
+    """IonChamberGas for a tuple of (name, formula, density, fraction)
+    for each gas: internal use"""
+    return IonChamberGas({gname: frac for gname, _, _, frac in key})
 
 
 def dynamical_theta_offset(energy, crystal='Si', hkl=(1, 1, 1), a=None,
@@ -1545,44 +2065,132 @@ def transmission_sample(sample, energy, absorp_total=2.6, area=1,
 
         Output same as previous example.
     """
+    return transmission_samples([sample], energy, absorp_total=absorp_total,
+                                area=area, density=density, frac_type=frac_type)[0]
+
+
+def _sample_mass_fracs(sample, frac_type='mass'):
+    "mass fractions for a sample for transmission_sample: internal use"
     if type(sample) is str:
         sample = formula_to_mass_fracs(sample)
     if type(sample) is dict:
         if frac_type == 'mass':
-            sample = _validate_mass_fracs(sample)
+            sample = _validate_mass_fracs(dict(sample))
         elif frac_type == 'molar':
             sample = formula_to_mass_fracs(sample)
         else:
             raise RuntimeError('`frac_type` must be `mass` or `molar`')
-    mu_tot = sum([mu_elam(k, energy) * v for k, v in sample.items()])
-    rho_d = absorp_total / mu_tot
-
-    absorbance_steps = {}
-    pre_edge = np.linspace(energy - 200, energy - 60, 100)
-    for el in sample.keys():
-        coeffs = np.polyfit(pre_edge, mu_elam(el, pre_edge), 3)
-        extrapolated = sum([c * energy ** (len(coeffs) - 1 - i) \
-                            for i, c in enumerate(coeffs)])
-        post_edge = mu_elam(el, energy)
-        absorbance_steps[el] = (post_edge - extrapolated) * sample[el] * rho_d
-
-    mass_total = None
-    mass_components_mg = None
-    thickness_mm = None
-    absorption_length_um = None
-
-    if area:
-        mass_total = rho_d * area * 1000 # mg
-        mass_components_mg = {k: v * mass_total for k, v in sample.items()}
-        if density:
-            thickness_mm = mass_total / (area * 100) / density
-            absorption_length_um = 1 / density / mu_tot * 1e4
-
-    return TransmissionSample(
-                            energy_eV=energy,
-                            absorp_total=absorp_total,
-                            mass_fractions=sample,
-                            molar_fractions=mass_fracs_to_molar_fracs(sample),
+    return sample
+
+
+def transmission_samples(samples, energy, absorp_total=2.6, area=1,
+                         density=None, frac_type='mass'):
+    """Analyze many transmission mode samples and energies at once, as with
+    `transmission_sample`.
+
+    Args:
+        samples (list): list of samples, each a str or dict of elements/compounds
+                        and their fractions, as for `transmission_sample`.
+        energy (float or ndarray): X-ray energy (eV) at which transmission will
+                        be analyzed for each sample.
+        absorp_total (float or ndarray): total absorption (mu_t*d) of each sample [2.6]
+        area (float or ndarray)(optional): area (cm^2) of each sample [1]
+        density (None, float, or list)(optional): density (g/cm^3) of each sample
+        frac_type (str)(optional): `mass` or `molar`, as for `transmission_sample`
+
+    Returns:
+        list of TransmissionSample named tuples, as from `transmission_sample`.
+        Each argument can be given as a single value or as a sequence, with all
+        sequences having the same length.
+
+    Notes:
+        1. mass fractions and molar fractions are calculated once for each
+           distinct sample.
+        2. the pre-edge grids (from -200 to -60 eV of each energy) are the same
+           relative to each energy, so mu_elam is called once per element for
+           all energies, and all cubic pre-edge fits are done with a single
+           least-squares solution.
+
+    Examples:
+        >>> dilutions = [{'Fe2O3': x, 'BN': -1} for x in (0.01, 0.02, 0.05, 0.1)]
+        >>> out = transmission_samples(dilutions, 7162, area=1.33)
+        >>> [r.absorbance_steps['Fe'] for r in out]
+        [0.6242452604591796, 0.9803051840220408, 1.490348259301827, 1.803051544509574]
+
+    """
+    if isinstance(samples, (str, dict)):
+        samples = [samples]
+    samples = list(samples)
+    args = {'energy': energy, 'absorp_total': absorp_total,
+            'area': area, 'density': density}
+    nrows = max([len(samples)] + [len(v) for v in args.values() if np.ndim(v) > 0])
+    for name, val in list(args.items()) + [('samples', samples)]:
+        if np.ndim(val) == 0:
+            args[name] = [val]*nrows
+        elif len(val) == 1:
+            args[name] = list(val)*nrows
+        elif len(val) == nrows:
+            args[name] = list(val)
+        else:
+            raise ValueError(f'`{name}` must have length 1 or {nrows}')
+    samples = args.pop('samples')
+
+    # mass and molar fractions for each distinct sample
+    fracs = {}
+    keys = []
+    for sample in samples:
+        key = sample if isinstance(sample, str) else tuple(sample.items())
+        if key not in fracs:
+            mass_fracs = _sample_mass_fracs(sample, frac_type=frac_type)
+            fracs[key] = (mass_fracs, mass_fracs_to_molar_fracs(mass_fracs))
+        keys.append(key)
+
+    elements = []
+    for mass_fracs, _ in fracs.values():
+        elements.extend([el for el in mass_fracs if el not in elements])
+    frac_array = np.array([[fracs[key][0].get(el, 0.0) for el in elements]
+                           for key in keys])
+
+    # mu at each energy and on pre-edge grids, relative to each energy
+    energies = np.array(args['energy'], dtype=float)
+    uenergy, uindex = np.unique(energies, return_inverse=True)
+    grid = np.linspace(-200, -60, 100)
+    points = (uenergy[:, None] + np.concatenate((grid, [0]))[None, :]).ravel()
+    mu = np.array([mu_elam(el, points) for el in elements])
+    mu = mu.reshape(len(elements), len(uenergy), len(grid)+1)
+
+    # cubic fits to all pre-edges, extrapolated to relative energy = 0
+    coefs = np.linalg.lstsq(np.vander(grid/100.0, 4),
+                            mu[:, :, :-1].reshape(-1, len(grid)).T, rcond=None)[0]
+    mu_post = mu[:, :, -1]
+    mu_steps = mu_post - coefs[-1].reshape(mu_post.shape)
+
+    mu_tot = (frac_array*mu_post[:, uindex].T).sum(axis=1)
+    rho_d = np.array(args['absorp_total'], dtype=float)/mu_tot
+    steps = mu_steps[:, uindex].T * frac_array * rho_d[:, None]
+
+    out = []
+    for irow, key in enumerate(keys):
+        sample, molar_fracs = fracs[key]
+        area, density = args['area'][irow], args['density'][irow]
+        absorbance_steps = {el: steps[irow, elements.index(el)] for el in sample}
+
+        mass_total = None
+        mass_components_mg = None
+        thickness_mm = None
+        absorption_length_um = None
+        if area:
+            mass_total = rho_d[irow] * area * 1000 # mg
+            mass_components_mg = {k: v * mass_total for k, v in sample.items()}
+            if density:
+                thickness_mm = mass_total / (area * 100) / density
+                absorption_length_um = 1 / density / mu_tot[irow] * 1e4
+
+        out.append(TransmissionSample(
+                            energy_eV=args['energy'][irow],
+                            absorp_total=args['absorp_total'][irow],
+                            mass_fractions=dict(sample),
+                            molar_fractions=dict(molar_fracs),
                             absorbance_steps=absorbance_steps,
                             area_cm2=area,
                             mass_total_mg=mass_total,
@@ -1590,7 +2198,8 @@ def transmission_sample(sample, energy, absorp_total=2.6, area=1,
                             density=density,
                             thickness_mm=thickness_mm,
                             absorption_length_um=absorption_length_um
-                            )
+                            ))
+    return out
 
 
 def formula_to_mass_fracs(formula):
@@ -11,16 +11,24 @@ using the MIT license
 
 import os
 import json
+import hashlib
 import atexit
+import threading
 from warnings import warn
 from collections import namedtuple
 import numpy as np
 from scipy.interpolate import UnivariateSpline
 
+import sqlite3
+from importlib import resources
+from urllib.request import pathname2url
+
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from .utils import elam_spline, as_ndarray
+from .energygrid import EnergyGrid, ELAM_EMIN, ELAM_EMAX, CHANTLER_EMAX
 from .version import __version__
 
 XrayEdge = namedtuple('XrayEdge', ('energy', 'fyield', 'jump_ratio'))
@@ -32,15 +40,137 @@ ElementData = namedtuple('ElementData',
 ComptonEnergies = namedtuple('ComptonEnergies',
                    ('incident', 'xray_90deg', 'xray_mean', 'electron_mean'))
 
-def make_engine(dbname):
-    "create engine for sqlite connection, perhaps trying a few sqlachemy variants"
-    return sqlalchemy.create_engine(f'sqlite:///{dbname}')
+OPEN_MODES = ('file', 'readonly', 'immutable', 'memory')
+
+# memory-mapped I/O size for read-only modes
+MMAP_SIZE = 256*1024*1024
+
+def make_engine(dbname, mode='file'):
+    """create engine for sqlite connection
+
+    Args:
+        dbname (string): name of sqlite file
+        mode (string): how to open the file, one of
+                'file':       normal read/write access to the file ['file']
+                'readonly':   read-only access, with memory-mapped I/O
+                'immutable':  read-only access, with memory-mapped I/O, and with
+                              no file locking or checks for changes to the file
+                'memory':     copy the whole database into memory when opened
+
+    Returns:
+        sqlalchemy Engine
+
+    Notes:
+        'immutable' mode must only be used for files that will not change
+        while open, such as the bundled xraydb.sqlite. It avoids file locking
+        and change detection, which can be slow for network file systems.
+    """
+    if mode == 'file':
+        return sqlalchemy.create_engine(f'sqlite:///{dbname}')
+    if mode not in OPEN_MODES:
+        raise ValueError(f"unknown open mode '{mode}': use one of {OPEN_MODES}")
+
+    uri = f'file:{pathname2url(os.path.abspath(dbname))}?mode=ro'
+    if mode == 'immutable':
+        uri = f'{uri}&immutable=1'
+
+    def connect_readonly():
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        conn.execute('PRAGMA query_only=1')
+        return conn
+
+    if mode in ('readonly', 'immutable'):
+        return sqlalchemy.create_engine('sqlite://', creator=connect_readonly)
+
+    def connect_memory():
+        source = connect_readonly()
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        conn.execute('PRAGMA query_only=1')
+        return conn
+
+    # a single shared connection, as each connection to ':memory:'
+    # would be a separate, empty database
+    return sqlalchemy.create_engine('sqlite://', creator=connect_memory,
+                                    poolclass=StaticPool)
+
+def connect_resource(name='xraydb.sqlite'):
+    """in-memory sqlite connection to a database file bundled with xraydb,
+    read with importlib.resources
+
+    Args:
+        name (string): name of database file in the xraydb package ['xraydb.sqlite']
+
+    Returns:
+        tuple of (sqlite3.Connection, string) for the connection and
+        a description of where the file was read from.
+
+    Notes:
+        1. this works when xraydb is imported from a zip file, such as a
+           zipapp, wheel or frozen application, without extracting files.
+        2. with Python 3.11 and higher, the file contents are deserialized
+           directly into memory.  With Python 3.10, the file is extracted
+           to a temporary file (if needed) and copied into memory.
+    """
+    resource = resources.files(__package__).joinpath(name)
+    if not resource.is_file():
+        raise IOError(f"Database '{name}' not found in package resources")
+    conn = sqlite3.connect(':memory:', check_same_thread=False)
+    if hasattr(conn, 'deserialize'):
+        conn.deserialize(resource.read_bytes())
+    else:
+        with resources.as_file(resource) as path:
+            source = sqlite3.connect(str(path))
+            try:
+                source.backup(conn)
+            finally:
+                source.close()
+    conn.execute('PRAGMA query_only=1')
+    return conn, str(resource)
+
+
+# tables required for a valid XrayDB file
+XRAYDB_TABLES = ('Chantler', 'Waasmaier', 'Coster_Kronig',
+                 'KeskiRahkonen_Krause', 'xray_levels', 'elements',
+                 'photoabsorption', 'scattering')
+
+# memoized results of isxrayDB: {(path, mtime, size, check_hash): bool}
+_validated = {}
+
+def content_hash(conn):
+    """SHA-256 hash of the contents of all tables except Version
+
+    Args:
+        conn (sqlite3.Connection): connection to database
 
-def isxrayDB(dbname):
+    Returns:
+        string: hex digest
+
+    Notes:
+        this must match add_content_hash() in data_sources/create_db.py
+    """
+    hasher = hashlib.sha256()
+    query = "select name from sqlite_master where type='table' order by name"
+    for (name,) in conn.execute(query).fetchall():
+        if name == 'Version' or name.startswith('sqlite_'):
+            continue
+        hasher.update(name.encode('utf-8'))
+        for row in conn.execute(f'select * from "{name}" order by rowid'):
+            hasher.update(repr(row).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def isxrayDB(dbname, check_hash=False):
     """whether a file is a valid XrayDB database
 
     Args:
         dbname (string): name of XrayDB file
+        check_hash (bool): whether to also compare the contents to the
+                 content hash stored in the Version table [False]
 
     Returns:
         bool: is file a valid XrayDB
@@ -49,26 +179,49 @@ def isxrayDB(dbname):
       1. must be a sqlite db file, with tables named 'elements',
         'photoabsorption', 'scattering', 'xray_levels', 'Coster_Kronig',
         'Chantler', 'Waasmaier', and 'KeskiRahkonen_Krause'
+      2. files without a stored content hash pass the hash check.
+      3. results are remembered for each file path, modification time,
+         and size, so that repeated checks of an unchanged file are free.
     """
-    _tables = ('Chantler', 'Waasmaier', 'Coster_Kronig',
-               'KeskiRahkonen_Krause', 'xray_levels', 'elements',
-               'photoabsorption', 'scattering')
+    try:
+        stat = os.stat(dbname)
+    except OSError:
+        return False
+    key = (os.path.abspath(dbname), stat.st_mtime_ns, stat.st_size, check_hash)
+    if key in _validated:
+        return _validated[key]
+
     result = False
-    engine = None
+    conn = None
     try:
-        engine = make_engine(dbname)
-        meta = sqlalchemy.MetaData()
-        with engine.connect() as conn:
-            meta.reflect(conn)
-        result = all(t in meta.tables for t in _tables)
+        uri = f'file:{pathname2url(os.path.abspath(dbname))}?mode=ro'
+        conn = sqlite3.connect(uri, uri=True)
+        result = _is_xraydb_connection(conn, check_hash=check_hash)
     except Exception:
-        pass
+        result = False
     finally:
-        if engine is not None:
-            engine.dispose()
+        if conn is not None:
+            conn.close()
+    _validated[key] = result
     return result
 
 
+def _is_xraydb_connection(conn, check_hash=False):
+    "whether an open sqlite3 connection holds a valid XrayDB: internal use"
+    query = "select name from sqlite_master where type='table'"
+    names = {row[0] for row in conn.execute(query).fetchall()}
+    if not all(t in names for t in XRAYDB_TABLES):
+        return False
+    if check_hash:
+        cols = [row[1] for row in conn.execute('PRAGMA table_info(Version)')]
+        if 'content_hash' in cols:
+            rows = conn.execute('select content_hash from Version where '
+                                'content_hash is not null order by date').fetchall()
+            if len(rows) > 0:
+                return rows[-1][0] == content_hash(conn)
+    return True
+
+
 class XrayDB():
     """
     Database of Atomic and X-ray Data
@@ -80,21 +233,57 @@ class XrayDB():
     of Elam, Ravel, and Sieber, with additional data from Chantler,
     and other sources. See the documention and bibliography for
     a complete listing.
+
+    Args:
+        dbname (string): name of database file ['xraydb.sqlite']
+        read_only (bool): whether to prevent writes with the session [True]
+        mode (string): how to open the file, 'file', 'readonly', 'immutable',
+                       or 'memory', see `make_engine` ['file']
+        check_hash (bool): whether to check the content hash of the
+                       file, see `isxrayDB` [False]
+
+    Notes:
+        if `dbname` is not found as a file, it is read from the resources of
+        the xraydb package into memory, see `connect_resource`.  This allows
+        xraydb to be used from a zipapp, wheel, or frozen application.
     """
 
-    def __init__(self, dbname='xraydb.sqlite', read_only=True):
+    def __init__(self, dbname='xraydb.sqlite', read_only=True, mode='file',
+                 check_hash=False):
         "connect to an existing database"
+        rconn = None
         if not os.path.exists(dbname):
             parent, _ = os.path.split(__file__)
-            dbname = os.path.join(parent, dbname)
-            if not os.path.exists(dbname):
-                raise IOError(f"Database '{dbname}' not found!")
-
-        if not isxrayDB(dbname):
+            if os.path.exists(os.path.join(parent, dbname)):
+                dbname = os.path.join(parent, dbname)
+            else:
+                # not a file on disk: look in the package, as for a zip file
+                try:
+                    rconn, dbname = connect_resource(dbname)
+                except Exception:
+                    raise IOError(f"Database '{dbname}' not found!") from None
+
+        if rconn is None:
+            valid = isxrayDB(dbname, check_hash=check_hash)
+        else:
+            valid = _is_xraydb_connection(rconn, check_hash=check_hash)
+        if not valid:
             raise ValueError(f"'{dbname}' is not a valid X-ray Database file!")
         self._cache = {}
-        self.dbname = os.path.abspath(dbname)
-        self.engine = make_engine(dbname)
+        self._decoded = {}
+        self._indexes = {}
+        # the session is shared, so queries from different threads take turns
+        self._lock = threading.RLock()
+        self.pid = os.getpid()
+        if rconn is None:
+            self.dbname = os.path.abspath(dbname)
+            self.mode = mode
+            self.engine = make_engine(dbname, mode=mode)
+        else:
+            self.dbname = dbname
+            self.mode = 'memory'
+            self.engine = sqlalchemy.create_engine('sqlite://', creator=lambda: rconn,
+                                                   poolclass=StaticPool)
         self.conn = self.engine.connect()
         kwargs = {}
         if read_only:
@@ -113,48 +302,93 @@ class XrayDB():
         self.tables = self.metadata.tables
 
         elems = self.get_cache('elements')
-        self.__atomic_symbols = [e.element for e in elems]
-        self.__atomic_names = [e.name for e in elems]
+        self.__elem_index = {}
+        for row in elems:
+            edat = ElementData(int(row.atomic_number), row.element.title(),
+                               row.name, row.molar_mass, row.density)
+            for key in (edat.Z, edat.symbol, row.name.lower()):
+                self.__elem_index[key] = edat
         atexit.register(self.close)
 
     def close(self):
         "close session"
-        self.engine.dispose()
-        self.session.flush()
-        self.session.close()
+        with self._lock:
+            self.session.flush()
+            self.session.close()
+            self.conn.close()
+            self.engine.dispose()
 
     def query(self, *args, **kws):
         "generic query"
         return self.session.query(*args, **kws)
 
     def get_cache(self, tablename, column=None, value=None):
-        """for some tables, we will just cache all the data"""
+        """for some tables, we will just cache all the data,
+        for others, cache the rows matching a value of a column"""
         if column is None:
             if tablename in self._cache:
                 rows = self._cache[tablename]
             else:
                 q = self.tables[tablename].select()
-                rows = self.session.execute(q).fetchall()
+                with self._lock:
+                    rows = self.session.execute(q).fetchall()
                 self._cache[tablename] = rows
-                # print("cached ", tablename)
         else:
-            if tablename in self._cache:
-                data = self._cache[tablename]
-            else:
-                data = self._cache[tablename] = {}
-
-            key = f"{column:s}_{repr(value)}"
-            if key not in data:
+            data = self._cache.setdefault((tablename, column), {})
+            if value not in data:
                 tab = self.tables[tablename]
                 col = getattr(tab.c, column, None)
                 if col is None:
-                    raise ValueError(f"now column {column} for table {tablename}")
-                data[key] = self.query(tab).filter(col==value).all()
-                # print("cached ", tablename, key)
-            if key in data:
-                rows = data[key]
+                    raise ValueError(f"no column {column} for table {tablename}")
+                with self._lock:
+                    data[value] = self.query(tab).filter(col==value).all()
+            rows = data[value]
         return rows
 
+    def _version_id(self):
+        "id of the latest database version: internal use"
+        rows = sorted(self.get_cache('Version'), key=lambda r: r.date)
+        return rows[-1].id
+
+    def _index(self, tablename):
+        """dict index for small tables of levels, transitions, Coster-Kronig
+        probabilities and core-level widths, built once from the whole table:
+        internal use
+
+        Returns:
+            for 'xray_levels':   {element: {edge: XrayEdge}}
+            for 'xray_transitions': {element: {line: XrayLine}}, and
+                                 {(element, initial_level): {line: XrayLine}}
+            for 'Coster_Kronig': {(element, initial, final): (probability, total)}
+            for 'corelevel_widths' or 'KeskiRahkonen_Krause': {element: {edge: width}}
+        """
+        if tablename in self._indexes:
+            return self._indexes[tablename]
+        index = {}
+        rows = self.get_cache(tablename)
+        if tablename == 'xray_levels':
+            for r in rows:
+                index.setdefault(r.element, {})[str(r.iupac_symbol)] = XrayEdge(
+                    r.absorption_edge, r.fluorescence_yield, r.jump_ratio)
+        elif tablename == 'xray_transitions':
+            for r in rows:
+                line = XrayLine(r.emission_energy, r.intensity,
+                                r.initial_level, r.final_level)
+                index.setdefault(r.element, {})[str(r.siegbahn_symbol)] = line
+                key = (r.element, r.initial_level)
+                index.setdefault(key, {})[str(r.siegbahn_symbol)] = line
+        elif tablename == 'Coster_Kronig':
+            for r in rows:
+                key = (r.element, r.initial_level, r.final_level)
+                if key not in index:
+                    index[key] = (r.transition_probability,
+                                  r.total_transition_probability)
+        else:
+            for r in rows:
+                index.setdefault(r.element, {})[r.edge] = r.width
+        self._indexes[tablename] = index
+        return index
+
 
     def get_version(self, long=False, with_history=False):
         """
@@ -263,30 +497,40 @@ class XrayDB():
 
         Parameters:
             element (string or int): atomic number or symbol.
-            eneregy (float or ndarray):
+            eneregy (float, ndarray, or EnergyGrid):
         columns: f1, f2, mu_photo, mu_incoh, mu_total
 
         Notes:
            this function is meant for internal use.
         """
         elem = self.symbol(element)
-        energy = as_ndarray(energy)
-        if max(energy) > 1.e6:
-            warn('Chantler tables are unreliable for energies > 1 MeV')
-            energy[np.where(energy > 1.e6)] = 1.e6
-        emin, emax = min(energy), max(energy)
-
-        row = self.get_cache('Chantler', column='element', value=elem)[0]
+        grid = energy if isinstance(energy, EnergyGrid) else None
+        if grid is not None:
+            if grid.chantler_above.any():
+                warn('Chantler tables are unreliable for energies > 1 MeV')
+            emin, emax = grid.chantler_range
+        else:
+            energy = as_ndarray(energy)
+            if max(energy) > CHANTLER_EMAX:
+                warn('Chantler tables are unreliable for energies > 1 MeV')
+                energy[np.where(energy > CHANTLER_EMAX)] = CHANTLER_EMAX
+            emin, emax = min(energy), max(energy)
 
-        te = np.array(json.loads(row.energy))
+        te = self._chantler_column(elem, 'energy')
         nemin = max(0, -3 + max(np.where(te <= emin)[0]))
         nemax = min(len(te), 3 + max(np.where(te <= emax)[0]))
 
         te = te[nemin:nemax+1]
         if column == 'mu':
             column = 'mu_total'
-        ty = np.array(json.loads(getattr(row, column)))[nemin:nemax+1]
-        ty[np.where(abs(ty) < 1.e-99)] =  1.e-99
+        ty = self._chantler_column(elem, column)[nemin:nemax+1]
+        ty = np.where(abs(ty) < 1.e-99, 1.e-99, ty)
+        if grid is not None:
+            if column == 'f1':
+                out = grid.chantler_spline((elem, 'f1', smoothing), te, ty, smoothing)
+            else:
+                out = grid.loglog_interp((elem, 'chantler'), te, ty)
+            return grid.shaped(out)
         if column == 'f1':
             out = UnivariateSpline(te, ty, s=smoothing)(energy)
         else:
@@ -317,11 +561,7 @@ class XrayDB():
             returns 2 energies below emin and above emax to better
             enable interpolation
         """
-        ctab = self.tables['Chantler']
-        elem = self.symbol(element)
-        row = self.query(ctab).filter(ctab.c.element == elem).one()
-        te = np.array(json.loads(row.energy))
-
+        te = self._chantler_column(self.symbol(element), 'energy')
         if emin <= min(te):
             nemin = 0
         else:
@@ -330,7 +570,18 @@ class XrayDB():
             nemax = len(te)
         else:
             nemax = min(len(te), 2 + max(np.where(te <= emax)[0]))
-        return te[nemin:nemax+1]
+        return te[nemin:nemax+1].copy()
+
+    def _chantler_column(self, elem, column):
+        """decoded array for a column of the Chantler table for an
+        element symbol: internal use"""
+        key = (elem, 'chantler', column)
+        if key not in self._decoded:
+            rows = self.get_cache('Chantler', column='element', value=elem)
+            if len(rows) == 0:
+                raise ValueError(f"no Chantler data for element '{elem}'")
+            self._decoded[key] = np.array(json.loads(getattr(rows[0], column)))
+        return self._decoded[key]
 
     def f1_chantler(self, element, energy, **kws):
         """
@@ -339,7 +590,7 @@ class XrayDB():
 
         Parameters:
             element (string or int): atomic number or symbol
-            energy (float or ndarray): energies (in eV).
+            energy (float, ndarray, or EnergyGrid): energies (in eV).
 
         Returns:
             ndarray: real part of anomalous scattering factor
@@ -356,7 +607,7 @@ class XrayDB():
 
         Parameters:
             element (string or int): atomic number or symbol
-            energy (float or ndarray): energies (in eV).
+            energy (float, ndarray, or EnergyGrid): energies (in eV).
 
         Returns:
             ndarray: imaginary part of anomalous scattering factor
@@ -374,7 +625,7 @@ class XrayDB():
 
         Parameters:
             element (string or int): atomic number or symbol
-            energy (float or ndarray): energies (in eV).
+            energy (float, ndarray, or EnergyGrid): energies (in eV).
             photo (bool): return only the photo-electric contribution [False]
             incoh (bool): return only the incoherent contribution [False]
 
@@ -395,11 +646,13 @@ class XrayDB():
         """
         return tuple of Compton energies for an incident energy
         """
-        row = self.get_cache('Compton_energies')[0]
-        _en   = json.loads(row.incident)
-        _xe90 = json.loads(row.xray_90deg)
-        _xave = json.loads(row.xray_mean)
-        _eave = json.loads(row.electron_mean)
+        key = ('Compton_energies', None)
+        if key not in self._decoded:
+            row = self.get_cache('Compton_energies')[0]
+            self._decoded[key] = [np.array(json.loads(getattr(row, col)))
+                                  for col in ('incident', 'xray_90deg',
+                                              'xray_mean', 'electron_mean')]
+        _en, _xe90, _xave, _eave = self._decoded[key]
 
         xray_90deg = np.interp(incident_energy, _en, _xe90)
         xray_mean = np.interp(incident_energy, _en, _xave)
@@ -410,19 +663,15 @@ class XrayDB():
     def _elem_data(self, element):
         "return data from elements table: internal use"
 
-        rows = self.get_cache('elements')
         if isinstance(element, int):
-            row = [r for r in rows if r.atomic_number == element][0]
+            edat = self.__elem_index.get(element, None)
         else:
-            if element.title() in self.__atomic_symbols:
-                row = [r for r in rows if r.element == element.title()][0]
-            elif element.lower() in self.__atomic_names:
-                row = [r for r in rows if r.name == element.lower()][0]
-            else:
-                raise ValueError(f"unknown element '{repr(element)}'")
-        return ElementData(int(row.atomic_number),
-                           row.element.title(), row.name,
-                           row.molar_mass, row.density)
+            edat = self.__elem_index.get(element.title(), None)
+            if edat is None:
+                edat = self.__elem_index.get(element.lower(), None)
+        if edat is None:
+            raise ValueError(f"unknown element '{repr(element)}'")
+        return edat
 
     def atomic_number(self, element):
         """
@@ -499,14 +748,7 @@ class XrayDB():
         References:
            Elam, Ravel, and Sieber.
         """
-        elem = self.symbol(element)
-        ltab = self.tables['xray_levels']
-        out = {}
-        for r in self.query(ltab).filter(ltab.c.element == elem).all():
-            out[str(r.iupac_symbol)] = XrayEdge(r.absorption_edge,
-                                                r.fluorescence_yield,
-                                                r.jump_ratio)
-        return out
+        return dict(self._index('xray_levels').get(self.symbol(element), {}))
 
     def xray_edge(self, element, edge):
         """
@@ -527,7 +769,8 @@ class XrayDB():
         References:
            Elam, Ravel, and Sieber.
         """
-        return self.xray_edges(element).get(edge.title(), None)
+        edges = self._index('xray_levels').get(self.symbol(element), {})
+        return edges.get(edge.title(), None)
 
     def xray_lines(self, element, initial_level=None, excitation_energy=None):
         """
@@ -567,24 +810,19 @@ class XrayDB():
            Elam, Ravel, and Sieber.
         """
         elem = self.symbol(element)
-        ttab = self.tables['xray_transitions']
-        row = self.query(ttab).filter(ttab.c.element == elem)
+        index = self._index('xray_transitions')
         if excitation_energy is not None:
             initial_level = []
-            for ilevel, dat in self.xray_edges(elem).items():
+            for ilevel, dat in self._index('xray_levels').get(elem, {}).items():
                 if dat[0] < excitation_energy:
                     initial_level.append(ilevel.title())
 
-        if initial_level is not None:
-            if isinstance(initial_level, (list, tuple)):
-                row = row.filter(ttab.c.initial_level.in_(initial_level))
-            else:
-                row = row.filter(ttab.c.initial_level == initial_level.title())
-        out = {}
-        for r in row.all():
-            out[str(r.siegbahn_symbol)] = XrayLine(r.emission_energy, r.intensity,
-                                                   r.initial_level, r.final_level)
-        return out
+        if initial_level is None:
+            return dict(index.get(elem, {}))
+        if isinstance(initial_level, (list, tuple)):
+            return {key: line for key, line in index.get(elem, {}).items()
+                    if line.initial_level in initial_level}
+        return dict(index.get((elem, initial_level.title()), {}))
 
     def xray_line_strengths(self, element, excitation_energy=None):
         """
@@ -600,17 +838,25 @@ class XrayDB():
         References:
            Elam, Ravel, and Sieber.
         """
-        out = {}
+        edges = self.xray_edges(element)
         lines = self.xray_lines(element, excitation_energy=excitation_energy)
+        labels, strengths, energies = [], [], []
         for label, eline in lines.items():
-            edge = self.xray_edge(element, eline.initial_level)
+            edge = edges.get(eline.initial_level.title(), None)
             if edge is None and ',' in eline.initial_level:
                 ilevel, _ = eline.initial_level.split(',')
-                edge = self.xray_edge(element, ilevel)
+                edge = edges.get(ilevel.title(), None)
             if edge is not None:
-                mu = self.mu_elam(element, [edge.energy*(0.999),
-                                            edge.energy*(1.001)], kind='photo')
-                out[label] = (mu[1]-mu[0]) * eline.intensity * edge.fyield
+                labels.append(label)
+                strengths.append(eline.intensity * edge.fyield)
+                energies.extend([edge.energy*(0.999), edge.energy*(1.001)])
+        out = {}
+        if len(labels) > 0:
+            # evaluate mu just below and above all edges at once
+            mu = self.mu_elam(element, energies, kind='photo')
+            jumps = mu[1::2] - mu[0::2]
+            for label, strength, jump in zip(labels, strengths, jumps):
+                out[label] = jump * strength
         return out
 
     def ck_probability(self, element, initial, final, total=True):
@@ -635,19 +881,9 @@ class XrayDB():
         References:
            Elam, Ravel, and Sieber.
         """
-        elem = self.symbol(element)
-        ctab = self.tables['Coster_Kronig']
-
-        row = self.query(ctab).filter(ctab.c.element == elem)
-        row = row.filter(ctab.c.initial_level == initial.title())
-        row = row.filter(ctab.c.final_level == final.title()).all()
-        out = 0.0
-        if len(row) > 0:
-            row = row[0]
-            out = row.transition_probability
-            if total:
-                out = row.total_transition_probability
-        return out
+        key = (self.symbol(element), initial.title(), final.title())
+        prob, total_prob = self._index('Coster_Kronig').get(key, (0.0, 0.0))
+        return total_prob if total else prob
 
     def corehole_width(self, element, edge=None, use_keski=False):
         """
@@ -672,21 +908,16 @@ class XrayDB():
             Keski-Rahkonen and Krause, 1974
 
         """
-        version_qy = self.tables['Version'].select().order_by('date')
-        version_id = self.session.execute(version_qy).fetchall()[-1].id
-
-        ctab = self.tables['corelevel_widths']
-        if version_id < 4 or use_keski:
-            ctab = self.tables['KeskiRahkonen_Krause']
-
-        rows = self.query(ctab).filter(ctab.c.element == self.symbol(element))
-        if edge is not None:
-            rows = rows.filter(ctab.c.edge == edge.title())
+        tablename = 'corelevel_widths'
+        if self._version_id() < 4 or use_keski:
+            tablename = 'KeskiRahkonen_Krause'
 
-        result = {r.edge: r.width for r in rows.all()}
+        widths = self._index(tablename).get(self.symbol(element), {})
         if edge is not None:
-            result = result[edge]
-        return result
+            if edge != edge.title() or edge not in widths:
+                raise KeyError(edge)
+            return widths[edge]
+        return dict(widths)
 
 
     def cross_section_elam(self, element, energies, kind='photo'):
@@ -695,7 +926,7 @@ class XrayDB():
 
         Parameters:
             element (string or int):  atomic number or symbol for element
-            energies (float or ndarray): energies (in eV) to calculate cross-sections
+            energies (float, ndarray, or EnergyGrid): energies (in eV) to calculate cross-sections
             kind (string):  one of 'photo', 'coh', and 'incoh' for photo-absorption,
                   coherent scattering, and incoherent scattering cross sections,
                   respectively. Default is 'photo'.
@@ -711,40 +942,53 @@ class XrayDB():
         if kind not in ('coh', 'incoh', 'photo'):
             raise ValueError(f'unknown cross section kind={kind}')
 
-        tablename = 'photoabsorption' if kind == 'photo' else 'scattering'
+        tab_lne, tab_val, tab_spl = self._elam_table(elem, kind)
 
-        row = self.get_cache(tablename, column='element', value=elem)[0]
-
-        tab_lne = np.array(json.loads(row.log_energy))
-        if kind.startswith('coh'):
-            tab_val = np.array(json.loads(row.log_coherent_scatter))
-            tab_spl = np.array(json.loads(row.log_coherent_scatter_spline))
-        elif kind.startswith('incoh'):
-            tab_val = np.array(json.loads(row.log_incoherent_scatter))
-            tab_spl = np.array(json.loads(row.log_incoherent_scatter_spline))
+        grid = energies if isinstance(energies, EnergyGrid) else None
+        if grid is None:
+            en = 1.0*as_ndarray(energies)
+            below, above = min(en) < ELAM_EMIN, max(en) > ELAM_EMAX
         else:
-            tab_val = np.array(json.loads(row.log_photoabsorption))
-            tab_spl = np.array(json.loads(row.log_photoabsorption_spline))
-
-        en = 1.0*as_ndarray(energies)
-        if min(en) < 100.0:
+            below, above = grid.elam_below.any(), grid.elam_above.any()
+        if below:
             warn('Elam tables are unreliable for energies < 100 eV')
-        if max(en) > 800_000.:
+        if above:
             warn('Elam tables are unreliable for energies > 800 keV')
-        en[np.where(en < 100.0)] = 100.0
-        en[np.where(en > 8.e5)] = 8.e5
+        if grid is not None:
+            return grid.shaped(np.exp(grid.elam_spline((elem, kind), tab_lne,
+                                                       tab_val, tab_spl)))
+        en[np.where(en < ELAM_EMIN)] = ELAM_EMIN
+        en[np.where(en > ELAM_EMAX)] = ELAM_EMAX
         out = np.exp(elam_spline(tab_lne, tab_val, tab_spl, np.log(en)))
         if isinstance(energies, (int, float)):
             return out[0]
         return out
 
+    def _elam_table(self, elem, kind):
+        """decoded arrays of (log_energy, log_value, spline) for Elam
+        cross-section of kind 'photo', 'coh', or 'incoh': internal use"""
+        key = (elem, kind)
+        if key not in self._decoded:
+            tablename = 'photoabsorption' if kind == 'photo' else 'scattering'
+            row = self.get_cache(tablename, column='element', value=elem)[0]
+            if kind == 'coh':
+                cols = ('log_coherent_scatter', 'log_coherent_scatter_spline')
+            elif kind == 'incoh':
+                cols = ('log_incoherent_scatter', 'log_incoherent_scatter_spline')
+            else:
+                cols = ('log_photoabsorption', 'log_photoabsorption_spline')
+            self._decoded[key] = (np.array(json.loads(row.log_energy)),
+                                  np.array(json.loads(getattr(row, cols[0]))),
+                                  np.array(json.loads(getattr(row, cols[1]))))
+        return self._decoded[key]
+
     def mu_elam(self, element, energies, kind='total'):
         """
         returns attenuation cross section for an element at energies (in eV)
 
         Parameters:
             element (string or int):  atomic number or symbol for element
-            energies (float or ndarray): energies (in eV) to calculate cross-sections
+            energies (float, ndarray, or EnergyGrid): energies (in eV) to calculate cross-sections
             kind (string):  one of 'photo' or 'total' for photo-electric or
                   total attenuation, respectively.  Default is 'total'.
 
@@ -816,7 +1060,8 @@ class XrayDB():
         Data from G. F. Knoll, Radiation Detection and Measurement, Table 5-1.
         """
         itab = self.tables['ionization_potentials']
-        out = self.query(itab).filter(itab.c.gas == gas).all()
+        with self._lock:
+            out = self.query(itab).filter(itab.c.gas == gas).all()
         if len(out) != 1:
             raise ValueError(f'unknown gas for ionization potential: {gas}')
         return float(out[0].potential)
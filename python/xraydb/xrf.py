@@ -0,0 +1,217 @@
+"""
+X-ray fluorescence line lists and spectra for samples
+
+Copyright 2025  Matthew Newville, The University of Chicago, newville@cars.uchicago.edu
+using the MIT license
+"""
+from collections import namedtuple
+import numpy as np
+
+from .xray import (get_xraydb, mu_elam, formula_to_mass_fracs,
+                   _validate_mass_fracs, xray_line_index)
+from .energygrid import ELAM_EMIN
+from .materials import find_material
+
+XRFLines = namedtuple('XRFLines', ('element', 'line', 'energy', 'intensity',
+                                   'initial_level', 'final_level'))
+
+XRFSpectrum = namedtuple('XRFSpectrum', ('energy', 'spectrum', 'fwhm', 'lines'))
+
+# mean energy (eV) to create an electron-hole pair in Si, and Fano factor
+SI_PAIR_ENERGY = 3.65
+SI_FANO = 0.115
+
+def sample_mass_fractions(sample, frac_type='mass'):
+    """mass fractions of elements for a sample
+
+    Args:
+        sample (str or dict): material name, chemical formula, or dict of
+                   elements/compounds and fractions, as for `transmission_sample`
+        frac_type (str): for dict samples, whether fractions are `mass`
+                   or `molar` fractions ['mass']
+
+    Returns:
+        dict with fields of each element and values of their mass fractions
+
+    Examples:
+        >>> sample_mass_fractions('sapphire')
+        {'Al': 0.5292525103904594, 'O': 0.4707474896095406}
+
+    """
+    if isinstance(sample, str):
+        mat = find_material(sample)
+        return formula_to_mass_fracs(sample if mat is None else mat.formula)
+    if isinstance(sample, dict):
+        if frac_type == 'mass':
+            return _validate_mass_fracs(dict(sample))
+        if frac_type == 'molar':
+            return formula_to_mass_fracs(sample)
+        raise ValueError('`frac_type` must be `mass` or `molar`')
+    raise ValueError('`sample` must be a str or dict')
+
+
+def xrf_lines(sample, excitation_energy, min_intensity=0.0, frac_type='mass'):
+    """X-ray fluorescence lines and intensities for a sample
+
+    Args:
+        sample (str or dict): material name, chemical formula, or dict of
+                   elements/compounds and fractions, as for `transmission_sample`
+        excitation_energy (float): incident X-ray energy (in eV)
+        min_intensity (float): smallest line intensity to include [0]
+        frac_type (str): for dict samples, whether fractions are `mass`
+                   or `molar` fractions ['mass']
+
+    Returns:
+        XRFLines namedtuple of ndarrays, sorted by energy, with fields
+        (element, line, energy, intensity, initial_level, final_level).
+        Intensities are fluorescence cross-sections in cm^2/gr of sample.
+
+    Notes:
+        1. line intensities follow `xray_line_strengths`, using the
+           photo-absorption jump across the initial level times the fluorescence
+           yield and transition probability, here scaled by the photo-absorption
+           at the excitation energy relative to that just above the edge, and
+           weighted by the mass fraction of the element.
+        2. lines, edges, and yields for all elements are taken from shared,
+           prebuilt tables, and `mu_elam` is called once per element.
+        3. for lines from combined initial levels, such as 'M4,5', the edge
+           and fluorescence yield of the first level are used, as for
+           `xray_line_strengths`.
+        4. lines from edges below 100 eV, the lower limit of the Elam tables,
+           are not included.
+        5. sample self-absorption and secondary fluorescence are not included.
+
+    Examples:
+        >>> lines = xrf_lines('Fe2O3', 10000, min_intensity=1)
+        >>> list(zip(lines.line, lines.energy))
+        [('Ka2', 6392.1), ('Ka1', 6405.2), ('Kb3', 7059.3), ('Kb1', 7059.3)]
+
+    """
+    fracs = sample_mass_fractions(sample, frac_type=frac_type)
+    index = xray_line_index()
+    levels = {(r.element, r.iupac_symbol): r
+              for r in get_xraydb().get_cache('xray_levels')}
+    keep = np.where(np.isin(index.element, list(fracs.keys())))[0]
+    edge = []
+    for elem, level in zip(index.element[keep], index.initial_level[keep]):
+        edge.append(levels.get((elem, level), None))
+        if edge[-1] is None and ',' in level:
+            edge[-1] = levels.get((elem, level.split(',')[0]), None)
+    edge_energy = np.array([np.nan if e is None else e.absorption_edge
+                            for e in edge], dtype=float)
+    with np.errstate(invalid='ignore'):
+        excited = ((edge_energy < excitation_energy) &
+                   (edge_energy*0.999 >= ELAM_EMIN))
+    keep = keep[excited]
+    element = index.element[keep]
+    edge_energy = edge_energy[excited]
+    fyield = np.array([e.fluorescence_yield for e, exc in zip(edge, excited) if exc],
+                      dtype=float)
+
+    # photo-absorption just below and above each edge, and at the
+    # excitation energy, with a single mu_elam call per element.
+    scale = np.zeros(len(element))
+    for elem, frac in fracs.items():
+        sel = np.where(element == elem)[0]
+        if len(sel) == 0:
+            continue
+        edges = edge_energy[sel]
+        mu = mu_elam(elem, np.concatenate((edges*0.999, edges*1.001,
+                                           [excitation_energy])), kind='photo')
+        nedge = len(edges)
+        mu_below, mu_above, mu_exc = mu[:nedge], mu[nedge:2*nedge], mu[-1]
+        scale[sel] = frac * (mu_above - mu_below) * mu_exc / mu_above
+
+    intensity = scale * fyield * index.intensity[keep]
+    keep_lines = intensity > max(min_intensity, 0)
+    sel = keep[keep_lines]
+    return XRFLines(element=index.element[sel], line=index.line[sel],
+                    energy=index.energy[sel], intensity=intensity[keep_lines],
+                    initial_level=index.initial_level[sel],
+                    final_level=index.final_level[sel])
+
+
+def detector_fwhm(energy, noise=100.0, fano=SI_FANO, pair_energy=SI_PAIR_ENERGY):
+    """energy resolution (FWHM, in eV) of a semiconductor detector
+
+    Args:
+        energy (float or ndarray): X-ray energy (in eV)
+        noise (float): electronic noise contribution to FWHM (in eV) [100]
+        fano (float): Fano factor [0.115, for Si]
+        pair_energy (float): energy to create an electron-hole pair (in eV)
+                   [3.65, for Si]
+
+    Returns:
+        FWHM in eV
+
+    Notes:
+        FWHM = sqrt(noise**2 + 8*ln(2) * fano * pair_energy * energy)
+    """
+    return np.sqrt(noise**2 + 8*np.log(2)*fano*pair_energy*np.asarray(energy))
+
+
+def xrf_spectrum(sample, excitation_energy, energy=None, noise=100.0,
+                 fano=SI_FANO, pair_energy=SI_PAIR_ENERGY, min_intensity=0.0,
+                 frac_type='mass', nsigma=5.0):
+    """simulated X-ray fluorescence spectrum for a sample
+
+    Args:
+        sample (str or dict): material name, chemical formula, or dict of
+                   elements/compounds and fractions, as for `transmission_sample`
+        excitation_energy (float): incident X-ray energy (in eV)
+        energy (None or ndarray): increasing energy grid (in eV) for spectrum
+                   [None, meaning 10 eV steps from 500 eV to excitation_energy+1000]
+        noise (float): electronic noise contribution to detector FWHM (in eV) [100]
+        fano (float): detector Fano factor [0.115]
+        pair_energy (float): detector electron-hole pair energy (in eV) [3.65]
+        min_intensity (float): smallest line intensity to include [0]
+        frac_type (str): for dict samples, whether fractions are `mass`
+                   or `molar` fractions ['mass']
+        nsigma (float): half-width of Gaussian kernels, in units of sigma [5]
+
+    Returns:
+        XRFSpectrum namedtuple with fields
+           `energy`    energy grid, in eV
+           `spectrum`  broadened spectrum, in cm^2/gr/eV
+           `fwhm`      detector FWHM at each line energy
+           `lines`     XRFLines namedtuple of lines, as from `xrf_lines`
+
+    Notes:
+        1. each line is broadened by a Gaussian with the detector resolution
+           at the line energy (see `detector_fwhm`), normalized to the line
+           intensity.
+        2. Gaussians are evaluated only on the grid points within `nsigma`
+           of each line, as sparse kernels, and summed with a single
+           scatter-add.
+
+    Examples:
+        >>> spec = xrf_spectrum({'Fe': 0.1, 'Cu': 0.05, 'SiO2': -1}, 12000)
+        >>> spec.energy[spec.spectrum.argmax()]
+        6400.0
+
+    """
+    lines = xrf_lines(sample, excitation_energy, min_intensity=min_intensity,
+                      frac_type=frac_type)
+    if energy is None:
+        energy = np.arange(500.0, excitation_energy + 1000.0, 10.0)
+    energy = np.asarray(energy, dtype=float)
+    spectrum = np.zeros(len(energy))
+    fwhm = detector_fwhm(lines.energy, noise=noise, fano=fano,
+                         pair_energy=pair_energy)
+    if len(lines.energy) == 0 or len(energy) == 0:
+        return XRFSpectrum(energy, spectrum, fwhm, lines)
+
+    sigma = fwhm / (2*np.sqrt(2*np.log(2)))
+    lo = np.searchsorted(energy, lines.energy - nsigma*sigma, side='left')
+    hi = np.searchsorted(energy, lines.energy + nsigma*sigma, side='right')
+    width = max(1, int((hi-lo).max()))
+
+    # sparse kernels: (nlines, width) array of grid indices for each line
+    index = lo[:, None] + np.arange(width)[None, :]
+    valid = index < hi[:, None]
+    index = np.clip(index, 0, len(energy)-1)
+    offset = (energy[index] - lines.energy[:, None]) / sigma[:, None]
+    kernel = np.exp(-0.5*offset*offset) / (sigma[:, None]*np.sqrt(2*np.pi))
+    kernel = np.where(valid, kernel*lines.intensity[:, None], 0.0)
+    np.add.at(spectrum, index.ravel(), kernel.ravel())
+    return XRFSpectrum(energy, spectrum, fwhm, lines)